@@ -0,0 +1,392 @@
+"""
+Headless generation of many projects from a manifest.
+
+A manifest lists the projects to generate or improve, either as a JSONL file with one
+object per line, or as a TOML file with one `[[projects]]` table per project:
+
+    [[projects]]
+    project_path = "projects/todo"
+    prompt = "A todo list app in Flask"
+    mode = "lite"
+    model = "gpt-4-1106-preview"
+
+Only `project_path` is required, relative paths are relative to the manifest. Without a
+`prompt`, the prompt file of the project is used. `mode` is one of MODES, by default
+"gen", and `model` and `temperature` default to the ones of the command line.
+
+The projects run concurrently on a bounded pool of worker threads, each with its own
+`AI`, so that the tokens and cost of every project are counted separately. Nothing is
+asked of the user: the entrypoint is generated but not executed, improve mode uses the
+saved file selection of the project, or all of its text files, and no review is
+collected. A summary of the duration, tokens, cost and status of every project is
+written as JSON.
+"""
+import json
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import toml
+
+from gpt_engineer.applications.cli.cli_agent import CliAgent
+from gpt_engineer.applications.cli.file_selector import FileSelector
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.base_execution_env import BaseExecutionEnv
+from gpt_engineer.core.default.constants import DEFAULT_BATCH_WORKERS
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH, memory_path
+from gpt_engineer.core.default.steps import gen_code, improve
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.tools.custom_steps import lite_gen
+
+logger = logging.getLogger(__name__)
+
+# The steps generating the code of a new project, by mode
+CODE_GEN_STEPS = {"gen": gen_code, "lite": lite_gen}
+# The modes a project can be run in. Clarify and self-heal mode ask the user, so they
+# cannot run in a batch.
+MODES = (*CODE_GEN_STEPS, "improve")
+
+
+@dataclass
+class BatchEntry:
+    """
+    A project of a batch manifest.
+
+    Attributes
+    ----------
+    project_path : str
+        The folder of the project.
+    prompt : Optional[str]
+        The prompt, or None to use the prompt file of the project.
+    mode : str
+        The mode the project is run in, one of MODES.
+    model : Optional[str]
+        The model, or None for the default model of the batch.
+    temperature : Optional[float]
+        The temperature, or None for the default temperature of the batch.
+    """
+
+    project_path: str
+    prompt: Optional[str] = None
+    mode: str = "gen"
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+
+
+# The types of the values of a manifest entry, with their names for error messages
+ENTRY_TYPES = {
+    "project_path": (str, "a string"),
+    "prompt": (str, "a string"),
+    "mode": (str, "a string"),
+    "model": (str, "a string"),
+    "temperature": ((int, float), "a number"),
+}
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of running a project of a batch.
+
+    Attributes
+    ----------
+    project_path : str
+        The folder of the project.
+    mode : str
+        The mode the project ran in.
+    model : str
+        The model the project ran with.
+    status : str
+        "ok" if the project was generated or improved, "failed" otherwise.
+    duration : float
+        The seconds the project took.
+    prompt_tokens : int
+        The prompt tokens sent to the model.
+    completion_tokens : int
+        The completion tokens received from the model.
+    cost : Optional[float]
+        The cost of the API usage in USD, or None if it is unknown for the model.
+    files_written : int
+        The number of files of the project that were written.
+    error : Optional[str]
+        The error the project failed with.
+    """
+
+    project_path: str
+    mode: str
+    model: str
+    status: str
+    duration: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: Optional[float] = None
+    files_written: int = 0
+    error: Optional[str] = None
+
+
+def load_manifest(manifest_path: Union[str, Path]) -> List[BatchEntry]:
+    """
+    Read the projects of a batch manifest.
+
+    Parameters
+    ----------
+    manifest_path : Union[str, Path]
+        The path of a TOML manifest, if it ends in ".toml", or of a JSONL manifest.
+
+    Returns
+    -------
+    List[BatchEntry]
+        The projects, with their paths resolved relative to the manifest.
+
+    Raises
+    ------
+    ValueError
+        If the manifest is not valid JSONL or TOML, or an entry is not an object, has
+        no project path, unknown keys, values of the wrong type or an unknown mode.
+    """
+    manifest_path = Path(manifest_path)
+    if manifest_path.suffix == ".toml":
+        try:
+            raw_entries = toml.load(manifest_path).get("projects", [])
+        except toml.TomlDecodeError as e:
+            raise ValueError(f"{manifest_path}: invalid TOML: {e}") from e
+        locations = [f"project {i + 1}" for i in range(len(raw_entries))]
+    else:
+        raw_entries, locations = [], []
+        for line_number, line in enumerate(manifest_path.read_text().splitlines(), 1):
+            if line.strip():
+                try:
+                    raw_entries.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(
+                        f"{manifest_path}, line {line_number}: invalid JSON: {e}"
+                    ) from e
+                locations.append(f"line {line_number}")
+
+    known_keys = {field.name for field in fields(BatchEntry)}
+    entries = []
+    for raw_entry, location in zip(raw_entries, locations):
+        where = f"{manifest_path}, {location}"
+        if not isinstance(raw_entry, dict):
+            raise ValueError(f"{where}: not an object")
+        unknown_keys = set(raw_entry) - known_keys
+        if unknown_keys:
+            raise ValueError(f"{where}: unknown keys {sorted(unknown_keys)}")
+        if "project_path" not in raw_entry:
+            raise ValueError(f"{where}: no project_path")
+        for key, value in raw_entry.items():
+            types, type_name = ENTRY_TYPES[key]
+            # bool is an int, but not a temperature
+            if not isinstance(value, types) or isinstance(value, bool):
+                raise ValueError(f"{where}: {key} must be {type_name}")
+        entry = BatchEntry(**raw_entry)
+        if entry.mode not in MODES:
+            raise ValueError(
+                f"{where}: unknown mode {entry.mode!r}, use one of {list(MODES)}"
+            )
+        entry.project_path = str(manifest_path.parent / entry.project_path)
+        entries.append(entry)
+    return entries
+
+
+def skip_execution(
+    ai: AI,
+    execution_env: BaseExecutionEnv,
+    files_dict: FilesDict,
+    preprompts_holder: PrepromptsHolder = None,
+) -> FilesDict:
+    """
+    Leave the generated code as is, instead of asking to run its entrypoint.
+    """
+    return files_dict
+
+
+def run_entry(
+    entry: BatchEntry,
+    model: str,
+    temperature: float,
+    azure_endpoint: str = "",
+    preprompts_holder: Optional[PrepromptsHolder] = None,
+) -> BatchResult:
+    """
+    Generate or improve the project of a batch entry, without asking the user.
+
+    Any error is caught and reported in the result, so that one failing project does
+    not stop the batch.
+
+    Parameters
+    ----------
+    entry : BatchEntry
+        The project to run.
+    model : str
+        The model, unless the entry has its own.
+    temperature : float
+        The temperature, unless the entry has its own.
+    azure_endpoint : str
+        The endpoint of the Azure OpenAI Service, if it is used.
+    preprompts_holder : Optional[PrepromptsHolder]
+        The preprompts, shared between the projects of a batch.
+
+    Returns
+    -------
+    BatchResult
+        The status, duration, tokens and cost of the project.
+    """
+    model = entry.model or model
+    temperature = entry.temperature if entry.temperature is not None else temperature
+    result = BatchResult(entry.project_path, entry.mode, model, "failed", 0.0)
+    start = time.perf_counter()
+    ai = None
+    try:
+        # not streamed, as the output of concurrent projects would interleave
+        ai = AI(
+            model_name=model,
+            temperature=temperature,
+            azure_endpoint=azure_endpoint,
+            streaming=False,
+        )
+        project = DiskMemory(entry.project_path)
+        if entry.prompt:
+            project["prompt"] = entry.prompt
+        prompt = project.get("prompt")
+        if not prompt:
+            raise ValueError(f"No prompt given, and no prompt file in {project.path}")
+
+        agent = CliAgent.with_default_config(
+            DiskMemory(memory_path(entry.project_path)),
+            DiskExecutionEnv(),
+            ai=ai,
+            code_gen_fn=CODE_GEN_STEPS.get(entry.mode, gen_code),
+            improve_fn=improve,
+            process_code_fn=skip_execution,
+            preprompts_holder=preprompts_holder,
+        )
+        if entry.mode == "improve":
+            selector = FileSelector(entry.project_path, model_name=model)
+            files_dict = agent.improve(selector.get_selected_files(), prompt)
+        else:
+            files_dict = agent.init(prompt)
+
+        store = FileStore(entry.project_path)
+        store.upload(files_dict)
+        result.files_written = store.last_upload.written
+        result.status = "ok"
+    except Exception as e:
+        logger.debug("Project %s failed", entry.project_path, exc_info=True)
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        result.duration = time.perf_counter() - start
+        if ai is not None and ai.token_usage_log.log():
+            last = ai.token_usage_log.log()[-1]
+            result.prompt_tokens = last.total_prompt_tokens
+            result.completion_tokens = last.total_completion_tokens
+            try:
+                result.cost = ai.token_usage_log.usage_cost()
+            except ValueError:
+                # the cost of models unknown to langchain cannot be computed
+                result.cost = None
+    return result
+
+
+def run_batch(
+    entries: List[BatchEntry],
+    model: str,
+    temperature: float,
+    workers: int = DEFAULT_BATCH_WORKERS,
+    azure_endpoint: str = "",
+) -> List[BatchResult]:
+    """
+    Run the projects of a batch concurrently on a bounded pool of worker threads.
+
+    Parameters
+    ----------
+    entries : List[BatchEntry]
+        The projects to run.
+    model : str
+        The model of the projects without their own.
+    temperature : float
+        The temperature of the projects without their own.
+    workers : int
+        The maximum number of projects running at the same time.
+    azure_endpoint : str
+        The endpoint of the Azure OpenAI Service, if it is used.
+
+    Returns
+    -------
+    List[BatchResult]
+        The results of the projects, in the order of the entries.
+    """
+    preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+    def run(entry: BatchEntry) -> BatchResult:
+        result = run_entry(entry, model, temperature, azure_endpoint, preprompts_holder)
+        print(f"[{result.status}] {result.project_path} ({result.duration:.1f}s)")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(run, entries))
+
+
+def format_summary(results: List[BatchResult]) -> str:
+    """
+    Format the results of a batch as a table, with a line of totals.
+    """
+    # imported here, like in TokenUsageLog.format_step_timings
+    from tabulate import tabulate
+
+    def cost(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.4f}"
+
+    rows = [
+        [
+            result.project_path,
+            result.mode,
+            result.status,
+            f"{result.duration:.1f}",
+            result.prompt_tokens,
+            result.completion_tokens,
+            cost(result.cost),
+        ]
+        for result in results
+    ]
+    known_costs = [result.cost for result in results if result.cost is not None]
+    ok = sum(result.status == "ok" for result in results)
+    rows.append(
+        [
+            "total",
+            "",
+            f"{ok}/{len(results)} ok",
+            f"{sum(result.duration for result in results):.1f}",
+            sum(result.prompt_tokens for result in results),
+            sum(result.completion_tokens for result in results),
+            cost(sum(known_costs) if known_costs else None),
+        ]
+    )
+    return tabulate(
+        rows,
+        headers=[
+            "project",
+            "mode",
+            "status",
+            "duration (s)",
+            "prompt tokens",
+            "completion tokens",
+            "cost ($)",
+        ],
+    )
+
+
+def write_summary(results: List[BatchResult], summary_path: Union[str, Path]) -> None:
+    """
+    Write the results of a batch as a JSON list, one object per project.
+    """
+    summary: List[Dict] = [asdict(result) for result in results]
+    Path(summary_path).write_text(json.dumps(summary, indent=2))
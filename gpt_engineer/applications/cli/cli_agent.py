@@ -6,9 +6,9 @@ from gpt_engineer.core.base_agent import BaseAgent
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
-from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import PREPROMPTS_PATH
 from gpt_engineer.core.default.steps import (
+    FileCallback,
     execute_entrypoint,
     gen_code,
     gen_entrypoint,
@@ -39,6 +39,8 @@ class CliAgent(BaseAgent):
         step_bundle (StepBundleInterface): Workflows of code generation steps that define the behavior of gen_code and
         improve.
         ai (AI): Manages calls to the LLM.
+        on_file (Optional[FileCallback]): Called with each file generated by `init` as soon as
+                    it is complete, while the rest of the response is still streamed.
 
     Methods:
         __init__(self, path: str, version_manager: VersionManagerInterface = None,
@@ -76,6 +78,7 @@ class CliAgent(BaseAgent):
         improve_fn: ImproveType = improve,
         process_code_fn: CodeProcessor = execute_entrypoint,
         preprompts_holder: PrepromptsHolder = None,
+        on_file: Optional[FileCallback] = None,
     ):
         self.memory = memory
         self.execution_env = execution_env
@@ -84,17 +87,19 @@ class CliAgent(BaseAgent):
         self.process_code_fn = process_code_fn
         self.improve_fn = improve_fn
         self.preprompts_holder = preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH)
+        self.on_file = on_file
 
     @classmethod
     def with_default_config(
         cls,
-        memory: DiskMemory,
+        memory: BaseMemory,
         execution_env: DiskExecutionEnv,
         ai: AI = None,
         code_gen_fn: CodeGenType = gen_code,
         improve_fn: ImproveType = improve,
         process_code_fn: CodeProcessor = execute_entrypoint,
         preprompts_holder: PrepromptsHolder = None,
+        on_file: Optional[FileCallback] = None,
     ):
         return cls(
             memory=memory,
@@ -104,11 +109,14 @@ class CliAgent(BaseAgent):
             process_code_fn=process_code_fn,
             improve_fn=improve_fn,
             preprompts_holder=preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH),
+            on_file=on_file,
         )
 
     def init(self, prompt: str) -> FilesDict:
+        # code generation functions without streaming of files are still supported
+        streaming = {"on_file": self.on_file} if self.on_file is not None else {}
         files_dict = self.code_gen_fn(
-            self.ai, prompt, self.memory, self.preprompts_holder
+            self.ai, prompt, self.memory, self.preprompts_holder, **streaming
         )
         entrypoint = gen_entrypoint(
             self.ai, files_dict, self.memory, self.preprompts_holder
@@ -9,6 +9,7 @@ environments, it offers customizable file filtering and seamless editor integrat
 
 Key Components:
 - FileSelector: Manages file selection and interaction.
+- IgnoreRules: Matches paths against .gitignore and .gpteignore patterns.
 - DisplayablePath: Provides a structured view of file paths.
 
 Usage:
@@ -18,22 +19,36 @@ file handling and persistence.
 
 """
 
+import json
 import os
+import re
 import subprocess
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Pattern, Tuple, Union
 
 import toml
 
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import metadata_path
 from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.token_usage import Tokenizer, context_window
+
+
+class ContextWindowExceededError(ValueError):
+    """
+    Raised when the selected files do not fit in the context window of the model.
+    """
 
 
 class FileSelector:
     IGNORE_FOLDERS = {"site-packages", "node_modules", "venv", "__pycache__"}
     FILE_LIST_NAME = "file_selection.toml"
+    TOKEN_CACHE_NAME = "file_token_counts.json"
+    # Share of the context window the selected files may take without a warning,
+    # leaving room for the prompt, the preprompts and the response
+    CONTEXT_WARNING_FRACTION = 0.75
     COMMENT = (
         "# Remove '#' to select a file.\n\n"
         "# gpt-engineer can only read selected files. "
@@ -41,10 +56,22 @@ class FileSelector:
         "cost additional tokens and potentially overflow token limit.\n\n"
     )
 
-    def __init__(self, project_path: Union[str, Path]):
+    def __init__(
+        self,
+        project_path: Union[str, Path],
+        workers: int = 1,
+        model_name: Optional[str] = None,
+        enforce_context_window: bool = True,
+    ):
         self.project_path = project_path
+        self.workers = workers
         self.metadata_db = DiskMemory(metadata_path(self.project_path))
         self.toml_path = self.metadata_db.path / self.FILE_LIST_NAME
+        self.token_cache_path = self.metadata_db.path / self.TOKEN_CACHE_NAME
+        self.model_name = model_name
+        self.tokenizer = Tokenizer(model_name) if model_name else None
+        self.context_window = context_window(model_name) if model_name else None
+        self.enforce_context_window = enforce_context_window
 
     def ask_for_files(self) -> FilesDict:
         """
@@ -65,6 +92,26 @@ class FileSelector:
             else:
                 selected_files = self.editor_file_selector(self.project_path, True)
 
+        return self._read_files(selected_files)
+
+    def get_selected_files(self) -> FilesDict:
+        """
+        Selects files without asking the user, for headless runs.
+
+        The files of the file list saved in the project's metadata are selected if
+        there is one, and all current text files of the project otherwise.
+        """
+        if self.FILE_LIST_NAME in self.metadata_db:
+            selected_files = self.get_files_from_toml(self.project_path, self.toml_path)
+        else:
+            selected_files = [
+                file_path
+                for file_path in self.get_current_files(self.project_path)
+                if self.is_utf8(Path(self.project_path) / file_path)
+            ]
+        return self._read_files(selected_files)
+
+    def _read_files(self, selected_files: List[str]) -> FilesDict:
         content_dict = {}
         for file_path in selected_files:
             # selected files contains paths that are relative to the project path
@@ -74,6 +121,8 @@ class FileSelector:
                     content_dict[str(file_path)] = content.read()
             except FileNotFoundError:
                 print(f"Warning: File not found {file_path}")
+        if self.tokenizer is not None:
+            self.check_context_budget(list(content_dict))
         return FilesDict(content_dict)
 
     def editor_file_selector(
@@ -103,8 +152,8 @@ class FileSelector:
             )
             # Write to the toml file
             with open(toml_file, "w") as f:
-                f.write(self.COMMENT)
-                f.write(s)
+                f.write(self.COMMENT + self._context_comment())
+                f.write(self._annotate_token_counts(s, list(tree_dict)))
 
         else:
             # Load existing files from the .toml configuration
@@ -127,8 +176,9 @@ class FileSelector:
 
             # Write the merged list back to the .toml for user review and modification
             with open(toml_file, "w") as file:
-                file.write(self.COMMENT)  # Ensure to write the comment
-                file.write(s)
+                # Ensure to write the comment
+                file.write(self.COMMENT + self._context_comment())
+                file.write(self._annotate_token_counts(s, all_files))
 
         print(
             "Please select and deselect (add # in front) files, save it, and close it to continue..."
@@ -140,6 +190,117 @@ class FileSelector:
             input_path, toml_file
         )  # Return the list of selected files after user edits
 
+    def file_token_counts(self, files: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Counts the tokens of project files with the tokenizer of the model.
+
+        Counts are cached in the metadata folder, keyed by the path, modification time
+        and size of each file, so that only new or modified files are read. Files that
+        are not UTF-8 text are counted as None.
+        """
+        try:
+            cache = json.loads(self.token_cache_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache = {}
+        if cache.get("encoding") != self.tokenizer.encoding_name:
+            cache = {"encoding": self.tokenizer.encoding_name, "files": {}}
+
+        counts = {}
+        changed = False
+        for file in files:
+            path = Path(self.project_path) / file
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entry = cache["files"].get(file)
+            if (
+                entry is None
+                or entry["mtime_ns"] != stat.st_mtime_ns
+                or entry["size"] != stat.st_size
+            ):
+                try:
+                    tokens = self.tokenizer.num_tokens(path.read_text())
+                except (OSError, UnicodeDecodeError, ValueError):
+                    tokens = None
+                entry = {
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "tokens": tokens,
+                }
+                cache["files"][file] = entry
+                changed = True
+            counts[file] = entry["tokens"]
+
+        if changed:
+            self.token_cache_path.write_text(json.dumps(cache))
+        return counts
+
+    def check_context_budget(self, files: List[str]) -> int:
+        """
+        Checks that the selected files fit in the context window of the model.
+
+        Warns if they take more than CONTEXT_WARNING_FRACTION of it, and raises a
+        ContextWindowExceededError if they do not fit at all, before any request is
+        sent to the model, unless `enforce_context_window` is off. Models whose context
+        window is unknown are not checked. Returns the number of tokens of the
+        selected files.
+        """
+        total = sum(tokens or 0 for tokens in self.file_token_counts(files).values())
+        if self.context_window is None:
+            print(
+                f"The selected files have {total} tokens. The context window of "
+                f"{self.model_name} is unknown, so it is not checked."
+            )
+        elif total > self.context_window:
+            message = (
+                f"The selected files have {total} tokens, more than the context window "
+                f"of {self.context_window} tokens of {self.model_name}."
+            )
+            if self.enforce_context_window:
+                raise ContextWindowExceededError(
+                    f"{message} Deselect files in {self.toml_path} and try again, "
+                    "or pass --ignore-context-window to send them anyway."
+                )
+            print(f"Warning: {message} The request may be rejected.")
+        elif total > self.CONTEXT_WARNING_FRACTION * self.context_window:
+            print(
+                f"Warning: the selected files have {total} tokens, "
+                f"{total / self.context_window:.0%} of the context window of "
+                f"{self.model_name}. The response may be truncated."
+            )
+        else:
+            print(
+                f"The selected files have {total} tokens "
+                f"({total / self.context_window:.0%} of the context window)."
+            )
+        return total
+
+    def _context_comment(self) -> str:
+        if self.tokenizer is None:
+            return ""
+        if self.context_window is None:
+            return "# The token count of every file is noted after it.\n\n"
+        return (
+            f"# The token count of every file is noted after it. "
+            f"{self.model_name} has a context window of {self.context_window} tokens.\n\n"
+        )
+
+    def _annotate_token_counts(self, s: str, files: List[str]) -> str:
+        """
+        Appends the token count of each file to its line of the TOML document.
+        """
+        if self.tokenizer is None:
+            return s
+        counts = self.file_token_counts(files)
+        lines = []
+        for line in s.split("\n"):
+            file = line.lstrip("# ").split(" = ")[0].strip('"')
+            if " = " in line and counts.get(file) is not None:
+                line = f"{line}  # {counts[file]} tokens"
+            lines.append(line)
+        return "\n".join(lines)
+
     def open_with_default_editor(self, file_path):
         """
         Attempts to open the specified file using the system's default text editor or a common fallback editor.
@@ -236,27 +397,76 @@ class FileSelector:
 
     def get_current_files(self, project_path: Union[str, Path]) -> list[str]:
         """
-        Generates a dictionary of all files in the project directory
-        with their selection status set to False by default.
+        Lists the files of the project directory, relative to it and sorted.
+
+        Hidden files and folders, the folders in IGNORE_FOLDERS and the paths matched
+        by the .gitignore and .gpteignore files of the project are skipped. Ignored
+        folders are pruned before they are descended into, so that large dependency or
+        build folders do not slow down the listing. With more than one worker, the
+        top-level folders are scanned in parallel.
         """
-        all_files = []
-        project_path = Path(
-            project_path
-        ).resolve()  # Ensure path is absolute and resolved
+        project_path = Path(project_path).resolve()
+        rules = IgnoreRules().extended(str(project_path), "")
+        files, subdirectories = self._scan_directory(str(project_path), "", rules)
+
+        if self.workers > 1 and len(subdirectories) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for subdirectory_files in executor.map(
+                    lambda args: self._walk(*args), subdirectories
+                ):
+                    files.extend(subdirectory_files)
+        else:
+            for subdirectory in subdirectories:
+                files.extend(self._walk(*subdirectory))
 
-        for path in project_path.glob("**/*"):  # Recursively list all files
-            if path.is_file():
-                relpath = path.relative_to(project_path)
+        return sorted(files)
 
-                parts = relpath.parts
-                if any(part.startswith(".") for part in parts):
-                    continue  # Skip hidden fileso
-                if any(part in self.IGNORE_FOLDERS for part in parts):
-                    continue
+    def _walk(self, directory: str, relative: str, rules: "IgnoreRules") -> List[str]:
+        """
+        Lists the files below a directory, depth first, without recursion.
+        """
+        files = []
+        stack = [(directory, relative, rules)]
+        while stack:
+            directory, relative, rules = stack.pop()
+            rules = rules.extended(directory, relative)
+            directory_files, subdirectories = self._scan_directory(
+                directory, relative, rules
+            )
+            files.extend(directory_files)
+            stack.extend(reversed(subdirectories))
+        return files
 
-                all_files.append(str(relpath))
+    def _scan_directory(
+        self, directory: str, relative: str, rules: "IgnoreRules"
+    ) -> Tuple[List[str], List[Tuple[str, str, "IgnoreRules"]]]:
+        """
+        Lists the files and the subdirectories to descend into of a single directory.
+        Symbolic links to directories are not followed.
+        """
+        files = []
+        subdirectories = []
+        try:
+            entries = list(os.scandir(directory))
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            return files, subdirectories
 
-        return all_files
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name in self.IGNORE_FOLDERS:
+                continue
+            relpath = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if rules.is_ignored(relpath, is_dir):
+                continue
+            if is_dir:
+                subdirectories.append((entry.path, relpath, rules))
+            elif is_file:
+                files.append(str(Path(relpath)))
+        return files, subdirectories
 
     def is_in_ignoring_extensions(self, path: Path) -> bool:
         """
@@ -268,6 +478,126 @@ class FileSelector:
         return is_hidden and is_pycache
 
 
+class IgnoreRules:
+    """
+    The patterns of the .gitignore and .gpteignore files that apply to a directory.
+
+    Patterns follow the .gitignore syntax: `*`, `?`, `[...]` and `**` wildcards,
+    negation with a leading `!`, directory-only patterns with a trailing `/`, and
+    patterns containing a `/` anchored to the folder of their ignore file. As in git,
+    a later matching pattern overrides an earlier one, and patterns of nested ignore
+    files are applied after those of their parent folders.
+    """
+
+    IGNORE_FILES = (".gitignore", ".gpteignore")
+
+    def __init__(self, rules: Optional[List[Tuple[str, Pattern, bool, bool]]] = None):
+        # (base folder, compiled pattern, is negated, only matches directories)
+        self.rules = rules or []
+
+    def extended(self, directory: str, relative: str) -> "IgnoreRules":
+        """
+        Returns the rules extended with the ignore files found in a directory, or the
+        rules themselves if it has none.
+        """
+        new_rules = []
+        for name in self.IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), "r") as f:
+                    lines = f.read().splitlines()
+            except (OSError, UnicodeDecodeError):
+                continue
+            for line in lines:
+                rule = self.parse_line(line)
+                if rule is not None:
+                    new_rules.append((relative,) + rule)
+        if not new_rules:
+            return self
+        return IgnoreRules(self.rules + new_rules)
+
+    @staticmethod
+    def parse_line(line: str) -> Optional[Tuple[Pattern, bool, bool]]:
+        """
+        Parses a line of an ignore file into a compiled pattern, whether it is negated
+        and whether it only matches directories. Returns None for blank lines and
+        comments.
+        """
+        if line.endswith(" ") and not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            return None
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        return re.compile(f"{prefix}{_translate_glob(line)}"), negated, dir_only
+
+    def is_ignored(self, relpath: str, is_dir: bool) -> bool:
+        """
+        Whether a path, relative to the project and separated by `/`, is ignored.
+        """
+        ignored = False
+        for base, pattern, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not relpath.startswith(base + "/"):
+                    continue
+                path = relpath[len(base) + 1 :]
+            else:
+                path = relpath
+            if pattern.fullmatch(path):
+                ignored = not negated
+        return ignored
+
+
+def _translate_glob(pattern: str) -> str:
+    """
+    Translates a .gitignore glob into a regular expression.
+    """
+    i, n = 0, len(pattern)
+    regex = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            regex.append("[^/]*")
+        elif c == "?":
+            regex.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex.append(re.escape(c))
+            else:
+                content = pattern[i + 1 : end].replace("\\", "\\\\")
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                regex.append(f"[{content}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(c))
+        i += 1
+    return "".join(regex)
+
+
 class DisplayablePath(object):
     """
     Represents a path in a file system and displays it in a tree-like structure.
@@ -13,7 +13,9 @@ Main Functionality:
   - Lite mode for lighter operations
   - Azure endpoint for Azure OpenAI services
   - Using project's preprompts or default ones
+  - Caching LLM responses for identical requests
   - Verbosity level for logging
+- Generate or improve many projects listed in a manifest with `gpte batch MANIFEST`.
 - Interact with AI, databases, and archive processes based on the user-defined parameters.
 
 Notes:
@@ -28,24 +30,37 @@ import os
 
 from pathlib import Path
 
-import openai
 import typer
 
 from dotenv import load_dotenv
+from typer.core import TyperGroup
 
-from gpt_engineer.applications.cli.cli_agent import CliAgent
-from gpt_engineer.applications.cli.collect import collect_and_send_human_review
-from gpt_engineer.applications.cli.file_selector import FileSelector
-from gpt_engineer.core.ai import AI
-from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
-from gpt_engineer.core.default.disk_memory import DiskMemory
-from gpt_engineer.core.default.file_store import FileStore
-from gpt_engineer.core.default.paths import PREPROMPTS_PATH, memory_path
-from gpt_engineer.core.default.steps import execute_entrypoint, gen_code, improve
-from gpt_engineer.core.preprompts_holder import PrepromptsHolder
-from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen, self_heal
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.constants import DEFAULT_BATCH_WORKERS, DEFAULT_MODEL
+from gpt_engineer.core.default.paths import (
+    LLM_CACHE_FILE,
+    PREPROMPTS_PATH,
+    memory_db_path,
+    memory_path,
+    metadata_path,
+)
+from gpt_engineer.core.tracing import enable_tracing
 
-app = typer.Typer()  # creates a CLI app
+
+class _DefaultCommandGroup(TyperGroup):
+    """
+    Runs the `main` command, unless the first argument names another command.
+
+    This keeps `gpte PROJECT_PATH` working next to `gpte batch MANIFEST`.
+    """
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args = ["main", *args]
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(cls=_DefaultCommandGroup)  # creates a CLI app
 
 
 def load_env_if_needed():
@@ -54,10 +69,12 @@ def load_env_if_needed():
     if os.getenv("OPENAI_API_KEY") is None:
         # if there is no .env file, try to load from the current working directory
         load_dotenv(dotenv_path=os.path.join(os.getcwd(), ".env"))
+    import openai
+
     openai.api_key = os.getenv("OPENAI_API_KEY")
 
 
-def load_prompt(input_repo: DiskMemory, improve_mode):
+def load_prompt(input_repo: BaseMemory, improve_mode):
     if input_repo.get("prompt"):
         return input_repo.get("prompt")
 
@@ -88,7 +105,7 @@ def get_preprompts_path(use_custom_preprompts: bool, input_path: Path) -> Path:
 @app.command()
 def main(
     project_path: str = typer.Argument("projects/example", help="path"),
-    model: str = typer.Argument("gpt-4-1106-preview", help="model id string"),
+    model: str = typer.Argument(DEFAULT_MODEL, help="model id string"),
     temperature: float = 0.1,
     improve_mode: bool = typer.Option(
         False,
@@ -127,16 +144,65 @@ def main(
         help="""Use your project's custom preprompts instead of the default ones.
           Copies all original preprompts to the project's workspace if they don't exist there.""",
     ),
+    llm_cache: bool = typer.Option(
+        False,
+        "--llm-cache",
+        help="""Cache LLM responses in the project's .gpteng folder and reuse them
+          for identical requests (same model, temperature and messages).""",
+    ),
+    sqlite_memory: bool = typer.Option(
+        False,
+        "--sqlite-memory",
+        help="""Store the project's memory in a single SQLite database instead of one file per key.
+          An existing .gpteng/memory folder is migrated into the database on first use.""",
+    ),
+    ignore_context_window: bool = typer.Option(
+        False,
+        "--ignore-context-window",
+        help="""Send the selected files in improve mode even if they exceed the known
+          context window of the model.""",
+    ),
+    stream_files: bool = typer.Option(
+        False,
+        "--stream-files",
+        help="""Write each generated file to the project as soon as its code block is complete,
+          while the rest of the response is still streamed. Not used in improve mode.""",
+    ),
+    trace: str = typer.Option(
+        "",
+        "--trace",
+        help="""Record the LLM calls, steps, file writes and commands of the run as spans,
+          and write them to this Chrome Trace Event JSON file, to open in Perfetto.""",
+    ),
     verbose: bool = typer.Option(False, "--verbose", "-v"),
 ):
     """
     Generates a project from a prompt in PROJECT_PATH/prompt,
     or improves an existing project (with -i) in PROJECT_PATH.
 
+    Run `gpte batch --help` to generate many projects from a manifest.
     See README.md for more details.
     """
     logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
-    #
+    if trace:
+        enable_tracing(trace)
+    # imported here rather than at the top, as importing openai and langchain takes
+    # most of the startup time of the CLI, e.g. of `gpte --help`
+    from gpt_engineer.applications.cli.cli_agent import CliAgent
+    from gpt_engineer.applications.cli.collect import collect_and_send_human_review
+    from gpt_engineer.applications.cli.file_selector import (
+        ContextWindowExceededError,
+        FileSelector,
+    )
+    from gpt_engineer.core.ai import AI, ResponseCache
+    from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+    from gpt_engineer.core.default.disk_memory import DiskMemory
+    from gpt_engineer.core.default.file_store import FileStore
+    from gpt_engineer.core.default.sqlite_memory import SqliteMemory
+    from gpt_engineer.core.default.steps import execute_entrypoint, gen_code, improve
+    from gpt_engineer.core.files_dict import FilesDict
+    from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+    from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen, self_heal
 
     if improve_mode:
         assert not (
@@ -145,10 +211,16 @@ def main(
 
     load_env_if_needed()
 
+    response_cache = (
+        ResponseCache(os.path.join(metadata_path(project_path), LLM_CACHE_FILE))
+        if llm_cache
+        else None
+    )
     ai = AI(
         model_name=model,
         temperature=temperature,
         azure_endpoint=azure_endpoint,
+        response_cache=response_cache,
     )
 
     path = Path(project_path)
@@ -172,8 +244,23 @@ def main(
 
     preprompts_path = get_preprompts_path(use_custom_preprompts, Path(project_path))
     preprompts_holder = PrepromptsHolder(preprompts_path)
-    memory = DiskMemory(memory_path(project_path))
+    if sqlite_memory:
+        db_path = memory_db_path(project_path)
+        if not os.path.exists(db_path) and os.path.isdir(memory_path(project_path)):
+            memory = SqliteMemory.migrate_from_directory(
+                memory_path(project_path), db_path
+            )
+        else:
+            memory = SqliteMemory(db_path)
+    else:
+        memory = DiskMemory(memory_path(project_path))
     execution_env = DiskExecutionEnv()
+    store = FileStore(project_path)
+
+    def write_file(path: str, content: str) -> None:
+        store.upload(FilesDict({path: content}))
+        print(f"\nWrote {path}")
+
     agent = CliAgent.with_default_config(
         memory,
         execution_env,
@@ -182,12 +269,20 @@ def main(
         improve_fn=improve_fn,
         process_code_fn=execution_fn,
         preprompts_holder=preprompts_holder,
+        on_file=write_file if stream_files else None,
     )
 
-    store = FileStore(project_path)
     if improve_mode:
-        fileselector = FileSelector(project_path)
-        files_dict = fileselector.ask_for_files()
+        fileselector = FileSelector(
+            project_path,
+            model_name=model,
+            enforce_context_window=not ignore_context_window,
+        )
+        try:
+            files_dict = fileselector.ask_for_files()
+        except ContextWindowExceededError as e:
+            print(e)
+            raise typer.Exit(code=1)
         files_dict = agent.improve(files_dict, prompt)
     else:
         files_dict = agent.init(prompt)
@@ -196,8 +291,75 @@ def main(
         collect_and_send_human_review(prompt, model, temperature, config, agent.memory)
 
     store.upload(files_dict)
+    print(
+        f"Wrote {store.last_upload.written} files ({store.last_upload.bytes_written} bytes),"
+        f" {store.last_upload.unchanged} unchanged"
+    )
 
+    if ai.token_usage_log.step_timings():
+        print(ai.token_usage_log.format_step_timings())
     print("Total api cost: $ ", ai.token_usage_log.usage_cost())
+    if response_cache is not None:
+        print(
+            f"LLM response cache: {response_cache.hits} hits, {response_cache.misses} misses"
+        )
+
+
+@app.command()
+def batch(
+    manifest: Path = typer.Argument(
+        ..., help="JSONL or TOML file listing the projects, see batch.py"
+    ),
+    model: str = typer.Option(
+        DEFAULT_MODEL, help="model id string of projects without their own"
+    ),
+    temperature: float = typer.Option(
+        0.1, help="temperature of projects without their own"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_BATCH_WORKERS, help="maximum number of projects run at once"
+    ),
+    summary: Path = typer.Option(
+        "batch_summary.json", help="JSON file to write the per-project summary to"
+    ),
+    azure_endpoint: str = typer.Option(
+        "",
+        "--azure",
+        "-a",
+        help="Endpoint for your Azure OpenAI Service (https://xx.openai.azure.com).",
+    ),
+    verbose: bool = typer.Option(False, "--verbose", "-v"),
+):
+    """
+    Generates or improves the projects listed in MANIFEST, concurrently and without
+    asking anything: generated code is not executed and no review is collected.
+    """
+    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
+    load_env_if_needed()
+    from gpt_engineer.applications.cli.batch import (
+        format_summary,
+        load_manifest,
+        run_batch,
+        write_summary,
+    )
+
+    try:
+        entries = load_manifest(manifest)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read the manifest: {e}")
+        raise typer.Exit(code=1)
+    results = run_batch(
+        entries,
+        model=model,
+        temperature=temperature,
+        workers=workers,
+        azure_endpoint=azure_endpoint,
+    )
+    write_summary(results, summary)
+    print(format_summary(results))
+    print(f"Summary written to {summary}")
+    if any(result.status != "ok" for result in results):
+        raise typer.Exit(code=1)
 
 
 if __name__ == "__main__":
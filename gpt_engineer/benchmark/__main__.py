@@ -1,4 +1,5 @@
 import importlib
+import os
 
 from typing import Annotated, Optional
 
@@ -6,9 +7,44 @@ import typer
 
 from langchain.cache import SQLiteCache
 from langchain.globals import set_llm_cache
+from typer.core import TyperGroup
 
 from gpt_engineer.benchmark.benchmarks.load import get_benchmark
+from gpt_engineer.benchmark.results import (
+    RESULTS_FILE,
+    compare_runs,
+    load_run,
+    new_run_id,
+    print_comparison,
+    save_results,
+)
 from gpt_engineer.benchmark.run import print_results, run
+from gpt_engineer.core.transcripts import (
+    LATENCY_ENV_VAR,
+    RECORD_ENV_VAR,
+    REPLAY_ENV_VAR,
+    TOKENS_PER_SECOND_ENV_VAR,
+)
+
+
+class _DefaultCommandGroup(TyperGroup):
+    """
+    Runs the `run` command, unless the first argument names another command.
+
+    This keeps `bench PATH_TO_AGENT BENCHMARKS` working next to `bench compare`.
+    """
+
+    def parse_args(self, ctx, args):
+        if (
+            args
+            and args[0] not in self.commands
+            and args[0] not in ctx.help_option_names
+        ):
+            args = ["run", *args]
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(cls=_DefaultCommandGroup)
 
 
 def get_agent(path):
@@ -17,6 +53,7 @@ def get_agent(path):
     return agent_module.default_config_agent()
 
 
+@app.command("run")
 def main(
     path_to_agent: Annotated[
         str,
@@ -33,21 +70,100 @@ def main(
     verbose: Annotated[
         bool, typer.Option(help="print results for each task", show_default=False)
     ] = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            help="number of tasks to run concurrently, each with its own agent"
+        ),
+    ] = 1,
+    results_path: Annotated[
+        str, typer.Option(help="JSONL file the results are appended to")
+    ] = RESULTS_FILE,
+    run_id: Annotated[
+        Optional[str],
+        typer.Option(
+            help="id to save the results under; reuse it to add samples to a run",
+            show_default=False,
+        ),
+    ] = None,
+    record_transcript: Annotated[
+        Optional[str],
+        typer.Option(help="record all LLM requests to this transcript file"),
+    ] = None,
+    replay_transcript: Annotated[
+        Optional[str],
+        typer.Option(help="answer LLM requests offline from this transcript file"),
+    ] = None,
+    replay_latency: Annotated[
+        float, typer.Option(help="simulated seconds to the first replayed token")
+    ] = 0.0,
+    replay_tokens_per_second: Annotated[
+        Optional[float], typer.Option(help="simulated rate of replayed tokens")
+    ] = None,
 ):
+    """
+    Run an agent on benchmarks and save the results. This is the default command.
+    """
+    # agents create their AI themselves, so the transcript is passed on through the
+    # environment
+    if record_transcript:
+        os.environ[RECORD_ENV_VAR] = record_transcript
+    if replay_transcript:
+        os.environ[REPLAY_ENV_VAR] = replay_transcript
+        os.environ[LATENCY_ENV_VAR] = str(replay_latency)
+        if replay_tokens_per_second:
+            os.environ[TOKENS_PER_SECOND_ENV_VAR] = str(replay_tokens_per_second)
+
     set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+    run_id = run_id or new_run_id()
 
     benchmarks = benchmarks.split(",")
     for benchmark_name in benchmarks:
         benchmark = get_benchmark(benchmark_name)
         agent = get_agent(path_to_agent)
 
-        results = run(agent, benchmark, task_name, verbose=verbose)
+        results = run(
+            agent,
+            benchmark,
+            task_name,
+            verbose=verbose,
+            workers=workers,
+            agent_factory=lambda: get_agent(path_to_agent),
+        )
         print(
             f"\n--- Results for agent {path_to_agent}, benchmark: {benchmark_name} ---"
         )
         print_results(results)
+        save_results(
+            results_path,
+            run_id,
+            results,
+            agent=path_to_agent,
+            benchmark=benchmark_name,
+            model=getattr(getattr(agent, "ai", None), "model_name", None),
+        )
+        print(f"Saved results of run {run_id} to {results_path}")
         print()
 
 
+@app.command()
+def compare(
+    run_a: Annotated[str, typer.Argument(help="id of the baseline run")],
+    run_b: Annotated[str, typer.Argument(help="id of the run to compare")],
+    results_path: Annotated[
+        str, typer.Option(help="JSONL file the results were saved to")
+    ] = RESULTS_FILE,
+):
+    """
+    Compare the speed and pass rate of two runs, per task.
+    """
+    try:
+        runs = load_run(results_path, run_a), load_run(results_path, run_b)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load the runs: {e}")
+        raise typer.Exit(code=1)
+    print_comparison(compare_runs(*runs))
+
+
 if __name__ == "__main__":
-    typer.run(main)
+    app()
@@ -0,0 +1,227 @@
+"""
+Persistence and comparison of benchmark results.
+
+Each `TaskResult` of a benchmark run is appended as one JSON line to a results file,
+together with the run id, agent, model, benchmark and git revision, so that results can
+be tracked across runs and agent versions. Runs are compared per task on duration and
+pass rate. When both runs have repeated samples of a task, a permutation test estimates
+how likely the difference is to be due to chance.
+"""
+import json
+import random
+import statistics
+import subprocess
+import uuid
+
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from tabulate import tabulate
+
+from gpt_engineer.benchmark.types import TaskResult
+
+RESULTS_FILE = "benchmark_results.jsonl"
+PERMUTATION_ROUNDS = 10000
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def git_revision() -> Optional[str]:
+    """
+    Return the git revision of the current directory, or None outside of a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(
+    path: Union[str, Path],
+    run_id: str,
+    results: Sequence[TaskResult],
+    agent: str,
+    benchmark: str,
+    model: Optional[str] = None,
+) -> None:
+    """
+    Append the results of a benchmark run to a JSONL results file.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        The results file.
+    run_id : str
+        The id of the run. Results saved under the same id are samples of the same run.
+    results : Sequence[TaskResult]
+        The results to save.
+    agent : str
+        The path of the agent that was benchmarked.
+    benchmark : str
+        The name of the benchmark.
+    model : Optional[str], optional
+        The model the agent used, if known.
+    """
+    timestamp = datetime.now(timezone.utc).isoformat()
+    revision = git_revision()
+    with open(path, "a") as f:
+        for result in results:
+            record = {
+                "run_id": run_id,
+                "timestamp": timestamp,
+                "agent": agent,
+                "model": model,
+                "benchmark": benchmark,
+                "git_revision": revision,
+                **asdict(result),
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+def load_run(path: Union[str, Path], run_id: str) -> List[Dict]:
+    """
+    Load the results saved under a run id.
+
+    Raises
+    ------
+    ValueError
+        If the results file has no results for the run id.
+    """
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    run = [record for record in records if record["run_id"] == run_id]
+    if not run:
+        raise ValueError(f"No results for run {run_id} in {path}.")
+    return run
+
+
+def compare_runs(run_a: List[Dict], run_b: List[Dict]) -> List[Dict]:
+    """
+    Compare two runs on the duration and pass rate of each task they have in common.
+
+    Parameters
+    ----------
+    run_a : List[Dict]
+        The results of the baseline run, as returned by `load_run`.
+    run_b : List[Dict]
+        The results of the run to compare against the baseline.
+
+    Returns
+    -------
+    List[Dict]
+        One row per task, with the mean duration and pass rate of either run, and the
+        p-values of their differences if both runs have more than one sample of the task.
+    """
+    samples_a, samples_b = _samples_by_task(run_a), _samples_by_task(run_b)
+    rows = []
+    for task_name in sorted(samples_a.keys() & samples_b.keys()):
+        a, b = samples_a[task_name], samples_b[task_name]
+        durations_a = [record["duration"] for record in a]
+        durations_b = [record["duration"] for record in b]
+        passed_a = [float(all(record["assertion_results"].values())) for record in a]
+        passed_b = [float(all(record["assertion_results"].values())) for record in b]
+        repeated = len(a) > 1 and len(b) > 1
+        rows.append(
+            {
+                "task_name": task_name,
+                "samples": (len(a), len(b)),
+                "duration": (
+                    statistics.mean(durations_a),
+                    statistics.mean(durations_b),
+                ),
+                "duration_p_value": permutation_p_value(durations_a, durations_b)
+                if repeated
+                else None,
+                "pass_rate": (statistics.mean(passed_a), statistics.mean(passed_b)),
+                "pass_rate_p_value": permutation_p_value(passed_a, passed_b)
+                if repeated
+                else None,
+            }
+        )
+    return rows
+
+
+def permutation_p_value(
+    a: Sequence[float], b: Sequence[float], rounds: int = PERMUTATION_ROUNDS
+) -> float:
+    """
+    Two-sided p-value of the difference of the means of two samples, estimated by
+    randomly reassigning the pooled values to the two samples.
+    """
+    observed = abs(statistics.mean(a) - statistics.mean(b))
+    pooled = list(a) + list(b)
+    rng = random.Random(0)
+    extreme = 0
+    for _ in range(rounds):
+        rng.shuffle(pooled)
+        difference = abs(
+            statistics.mean(pooled[: len(a)]) - statistics.mean(pooled[len(a) :])
+        )
+        # tolerate floating point noise when the difference equals the observed one
+        if difference >= observed - 1e-12:
+            extreme += 1
+    return (extreme + 1) / (rounds + 1)
+
+
+def _samples_by_task(run: List[Dict]) -> Dict[str, List[Dict]]:
+    samples: Dict[str, List[Dict]] = {}
+    for record in run:
+        samples.setdefault(record["task_name"], []).append(record)
+    return samples
+
+
+def print_comparison(rows: List[Dict]) -> None:
+    def p_value(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f}"
+
+    table = []
+    for row in rows:
+        (duration_a, duration_b), (pass_a, pass_b) = row["duration"], row["pass_rate"]
+        change = (duration_b - duration_a) / duration_a if duration_a else 0.0
+        table.append(
+            [
+                row["task_name"],
+                "{}/{}".format(*row["samples"]),
+                f"{duration_a:.2f}s",
+                f"{duration_b:.2f}s",
+                f"{change:+.1%}",
+                p_value(row["duration_p_value"]),
+                f"{pass_a:.0%}",
+                f"{pass_b:.0%}",
+                f"{pass_b - pass_a:+.0%}",
+                p_value(row["pass_rate_p_value"]),
+            ]
+        )
+    print(
+        tabulate(
+            table,
+            headers=[
+                "task",
+                "samples",
+                "duration A",
+                "duration B",
+                "Δ duration",
+                "p",
+                "pass A",
+                "pass B",
+                "Δ pass",
+                "p",
+            ],
+        )
+    )
+    if rows:
+        total_a = sum(row["duration"][0] for row in rows)
+        total_b = sum(row["duration"][1] for row in rows)
+        pass_a = statistics.mean(row["pass_rate"][0] for row in rows)
+        pass_b = statistics.mean(row["pass_rate"][1] for row in rows)
+        print(f"\nTotal duration: {total_a:.2f}s -> {total_b:.2f}s")
+        print(f"Pass rate: {pass_a:.0%} -> {pass_b:.0%}")
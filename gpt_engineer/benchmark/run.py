@@ -1,10 +1,25 @@
+import os
+import signal
+import subprocess
+import sys
 import time
 
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional, Tuple
 
-from gpt_engineer.benchmark.types import Assertable, Benchmark, TaskResult
+from gpt_engineer.benchmark.types import Assertable, Benchmark, Task, TaskResult
 from gpt_engineer.core.base_agent import BaseAgent
-from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_execution_env import (
+    DiskExecutionEnv,
+    OutputBuffer,
+    capture_output,
+    kill_process_group,
+)
+from gpt_engineer.core.files_dict import FilesDict
+
+# Process groups, CPU time limits and the resource usage of children are only
+# available on POSIX; elsewhere commands run without them
+SUPPORTS_RESOURCE_LIMITS = os.name == "posix" and hasattr(os, "wait4")
 
 
 def run(
@@ -12,53 +27,226 @@ def run(
     benchmark: Benchmark,
     task_name: Optional[str] = None,
     verbose=False,
+    workers: int = 1,
+    agent_factory: Optional[Callable[[], BaseAgent]] = None,
 ) -> List[TaskResult]:
-    task_results = []
-    for task in benchmark.tasks:
-        t0 = time.time()
-        files_dict = agent.improve(task.initial_code, task.prompt, task.command)
-        t1 = time.time()
-
-        env = DiskExecutionEnv()
-        env.upload(files_dict)
-
-        if task.command:
-            p = env.popen(task.command)
-            stdout, stderr = p.communicate(benchmark.timeout)
-            stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
-        else:
-            p, stdout, stderr = None, None, None
+    """
+    Run the tasks of a benchmark and return their results, in the order of the tasks.
+
+    Parameters
+    ----------
+    agent : BaseAgent
+        The agent that solves the tasks when they run one after another.
+    benchmark : Benchmark
+        The benchmark to run.
+    task_name : Optional[str], optional
+        Only run the task with this name, by default None.
+    verbose : bool, optional
+        Print the result of each task as soon as it finishes, by default False.
+    workers : int, optional
+        The number of tasks to run concurrently, by default 1.
+    agent_factory : Optional[Callable[[], BaseAgent]], optional
+        Creates a separate agent for each task. Required when `workers` is greater
+        than 1, as agents are not thread-safe.
+
+    Returns
+    -------
+    List[TaskResult]
+        The results, in the same order as the tasks of the benchmark.
+    """
+    tasks = [
+        task for task in benchmark.tasks if task_name is None or task.name == task_name
+    ]
+    order = {id(task): index for index, task in enumerate(tasks)}
+    results: List[Tuple[int, TaskResult]] = []
+    for task, task_result in iter_results(
+        agent, benchmark, tasks, workers=workers, agent_factory=agent_factory
+    ):
+        results.append((order[id(task)], task_result))
+        if verbose:
+            print_task_result(task_result)
+    return [task_result for _, task_result in sorted(results, key=lambda r: r[0])]
+
+
+def iter_results(
+    agent: BaseAgent,
+    benchmark: Benchmark,
+    tasks: List[Task],
+    workers: int = 1,
+    agent_factory: Optional[Callable[[], BaseAgent]] = None,
+) -> Iterator[Tuple[Task, TaskResult]]:
+    """
+    Run tasks on a pool of worker threads, yielding each result as soon as it finishes.
+
+    Every task runs in its own `DiskExecutionEnv`. When running concurrently, every task
+    also gets its own agent from `agent_factory`.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield task, run_task(agent, task, benchmark)
+        return
+
+    if agent_factory is None:
+        raise ValueError("An agent_factory is required to run tasks concurrently.")
+
+    def run_isolated(task: Task) -> TaskResult:
+        return run_task(agent_factory(), task, benchmark)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_isolated, task): task for task in tasks}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_task(agent: BaseAgent, task: Task, benchmark: Benchmark) -> TaskResult:
+    """
+    Let the agent solve a task, run the task's command and check its assertions.
+    """
+    tokens_before = _token_totals(agent)
+    t0 = time.time()
+    files_dict = agent.improve(task.initial_code, task.prompt, task.command)
+    t1 = time.time()
+    tokens_after = _token_totals(agent)
+
+    env = DiskExecutionEnv()
+    env.upload(files_dict)
+
+    if task.command:
+        exec_result = execute(env, files_dict, task.command, benchmark)
+    else:
         exec_result = Assertable(
             files=files_dict,
             env=env,
-            process=p,
-            stdout=stdout,
-            stderr=stderr,
+            process=None,
+            stdout=None,
+            stderr=None,
         )
 
-        task_results.append(
-            TaskResult(
-                task_name=task.name,
-                assertion_results={
-                    assertion_name: assertion(exec_result)
-                    for assertion_name, assertion in task.assertions.items()
-                },
-                duration=t1 - t0,
+    return TaskResult(
+        task_name=task.name,
+        assertion_results={
+            assertion_name: assertion(exec_result)
+            for assertion_name, assertion in task.assertions.items()
+        },
+        duration=t1 - t0,
+        prompt_tokens=tokens_after[0] - tokens_before[0] if tokens_after else None,
+        completion_tokens=tokens_after[1] - tokens_before[1] if tokens_after else None,
+    )
+
+
+def _token_totals(agent: BaseAgent) -> Optional[Tuple[int, int]]:
+    # agents are not required to use an AI with a token usage log
+    token_usage_log = getattr(getattr(agent, "ai", None), "token_usage_log", None)
+    if token_usage_log is None:
+        return None
+    log = token_usage_log.log()
+    if not log:
+        return 0, 0
+    return log[-1].total_prompt_tokens, log[-1].total_completion_tokens
+
+
+def execute(
+    env: DiskExecutionEnv, files_dict: FilesDict, command: str, benchmark: Benchmark
+) -> Assertable:
+    """
+    Run a task's command within the limits of the benchmark.
+
+    The command runs in its own process group, which is killed as a whole when the
+    command exceeds the benchmark's wall-clock timeout, and in any case once the command
+    exits, so that no background processes outlive the task. The CPU time limit applies
+    to each process of the group separately. Without SUPPORTS_RESOURCE_LIMITS, e.g. on
+    Windows, only the wall-clock timeout applies, to the command itself, and its peak
+    memory is not measured.
+
+    Parameters
+    ----------
+    env : DiskExecutionEnv
+        The environment the files of the task were uploaded to.
+    files_dict : FilesDict
+        The files of the task.
+    command : str
+        The shell command to run.
+    benchmark : Benchmark
+        The benchmark, whose timeout, CPU and output limits apply.
+
+    Returns
+    -------
+    Assertable
+        The files, output and resource usage of the command, to run assertions on.
+    """
+    limited = SUPPORTS_RESOURCE_LIMITS
+    if benchmark.cpu_limit and limited:
+        # set in the shell rather than in a preexec_fn, which is unsafe with threads
+        command = f"ulimit -S -t {benchmark.cpu_limit}; {command}"
+    start = time.monotonic()
+    p = subprocess.Popen(
+        command,
+        shell=True,
+        cwd=env.store.working_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=limited,
+    )
+    stdout = OutputBuffer(benchmark.max_output_bytes)
+    stderr = OutputBuffer(benchmark.max_output_bytes)
+    timed_out = False
+    rusage = None
+    try:
+        if limited:
+            capture_output(
+                p, {p.stdout: stdout, p.stderr: stderr}, benchmark.timeout, start
             )
-        )
-        if verbose:
-            print_results(task_results)
-    return task_results
+        else:
+            # selectors only support sockets on Windows
+            out, err = p.communicate(timeout=benchmark.timeout)
+            stdout.write(out)
+            stderr.write(err)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+    finally:
+        if limited:
+            kill_process_group(p)
+            _, status, rusage = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            p.kill()
+            p.wait()
+
+    return Assertable(
+        files=files_dict,
+        env=env,
+        process=p,
+        stdout=stdout.getvalue(),
+        stderr=stderr.getvalue(),
+        timed_out=timed_out or _exceeded_cpu_limit(p.returncode),
+        exit_code=p.returncode,
+        # ru_maxrss is in kilobytes, except on macOS
+        peak_rss=rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        if rusage is not None
+        else None,
+    )
+
+
+def _exceeded_cpu_limit(returncode: int) -> bool:
+    sigxcpu = getattr(signal, "SIGXCPU", None)
+    if sigxcpu is None:
+        return False
+    # a shell reports a child killed by a signal as 128 + the signal number
+    return returncode in (-sigxcpu, 128 + sigxcpu)
+
+
+def print_task_result(task_result: TaskResult):
+    print(f"\n--- Results for {task_result.task_name} ---")
+    print(f"{task_result.task_name} ({task_result.duration:.2f}s)")
+    for assertion_name, assertion_result in task_result.assertion_results.items():
+        checkmark = "✅" if assertion_result else "❌"
+        print(f"  {checkmark} {assertion_name}")
+    print()
 
 
 def print_results(results: list[TaskResult]):
     for task_result in results:
-        print(f"\n--- Results for {task_result.task_name} ---")
-        print(f"{task_result.task_name} ({task_result.duration:.2f}s)")
-        for assertion_name, assertion_result in task_result.assertion_results.items():
-            checkmark = "✅" if assertion_result else "❌"
-            print(f"  {checkmark} {assertion_name}")
-        print()
+        print_task_result(task_result)
 
     total_time = sum(task_result.duration for task_result in results)
     print(f"Total time: {total_time:.2f}s")
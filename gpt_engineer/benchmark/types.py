@@ -3,6 +3,7 @@ from subprocess import Popen
 from typing import Callable, Dict, Optional
 
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
+from gpt_engineer.core.default.disk_execution_env import MAX_OUTPUT_BYTES
 from gpt_engineer.core.files_dict import FilesDict
 
 
@@ -17,6 +18,9 @@ class Assertable:
         process (Popen): The subprocess in which the code is run.
         stdout (str): The standard output from the code execution.
         stderr (str): The standard error from the code execution.
+        timed_out (bool): Whether the code was killed for exceeding a time limit.
+        exit_code (int): The exit code of the code execution, negative if killed by a signal.
+        peak_rss (int): The peak resident set size of the code execution, in bytes.
     """
 
     files: FilesDict
@@ -24,6 +28,9 @@ class Assertable:
     process: Optional[Popen]
     stdout: Optional[str]
     stderr: Optional[str]
+    timed_out: bool = False
+    exit_code: Optional[int] = None
+    peak_rss: Optional[int] = None
 
 
 Assertion = Callable[[Assertable], bool]
@@ -40,11 +47,20 @@ class Task:
 
 @dataclass
 class Benchmark:
-    """A benchmark is a collection of tasks that evaluate a model's performance."""
+    """
+    A benchmark is a collection of tasks that evaluate a model's performance.
+
+    Attributes:
+        timeout (int): Wall-clock seconds after which a task's command is killed.
+        cpu_limit (int): CPU seconds after which a task's command is killed.
+        max_output_bytes (int): The output of a task's command kept per stream.
+    """
 
     name: str
     tasks: list[Task]
     timeout: Optional[int] = None
+    cpu_limit: Optional[int] = None
+    max_output_bytes: int = MAX_OUTPUT_BYTES
 
 
 @dataclass
@@ -52,3 +68,5 @@ class TaskResult:
     task_name: str
     assertion_results: dict[str, bool]
     duration: float
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
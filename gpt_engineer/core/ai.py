@@ -1,26 +1,38 @@
 from __future__ import annotations
 
+import functools
+import inspect
 import json
 import logging
 import os
+import sqlite3
+import time
 
-from typing import List, Optional, Union
+from contextlib import closing
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
 import backoff
-import openai
 
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.chat_models.base import BaseChatModel
-from langchain.schema import (
+from langchain_core.callbacks import (
+    BaseCallbackHandler,
+    Callbacks,
+    StreamingStdOutCallbackHandler,
+)
+from langchain_core.messages import (
     AIMessage,
     HumanMessage,
     SystemMessage,
     messages_from_dict,
     messages_to_dict,
 )
-from langchain_community.chat_models import AzureChatOpenAI, ChatOpenAI
 
 from gpt_engineer.core.token_usage import TokenUsageLog
+from gpt_engineer.core.tracing import span, traced
+from gpt_engineer.core.transcripts import TranscriptStore, request_key
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 # Type hint for a chat message
 Message = Union[AIMessage, HumanMessage, SystemMessage]
@@ -29,6 +41,233 @@ Message = Union[AIMessage, HumanMessage, SystemMessage]
 logger = logging.getLogger(__name__)
 
 
+class _FirstTokenTimer(BaseCallbackHandler):
+    """
+    Notes when a request started and when its first streamed token arrived.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def add_to(self, callbacks: Optional[Callbacks]) -> Optional[Callbacks]:
+        # a callback manager is passed on untouched, leaving the first token unknown
+        if callbacks is None or isinstance(callbacks, list):
+            return [*(callbacks or []), self]
+        return callbacks
+
+
+def _retry_on_rate_limit(fn):
+    """
+    Retry `fn` with exponential backoff on OpenAI rate limit errors.
+
+    The backoff is set up on the first call, since openai is only imported once a chat
+    model is created, as importing it is slow.
+    """
+    retrying = None
+
+    def with_backoff():
+        nonlocal retrying
+        if retrying is None:
+            import openai
+
+            retrying = backoff.on_exception(
+                backoff.expo, openai.error.RateLimitError, max_tries=7, max_time=45
+            )(fn)
+        return retrying
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            return await with_backoff()(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return with_backoff()(*args, **kwargs)
+
+    return wrapper
+
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache of LLM responses backed by SQLite.
+
+    Responses are keyed by a hash of the model name, the temperature and the
+    serialized message history, so identical requests are only sent to the API
+    once. Entries are evicted least-recently-used first when the cache grows
+    beyond `max_size_bytes`, and entries not used for `max_age_seconds` expire.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the SQLite database file.
+    hits : int
+        The number of lookups served from the cache.
+    misses : int
+        The number of lookups not found in the cache.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_size_bytes: Optional[int] = 256 * 1024 * 1024,
+        max_age_seconds: Optional[float] = 30 * 24 * 60 * 60,
+    ):
+        """
+        Initialize the response cache, creating the database if needed.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            The path of the SQLite database file.
+        max_size_bytes : Optional[int], optional
+            The maximum total size of cached responses, by default 256 MB. None disables size-based eviction.
+        max_age_seconds : Optional[float], optional
+            The time after its last use when an entry expires, by default 30 days. None disables expiry.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access "
+                "ON responses (last_access)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(model_name: str, temperature: float, messages: List[Message]) -> str:
+        """
+        Compute the cache key for a request.
+
+        Parameters
+        ----------
+        model_name : str
+            The name of the model the request is sent to.
+        temperature : float
+            The sampling temperature of the request.
+        messages : List[Message]
+            The message history sent to the model.
+
+        Returns
+        -------
+        str
+            A hex digest identifying the request.
+        """
+        return request_key(model_name, temperature, messages)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response and mark it as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, as computed by `key`.
+
+        Returns
+        -------
+        Optional[str]
+            The cached response content, or None if there is no valid entry.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT response, last_access FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1], now):
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Store a response in the cache and evict entries if the cache is over its limits.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, as computed by `key`.
+        response : str
+            The response content to cache.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), time.time()),
+            )
+            self._evict(conn)
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return (
+            self.max_age_seconds is not None
+            and now - last_access > self.max_age_seconds
+        )
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.max_age_seconds is not None:
+            conn.execute(
+                "DELETE FROM responses WHERE last_access < ?",
+                (time.time() - self.max_age_seconds,),
+            )
+        if self.max_size_bytes is None:
+            return
+        total_size = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ):
+            if total_size <= self.max_size_bytes:
+                break
+            evicted.append((key,))
+            total_size -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the hit and miss counters of this cache instance.
+
+        Returns
+        -------
+        Dict[str, int]
+            The number of hits, misses and stored entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
 class AI:
     def __init__(
         self,
@@ -36,6 +275,9 @@ class AI:
         temperature=0.1,
         azure_endpoint="",
         streaming=True,
+        response_cache: Optional[ResponseCache] = None,
+        transcript: Optional[TranscriptStore] = None,
+        base_url: Optional[str] = None,
     ):
         """
         Initialize the AI class.
@@ -46,17 +288,34 @@ class AI:
             The name of the model to use, by default "gpt-4".
         temperature : float, optional
             The temperature to use for the model, by default 0.1.
+        response_cache : Optional[ResponseCache], optional
+            A cache to serve identical requests from instead of calling the API, by default None.
+        transcript : Optional[TranscriptStore], optional
+            A transcript to record all requests to, or to replay responses from instead of
+            calling the API, by default the one configured in the environment, if any.
+        base_url : Optional[str], optional
+            The base URL of an OpenAI-compatible API to send requests to, e.g. a local mock
+            server, by default the `OPENAI_API_BASE` environment variable or OpenAI's API.
         """
         self.temperature = temperature
         self.azure_endpoint = azure_endpoint
         self.model_name = model_name
         self.streaming = streaming
+        self.response_cache = response_cache
+        self.transcript = transcript or TranscriptStore.from_env()
+        self.base_url = base_url
         self.llm = self._create_chat_model()
         self.token_usage_log = TokenUsageLog(model_name)
 
         logger.debug(f"Using model {self.model_name}")
 
-    def start(self, system: str, user: str, step_name: str) -> List[Message]:
+    def start(
+        self,
+        system: str,
+        user: str,
+        step_name: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> List[Message]:
         """
         Start the conversation with a system message and a user message.
 
@@ -68,6 +327,8 @@ class AI:
             The content of the user message.
         step_name : str
             The name of the step.
+        callbacks : Optional[Callbacks], optional
+            Additional callback handlers for this request, e.g. to consume streamed tokens, by default None.
 
         Returns
         -------
@@ -79,14 +340,16 @@ class AI:
             SystemMessage(content=system),
             HumanMessage(content=user),
         ]
-        return self.next(messages, step_name=step_name)
+        return self.next(messages, step_name=step_name, callbacks=callbacks)
 
+    @traced("llm", "AI.next", args=("step_name",))
     def next(
         self,
         messages: List[Message],
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        callbacks: Optional[Callbacks] = None,
     ) -> List[Message]:
         """
         Advances the conversation by sending message history
@@ -100,6 +363,8 @@ class AI:
             The prompt to use, by default None.
         step_name : str
             The name of the step.
+        callbacks : Optional[Callbacks], optional
+            Additional callback handlers for this request, e.g. to consume streamed tokens, by default None.
 
         Returns
         -------
@@ -115,20 +380,188 @@ class AI:
 
         logger.debug(f"Creating a new chat completion: {messages}")
 
-        response = self.backoff_inference(messages)
-
-        self.token_usage_log.update_log(
-            messages=messages, answer=response.content, step_name=step_name
-        )
+        response = self._cache_lookup(messages, callbacks)
+        cached = response is not None
+        if response is None:
+            timer = _FirstTokenTimer()
+            with span("inference", "llm", model=self.model_name):
+                response = self.backoff_inference(messages, timer.add_to(callbacks))
+            self._record_llm_call(timer)
+            self._cache_store(messages, response)
+        self._transcript_record(messages, response)
+
+        with span("count tokens", "tokenize"):
+            self.token_usage_log.update_log(
+                messages=messages,
+                answer=response.content,
+                step_name=step_name,
+                cached=cached,
+            )
         messages.append(response)
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
 
-    @backoff.on_exception(
-        backoff.expo, openai.error.RateLimitError, max_tries=7, max_time=45
-    )
-    def backoff_inference(self, messages):
+    async def astart(
+        self,
+        system: str,
+        user: str,
+        step_name: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> List[Message]:
+        """
+        Asynchronously start the conversation with a system message and a user message.
+
+        This is the asyncio counterpart of `start`. It does not block the event loop
+        while waiting for the LLM, so many conversations can be driven concurrently
+        from a single process.
+
+        Parameters
+        ----------
+        system : str
+            The content of the system message.
+        user : str
+            The content of the user message.
+        step_name : str
+            The name of the step.
+        callbacks : Optional[Callbacks], optional
+            Additional callback handlers for this request, e.g. to consume streamed tokens, by default None.
+
+        Returns
+        -------
+        List[Message]
+            The list of messages in the conversation.
+        """
+
+        messages: List[Message] = [
+            SystemMessage(content=system),
+            HumanMessage(content=user),
+        ]
+        return await self.anext(messages, step_name=step_name, callbacks=callbacks)
+
+    @traced("llm", "AI.anext", args=("step_name",))
+    async def anext(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> List[Message]:
+        """
+        Asynchronously advances the conversation by sending message history
+        to LLM and updating with the response.
+
+        This is the asyncio counterpart of `next`.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The list of messages in the conversation.
+        prompt : Optional[str], optional
+            The prompt to use, by default None.
+        step_name : str
+            The name of the step.
+        callbacks : Optional[Callbacks], optional
+            Additional callback handlers for this request, e.g. to consume streamed tokens, by default None.
+
+        Returns
+        -------
+        List[Message]
+            The updated list of messages in the conversation.
+        """
+        if prompt:
+            messages.append(HumanMessage(content=prompt))
+
+        logger.debug(f"Creating a new async chat completion: {messages}")
+
+        response = self._cache_lookup(messages, callbacks)
+        cached = response is not None
+        if response is None:
+            timer = _FirstTokenTimer()
+            with span("inference", "llm", model=self.model_name):
+                response = await self.abackoff_inference(
+                    messages, timer.add_to(callbacks)
+                )
+            self._record_llm_call(timer)
+            self._cache_store(messages, response)
+        self._transcript_record(messages, response)
+
+        with span("count tokens", "tokenize"):
+            self.token_usage_log.update_log(
+                messages=messages,
+                answer=response.content,
+                step_name=step_name,
+                cached=cached,
+            )
+        messages.append(response)
+        logger.debug(f"Async chat completion finished: {messages}")
+
+        return messages
+
+    def _cache_lookup(
+        self, messages: List[Message], callbacks: Optional[Callbacks] = None
+    ) -> Optional[AIMessage]:
+        """
+        Return the cached response to the given messages, if a response cache is configured and has one.
+        The cached response is replayed as a single token to the streaming callbacks.
+        """
+        if self.response_cache is None:
+            return None
+        key = self.response_cache.key(self.model_name, self.temperature, messages)
+        content = self.response_cache.get(key)
+        if content is None:
+            return None
+        logger.debug(f"Serving chat completion from cache: {key}")
+        if self.streaming:
+            print(content)
+        for callback in callbacks if isinstance(callbacks, list) else []:
+            if isinstance(callback, BaseCallbackHandler):
+                callback.on_llm_new_token(content)
+        return AIMessage(content=content)
+
+    def _record_llm_call(self, timer: "_FirstTokenTimer") -> None:
+        latency = time.perf_counter() - timer.start
+        first_token = (
+            timer.first_token - timer.start if timer.first_token is not None else None
+        )
+        self.token_usage_log.record_llm_call(latency, first_token)
+
+    def _cache_store(self, messages: List[Message], response: AIMessage) -> None:
+        if self.response_cache is None:
+            return
+        key = self.response_cache.key(self.model_name, self.temperature, messages)
+        self.response_cache.set(key, response.content)
+
+    def _transcript_record(self, messages: List[Message], response: AIMessage) -> None:
+        if self.transcript is None or self.transcript.replay:
+            return
+        self.transcript.record(
+            self.model_name, self.temperature, messages, response.content
+        )
+
+    @_retry_on_rate_limit
+    async def abackoff_inference(self, messages, callbacks: Optional[Callbacks] = None):
+        """
+        Asynchronously perform inference using the language model, with the same
+        exponential backoff strategy on rate limit errors as `backoff_inference`.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            A list of chat messages which will be passed to the language model for processing.
+        callbacks : Optional[Callbacks]
+            Callback handlers that are triggered during the inference, in addition to the model's own.
+
+        Returns
+        -------
+        Any
+            The output from the language model after processing the provided messages.
+        """
+        return await self.llm.ainvoke(messages, config={"callbacks": callbacks})  # type: ignore
+
+    @_retry_on_rate_limit
+    def backoff_inference(self, messages, callbacks: Optional[Callbacks] = None):
         """
         Perform inference using the language model while implementing an exponential backoff strategy.
 
@@ -141,9 +574,9 @@ class AI:
         messages : List[Message]
             A list of chat messages which will be passed to the language model for processing.
 
-        callbacks : List[Callable]
-            A list of callback functions that are triggered after each inference. These functions
-            can be used for logging, monitoring, or other auxiliary tasks.
+        callbacks : Optional[Callbacks]
+            Callback handlers that are triggered during the inference, in addition to the
+            model's own. These can be used for streaming, logging, monitoring, or other auxiliary tasks.
 
         Returns
         -------
@@ -161,7 +594,7 @@ class AI:
         >>> messages = [SystemMessage(content="Hello"), HumanMessage(content="How's the weather?")]
         >>> response = backoff_inference(messages)
         """
-        return self.llm.invoke(messages)  # type: ignore
+        return self.llm.invoke(messages, config={"callbacks": callbacks})  # type: ignore
 
     @staticmethod
     def serialize_messages(messages: List[Message]) -> str:
@@ -220,6 +653,23 @@ class AI:
         BaseChatModel
             The created chat model.
         """
+        # imported here rather than at module level, as they take most of the
+        # import time of this module
+        import openai
+
+        from langchain_community.chat_models import AzureChatOpenAI, ChatOpenAI
+
+        from gpt_engineer.core.transcripts import ReplayChatModel
+
+        if self.transcript is not None and self.transcript.replay:
+            return ReplayChatModel(
+                transcript=self.transcript,
+                model_name=self.model_name,
+                temperature=self.temperature,
+                streaming=self.streaming,
+                callbacks=[StreamingStdOutCallbackHandler()],
+            )
+
         if self.azure_endpoint:
             return AzureChatOpenAI(
                 openai_api_base=self.azure_endpoint,
@@ -233,6 +683,7 @@ class AI:
         return ChatOpenAI(
             model=self.model_name,
             temperature=self.temperature,
+            openai_api_base=self.base_url,
             streaming=self.streaming,
             client=openai.ChatCompletion,
             callbacks=[StreamingStdOutCallbackHandler()],
@@ -18,6 +18,7 @@ Dependencies:
 
 Functions:
 - parse_chat: Extracts code blocks from chat messages.
+- StreamingFilesParser: Extracts code blocks from a chat while it is being streamed.
 - to_files_and_memory: Saves chat content to memory and adds extracted files to a workspace.
 - to_files: Adds extracted files to a workspace.
 - get_code_strings: Retrieves file names and their content.
@@ -29,14 +30,28 @@ Functions:
 import logging
 import re
 
+from collections import Counter, defaultdict
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import LLMResult
+
+from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+# Lines starting with these are ignored when locating a code block fuzzily
+COMMENT_PREFIXES = ("# ", "//", "/*", "<!--")
+
+# Matches all ``` blocks and their preceding filenames
+FILE_BLOCK_REGEX = re.compile(r"(\S+)\n\s*```[^\n]*\n(.+?)```", re.DOTALL)
+
+
+@traced("parse")
 def chat_to_files_dict(chat) -> FilesDict:
     """
     Extracts all code blocks from a chat and returns them
@@ -52,31 +67,155 @@ def chat_to_files_dict(chat) -> FilesDict:
     List[Tuple[str, str]]
         A list of tuples, where each tuple contains a filename and a code block.
     """
-    # Get all ``` blocks and preceding filenames
-    regex = r"(\S+)\n\s*```[^\n]*\n(.+?)```"
-    matches = re.finditer(regex, chat, re.DOTALL)
-
     files_dict = FilesDict()
-    for match in matches:
-        # Strip the filename of any non-allowed characters and convert / to \
-        path = re.sub(r'[\:<>"|?*]', "", match.group(1))
+    for match in FILE_BLOCK_REGEX.finditer(chat):
+        path, content = _file_from_match(match)
+        files_dict[path] = content
+
+    return FilesDict(files_dict)
 
-        # Remove leading and trailing brackets
-        path = re.sub(r"^\[(.*)\]$", r"\1", path)
 
-        # Remove leading and trailing backticks
-        path = re.sub(r"^`(.*)`$", r"\1", path)
+def _file_from_match(match: re.Match) -> Tuple[str, str]:
+    # Strip the filename of any non-allowed characters and convert / to \
+    path = re.sub(r'[\:<>"|?*]', "", match.group(1))
 
-        # Remove trailing ]
-        path = re.sub(r"[\]\:]$", "", path)
+    # Remove leading and trailing brackets
+    path = re.sub(r"^\[(.*)\]$", r"\1", path)
 
-        # Get the code
-        content = match.group(2)
+    # Remove leading and trailing backticks
+    path = re.sub(r"^`(.*)`$", r"\1", path)
 
-        # Add the file to the list
-        files_dict[path.strip()] = content.strip()
+    # Remove trailing ]
+    path = re.sub(r"[\]\:]$", "", path)
 
-    return FilesDict(files_dict)
+    # Get the code
+    content = match.group(2)
+
+    return path.strip(), content.strip()
+
+
+class StreamingFilesParser:
+    """
+    Incrementally extracts code blocks from a chat while it is being streamed.
+
+    Chunks of the response are fed in as they arrive, and each (filename, codeblock)
+    pair is emitted as soon as its closing fence has been received, rather than after
+    the whole response is complete. Emitted files can optionally be written straight
+    into a memory such as `DiskMemory`, or handed to a callback, e.g. one uploading
+    them through a `FileStore`. The files found are the same as `chat_to_files_dict`
+    would find in the complete chat.
+
+    Attributes
+    ----------
+    files_dict : FilesDict
+        All files emitted so far.
+    """
+
+    def __init__(
+        self,
+        store: Optional[BaseMemory] = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+    ):
+        """
+        Parameters
+        ----------
+        store : Optional[BaseMemory], optional
+            Where to write each file as soon as it is complete, by default None.
+        on_file : Optional[Callable[[str, str], None]], optional
+            Called with the filename and content of each completed file, by default None.
+        """
+        self.store = store
+        self.on_file = on_file
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all received text and emitted files, e.g. when a request is retried.
+        """
+        self.files_dict = FilesDict()
+        # text received after the last completed block, kept as chunks to avoid
+        # re-joining the whole buffer for every streamed token
+        self._pending: List[str] = []
+        self._tail = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Consume a chunk of the streamed chat.
+
+        Parameters
+        ----------
+        chunk : str
+            The next part of the chat.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            The files whose code block was completed by this chunk.
+        """
+        self._pending.append(chunk)
+        # A block can only be completed by a new fence, which may straddle two chunks
+        window = self._tail + chunk
+        self._tail = window[-2:]
+        if "```" not in window:
+            return []
+
+        buffer = "".join(self._pending)
+        pos = 0
+        completed = []
+        for match in FILE_BLOCK_REGEX.finditer(buffer):
+            completed.append(self._emit(*_file_from_match(match)))
+            pos = match.end()
+        self._pending = [buffer[pos:]]
+        return completed
+
+    def close(self) -> FilesDict:
+        """
+        Signal the end of the chat.
+
+        Returns
+        -------
+        FilesDict
+            All files found in the chat.
+        """
+        return FilesDict(self.files_dict)
+
+    def _emit(self, path: str, content: str) -> Tuple[str, str]:
+        self.files_dict[path] = content
+        if self.store is not None:
+            self.store[path] = content
+        if self.on_file is not None:
+            self.on_file(path, content)
+        return path, content
+
+
+class StreamingFilesCallbackHandler(BaseCallbackHandler):
+    """
+    Feeds the tokens streamed by a chat model into a `StreamingFilesParser`.
+
+    Pass an instance in the `callbacks` of `AI.start`/`AI.next` to have files
+    emitted while the response is still being generated. If the model does not
+    stream, the complete response is parsed when it finishes.
+    """
+
+    def __init__(self, parser: StreamingFilesParser):
+        self.parser = parser
+        self._received_tokens = False
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        # a new (or retried) request starts a new response
+        self.parser.reset()
+        self._received_tokens = False
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.on_llm_start(*args, **kwargs)
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self._received_tokens = True
+        self.parser.feed(token)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        if not self._received_tokens:
+            self.parser.feed(response.generations[0][0].text)
 
 
 def overwrite_code_with_edits(chat: str, files_dict: FilesDict):
@@ -104,6 +243,7 @@ class Edit:
     after: str
 
 
+@traced("parse")
 def parse_edits(chat: str):
     """
     Parse edits from a chat string.
@@ -159,38 +299,286 @@ def parse_edits(chat: str):
     return edits
 
 
-def apply_edits(edits: List[Edit], files_dict: FilesDict):
+@traced("parse")
+def apply_edits(
+    edits: List[Edit],
+    files_dict: FilesDict,
+    fuzzy: bool = True,
+):
     """
     Apply a list of edits to the given code.
 
     This function takes a list of Edit objects and applies each edit to the code object.
     It handles the creation of new files and the modification of existing files based on the edits.
 
+    Edits are grouped by file, and all edits to a file are located in its content in
+    a single pass, after which the new content is built once. Overlapping edits are
+    detected; the one that starts first in the file is applied and the other skipped.
+    Code blocks without an exact match are located with `find_fuzzy_match`.
+
     Parameters
     ----------
     edits : List[Edit]
         A list of Edit objects representing the code edits to apply.
     files_dict : FilesDict
         The code object to apply edits to.
+    fuzzy : bool, optional
+        Whether code blocks without an exact match are located with `find_fuzzy_match`,
+        by default True.
     """
+    edits_by_file: Dict[str, List[Edit]] = {}
     for edit in edits:
-        filename = edit.filename
-        if edit.before == "":
-            if filename in files_dict:
-                logger.warning(
-                    f"The edit to be applied wants to create a new file `{filename}`, but that already exists. The file will be overwritten. See `.gpteng/memory` for previous version."
-                )
-            files_dict[filename] = edit.after  # new file
-        else:
-            occurrences_cnt = files_dict[filename].count(edit.before)
-            if occurrences_cnt == 0:
-                logger.warning(
-                    f"While applying an edit to `{filename}`, the code block to be replaced was not found. No instances will be replaced."
+        edits_by_file.setdefault(edit.filename, []).append(edit)
+
+    for filename, file_edits in edits_by_file.items():
+        exists = filename in files_dict
+        content = files_dict[filename] if exists else None
+        replacements: List[Edit] = []
+        for edit in file_edits:
+            if edit.before == "":
+                if replacements:
+                    content = _apply_replacements(
+                        filename, content, replacements, fuzzy
+                    )
+                    replacements = []
+                if exists:
+                    logger.warning(
+                        f"The edit to be applied wants to create a new file `{filename}`, but that already exists. The file will be overwritten. See `.gpteng/memory` for previous version."
+                    )
+                content = edit.after  # new file
+                exists = True
+            else:
+                if not exists:
+                    raise KeyError(filename)
+                replacements.append(edit)
+        if replacements:
+            content = _apply_replacements(filename, content, replacements, fuzzy)
+        files_dict[filename] = content
+
+
+def _apply_replacements(
+    filename: str,
+    content: str,
+    edits: List[Edit],
+    fuzzy: bool = True,
+) -> str:
+    """
+    Replace all occurrences of the `before` blocks of the edits in the content at once.
+
+    Edits whose `before` block is not found in the content, but may have been
+    introduced by another edit, are applied to the result afterwards, falling
+    back to a fuzzy match.
+    """
+    # (start, end, edit index, replacement) of every occurrence of every edit
+    spans: List[Tuple[int, int, int, str]] = []
+    chained_edits = []
+    for i, edit in enumerate(edits):
+        offsets = _find_all(content, edit.before)
+        if not offsets:
+            chained_edits.append(edit)
+            continue
+        if len(offsets) > 1:
+            _warn_multiple_occurrences(filename)
+        spans.extend(
+            (offset, offset + len(edit.before), i, edit.after) for offset in offsets
+        )
+
+    pieces = []
+    last_end = 0
+    for start, end, _, after in sorted(spans):
+        if start < last_end:
+            logger.warning(
+                f"While applying edits to `{filename}`, two edits replace overlapping code blocks. Only the first one will be applied."
+            )
+            continue
+        pieces.append(content[last_end:start])
+        pieces.append(after)
+        last_end = end
+    pieces.append(content[last_end:])
+    content = "".join(pieces)
+
+    for edit in chained_edits:
+        occurrences_cnt = content.count(edit.before)
+        if occurrences_cnt == 0:
+            match = find_fuzzy_match(content, edit.before) if fuzzy else None
+            if match is not None:
+                logger.info(
+                    f"While applying an edit to `{filename}`, the code block to be replaced was not found exactly, but matched up to whitespace and comments."
                 )
-            if occurrences_cnt > 1:
-                logger.warning(
-                    f"While applying an edit to `{filename}`, the code block to be replaced was found multiple times. All instances will be replaced."
+                matched = content[match.start : match.end]
+                after = _reindent(edit.after, edit.before, matched)
+                content = (
+                    content[: match.start]
+                    + _restore_comments(after, edit.before, matched)
+                    + content[match.end :]
                 )
-            files_dict[filename] = files_dict[filename].replace(
-                edit.before, edit.after
-            )  # existing file
+                continue
+            logger.warning(
+                f"While applying an edit to `{filename}`, the code block to be replaced was not found. No instances will be replaced."
+            )
+        if occurrences_cnt > 1:
+            _warn_multiple_occurrences(filename)
+        content = content.replace(edit.before, edit.after)
+    return content
+
+
+def _find_all(content: str, block: str) -> List[int]:
+    # non-overlapping, like str.replace
+    offsets = []
+    offset = content.find(block)
+    while offset != -1:
+        offsets.append(offset)
+        offset = content.find(block, offset + len(block))
+    return offsets
+
+
+def _warn_multiple_occurrences(filename: str):
+    logger.warning(
+        f"While applying an edit to `{filename}`, the code block to be replaced was found multiple times. All instances will be replaced."
+    )
+
+
+@dataclass
+class FuzzyMatch:
+    start: int
+    end: int
+
+
+def find_fuzzy_match(content: str, block: str) -> Optional[FuzzyMatch]:
+    """
+    Locate a code block in the content, tolerating differences in whitespace,
+    indentation, blank lines and comment lines only.
+
+    Lines are compared after normalizing their whitespace, and blank and comment
+    lines are ignored. All other lines must be identical, so a block in which any
+    line of code differs from the content is not matched, rather than silently
+    replacing that line.
+
+    Parameters
+    ----------
+    content : str
+        The content to search in.
+    block : str
+        The code block to locate.
+
+    Returns
+    -------
+    Optional[FuzzyMatch]
+        The character span of the matched lines in the content, or None if the block
+        is not found, or found more than once.
+    """
+    block_lines = [line for _, _, line in _significant_lines(block)]
+    if not block_lines:
+        return None
+    content_lines = _significant_lines(content)
+    normalized = [line for _, _, line in content_lines]
+
+    n = len(block_lines)
+    starts = [
+        i
+        for i, line in enumerate(normalized)
+        if line == block_lines[0] and normalized[i : i + n] == block_lines
+    ]
+    if len(starts) != 1:
+        return None  # not found, or ambiguous
+
+    start = starts[0]
+    return FuzzyMatch(
+        start=content_lines[start][0], end=content_lines[start + n - 1][1]
+    )
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _is_comment(normalized: str) -> bool:
+    return normalized == "#" or normalized.startswith(COMMENT_PREFIXES)
+
+
+def _significant_lines(text: str) -> List[Tuple[int, int, str]]:
+    # (start, end, normalized line) of each non-blank, non-comment line, where the
+    # span excludes leading and trailing whitespace
+    lines = []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        normalized = _normalize(line)
+        if normalized and not _is_comment(normalized):
+            start = offset + len(line) - len(line.lstrip())
+            lines.append((start, offset + len(line.rstrip()), normalized))
+        offset += len(line)
+    return lines
+
+
+def _restore_comments(after: str, before: str, matched: str) -> str:
+    """
+    Keep the comment lines of the code block as found (`matched`) that are missing
+    from the code block as given (`before`), by inserting them into `after` before
+    the line they preceded, or after the last line of `after` that was located.
+    """
+    given = Counter(_normalize(line) for line in before.split("\n"))
+    after_lines = after.split("\n")
+    normalized_after = [_normalize(line) for line in after_lines]
+    # comment lines to insert, by the index of the line of `after` they precede
+    insertions: Dict[int, List[str]] = defaultdict(list)
+    pending: List[str] = []
+    # the first line of `after` continues the line of the content the match starts in
+    cursor = 1
+    for line in matched.split("\n"):
+        normalized = _normalize(line)
+        if not normalized:
+            continue
+        if _is_comment(normalized):
+            if given[normalized]:
+                given[normalized] -= 1
+            else:
+                pending.append(line)
+            continue
+        try:
+            position = normalized_after.index(normalized, cursor)
+        except ValueError:
+            position = None
+        if pending:
+            insertions[cursor if position is None else position].extend(pending)
+            pending = []
+        if position is not None:
+            cursor = position + 1
+
+    if not insertions:
+        return after
+    lines = []
+    for i, line in enumerate(after_lines):
+        lines.extend(insertions.get(i, []))
+        lines.append(line)
+    lines.extend(insertions.get(len(after_lines), []))
+    return "\n".join(lines)
+
+
+def _reindent(after: str, before: str, matched: str) -> str:
+    """
+    Shift the indentation of the continuation lines of `after` by the difference in
+    indentation between the code block as given (`before`) and as found (`matched`).
+    """
+
+    def indentation(text: str) -> Optional[str]:
+        indents = [
+            line[: len(line) - len(line.lstrip())]
+            for line in text.split("\n")[1:]
+            if line.strip()
+        ]
+        return min(indents, key=len) if indents else None
+
+    given, found = indentation(before), indentation(matched)
+    if given is None or found is None or len(given) == len(found):
+        return after
+
+    lines = after.split("\n")
+    if len(found) > len(given):
+        prefix = found[: len(found) - len(given)]
+        lines[1:] = [prefix + line if line.strip() else line for line in lines[1:]]
+    else:
+        excess = len(given) - len(found)
+        lines[1:] = [
+            line[min(excess, len(line) - len(line.lstrip())) :] for line in lines[1:]
+        ]
+    return "\n".join(lines)
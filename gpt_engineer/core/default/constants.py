@@ -1 +1,7 @@
 MAX_EDIT_REFINEMENT_STEPS = 1
+
+# The model used unless another one is chosen
+DEFAULT_MODEL = "gpt-4-1106-preview"
+
+# The maximum number of projects of a batch that run at the same time
+DEFAULT_BATCH_WORKERS = 4
@@ -1,12 +1,24 @@
+import codecs
+import os
+import selectors
+import signal
 import subprocess
 import time
 
+from collections import deque
 from pathlib import Path
-from typing import Optional, Tuple, Union
+from typing import IO, Deque, Dict, Optional, Tuple, Union
 
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.default.file_store import FileStore
 from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.tracing import traced
+
+# output kept per stream by default; older output is dropped
+MAX_OUTPUT_BYTES = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# how often `run` checks whether the process exited while its pipes stay open
+POLL_INTERVAL = 0.1
 
 
 class DiskExecutionEnv(BaseExecutionEnv):
@@ -24,13 +36,16 @@ class DiskExecutionEnv(BaseExecutionEnv):
     def __init__(self, path: Union[str, Path, None] = None):
         self.store = FileStore(path)
 
+    @traced("execution")
     def upload(self, files: FilesDict) -> "DiskExecutionEnv":
-        self.store.upload(files)
+        self.store.upload(files, delete_removed=True)
         return self
 
+    @traced("execution")
     def download(self) -> FilesDict:
         return self.store.download()
 
+    @traced("execution", args=("command",))
     def popen(self, command: str) -> subprocess.Popen:
         p = subprocess.Popen(
             command,
@@ -41,43 +56,185 @@ class DiskExecutionEnv(BaseExecutionEnv):
         )
         return p
 
+    @traced("execution", args=("command",))
     def run(self, command: str, timeout: Optional[int] = None) -> Tuple[str, str, int]:
-        start = time.time()
+        """
+        Run a command in the working directory, printing its output while it runs.
+
+        Stdout and stderr are read concurrently through a selector, so a process that
+        writes to only one of them never stalls the other. Only the last
+        `MAX_OUTPUT_BYTES` of each stream are kept. The command runs in its own process
+        group, which is killed as a whole on timeout or Ctrl-C.
+
+        Parameters
+        ----------
+        command : str
+            The shell command to run.
+        timeout : Optional[int], optional
+            The number of seconds after which the command is killed, by default None.
+
+        Returns
+        -------
+        Tuple[str, str, int]
+            The captured stdout, the captured stderr and the return code.
+
+        Raises
+        ------
+        TimeoutError
+            If the command did not finish within `timeout` seconds.
+        """
+        start = time.monotonic()
         print("\n--- Start of run ---")
-        # while running, also print the stdout and stderr
         p = subprocess.Popen(
             command,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=self.store.working_dir,
-            text=True,
             shell=True,
+            start_new_session=os.name == "posix",
         )
         print("$", command)
-        stdout_full, stderr_full = "", ""
+        stdout, stderr = OutputBuffer(echo=True), OutputBuffer(echo=True)
 
         try:
-            while p.poll() is None:
-                assert p.stdout is not None
-                assert p.stderr is not None
-                stdout = p.stdout.readline()
-                stderr = p.stderr.readline()
-                if stdout:
-                    print(stdout, end="")
-                    stdout_full += stdout
-                if stderr:
-                    print(stderr, end="")
-                    stderr_full += stderr
-                if timeout and time.time() - start > timeout:
-                    print("Timeout!")
-                    p.kill()
-                    raise TimeoutError()
+            if os.name == "posix":
+                capture_output(p, {p.stdout: stdout, p.stderr: stderr}, timeout, start)
+            else:
+                # selectors only support sockets on Windows
+                out, err = p.communicate(timeout=timeout)
+                stdout.write(out)
+                stderr.write(err)
+            p.wait()
+        except subprocess.TimeoutExpired:
+            print("Timeout!")
+            kill_process_group(p)
+            p.wait()
+            raise TimeoutError()
         except KeyboardInterrupt:
             print()
             print("Stopping execution.")
+            kill_process_group(p)
+            p.wait()
             print("Execution stopped.")
-            p.kill()
             print()
             print("--- Finished run ---\n")
 
-        return stdout_full, stderr_full, p.returncode
+        return stdout.getvalue(), stderr.getvalue(), p.returncode
+
+
+def capture_output(
+    p: subprocess.Popen,
+    buffers: Dict[IO[bytes], "OutputBuffer"],
+    timeout: Optional[float] = None,
+    start: Optional[float] = None,
+) -> None:
+    """
+    Read the pipes of a process into buffers until the process exits, without reaping
+    it, so that the caller can still collect its exit status and resource usage. POSIX
+    only.
+
+    Parameters
+    ----------
+    p : subprocess.Popen
+        The process to read from.
+    buffers : Dict[IO[bytes], OutputBuffer]
+        The buffer to collect the output of each pipe in.
+    timeout : Optional[float], optional
+        The number of seconds after `start` at which to give up, by default None.
+    start : Optional[float], optional
+        The `time.monotonic()` at which the process was started, by default now.
+
+    Raises
+    ------
+    subprocess.TimeoutExpired
+        If the process is still running after `timeout` seconds.
+    """
+    start = time.monotonic() if start is None else start
+    with selectors.DefaultSelector() as selector:
+        for pipe, buffer in buffers.items():
+            selector.register(pipe, selectors.EVENT_READ, buffer)
+        while selector.get_map():
+            remaining = POLL_INTERVAL
+            if timeout:
+                remaining = min(remaining, start + timeout - time.monotonic())
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(p.args, timeout)
+            exited = _has_exited(p)
+            # once the process has exited, only drain what is already buffered, as
+            # background children may keep the pipes open
+            for key, _ in selector.select(0 if exited else remaining):
+                chunk = os.read(key.fd, CHUNK_SIZE)
+                if chunk:
+                    key.data.write(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+            if exited and not selector.select(0):
+                break
+    for pipe in buffers:
+        pipe.close()
+
+
+def _has_exited(p: subprocess.Popen) -> bool:
+    if p.returncode is not None:
+        return True
+    try:
+        return (
+            os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+        )
+    except ChildProcessError:
+        return p.poll() is not None
+
+
+class OutputBuffer:
+    """
+    Collects the output of one stream, keeping only its last `max_bytes`.
+
+    Attributes
+    ----------
+    max_bytes : int
+        The number of bytes to keep; older output is dropped.
+    echo : bool
+        Whether to print the output as it is written.
+    """
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES, echo: bool = False):
+        self.max_bytes = max_bytes
+        self.echo = echo
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        self._truncated = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, chunk: bytes) -> None:
+        if self.echo:
+            print(self._decoder.decode(chunk), end="", flush=True)
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._size > self.max_bytes:
+            excess = self._size - self.max_bytes
+            head = self._chunks.popleft()
+            if len(head) > excess:
+                self._chunks.appendleft(head[excess:])
+                head = head[:excess]
+            self._size -= len(head)
+            self._truncated += len(head)
+
+    def getvalue(self) -> str:
+        value = b"".join(self._chunks).decode("utf-8", errors="replace")
+        if self._truncated:
+            value = f"[... {self._truncated} bytes truncated ...]\n" + value
+        return value
+
+
+def kill_process_group(p: subprocess.Popen) -> None:
+    """
+    Kill a process started with `start_new_session=True` together with all of its
+    children, without reaping it.
+    """
+    if os.name == "posix":
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        p.kill()
@@ -28,12 +28,15 @@ Imports:
 """
 
 import json
+import os
 import shutil
+import threading
 
 from pathlib import Path
-from typing import Any, Dict, Iterator, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.tracing import traced
 from gpt_engineer.tools.experimental.supported_languages import SUPPORTED_LANGUAGES
 
 
@@ -46,6 +49,10 @@ class DiskMemory(BaseMemory):
     facilitate CRUD-like interactions. It allows for quick checks on the existence of keys,
     retrieval of values based on keys, and setting new key-value pairs.
 
+    The keys are kept in an in-process index, which is updated on writes and deletes and
+    revalidated against the modification times of the directories, so that membership,
+    length and iteration do not walk the directory tree each time.
+
     Attributes:
         path (Path): The directory path where the database files are stored.
     """
@@ -98,6 +105,13 @@ class DiskMemory(BaseMemory):
 
         self.path.mkdir(parents=True, exist_ok=True)
 
+        # In-process index of the keys, revalidated against the modification times
+        # of the directories, so that listing the database does not walk the tree
+        self._lock = threading.RLock()
+        self._keys: Optional[Set[str]] = None
+        self._sorted_keys: Optional[List[str]] = None
+        self._dir_mtimes: Dict[str, int] = {}
+
     def __contains__(self, key: str) -> bool:
         """
         Check if a file with the specified name exists in the database.
@@ -112,8 +126,12 @@ class DiskMemory(BaseMemory):
         bool
             True if the file exists, False otherwise.
         """
-        return (self.path / key).is_file()
+        relative_key = self._relative_key(key)
+        if relative_key is None:
+            return (self.path / key).is_file()
+        return relative_key in self._index()
 
+    @traced("io", "DiskMemory.get", args=("key",))
     def __getitem__(self, key: str) -> str:
         """
         Get the content of a file in the database.
@@ -161,6 +179,7 @@ class DiskMemory(BaseMemory):
         except KeyError:
             return default
 
+    @traced("io", "DiskMemory.set", args=("key",))
     def __setitem__(self, key: Union[str, Path], val: str) -> None:
         """
         Set the content of a file in the database.
@@ -184,10 +203,13 @@ class DiskMemory(BaseMemory):
             raise TypeError("val must be str")
 
         full_path = self.path / key
-        full_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            full_path.parent.mkdir(parents=True, exist_ok=True)
 
-        full_path.write_text(val, encoding="utf-8")
+            full_path.write_text(val, encoding="utf-8")
+            self._index_added(key, full_path.parent)
 
+    @traced("io", "DiskMemory.delete", args=("key",))
     def __delitem__(self, key: Union[str, Path]) -> None:
         """
         Delete a file or directory in the database.
@@ -206,22 +228,108 @@ class DiskMemory(BaseMemory):
         if not item_path.exists():
             raise KeyError(f"Item '{key}' could not be found in '{self.path}'")
 
-        if item_path.is_file():
-            item_path.unlink()
-        elif item_path.is_dir():
-            shutil.rmtree(item_path)
+        with self._lock:
+            if item_path.is_file():
+                item_path.unlink()
+            elif item_path.is_dir():
+                shutil.rmtree(item_path)
+            self._index_removed(key, item_path.parent)
 
+    @traced("io", "DiskMemory.list")
     def __iter__(self) -> Iterator[str]:
-        return iter(
-            sorted(
-                str(item.relative_to(self.path))
-                for item in sorted(self.path.rglob("*"))
-                if item.is_file()
-            )
-        )
+        with self._lock:
+            self._index()
+            if self._sorted_keys is None:
+                self._sorted_keys = sorted(self._keys)
+            return iter(self._sorted_keys)
 
     def __len__(self):
-        return len(list(self.__iter__()))
+        return len(self._index())
+
+    def _relative_key(self, key: Union[str, Path]) -> Optional[str]:
+        """
+        The key as listed by iteration, or None if it does not point into the database.
+        """
+        relative = os.path.normpath(os.path.join(self.path, key))
+        if not relative.startswith(str(self.path) + os.sep):
+            return None
+        return relative[len(str(self.path)) + 1 :]
+
+    def _index(self) -> Set[str]:
+        with self._lock:
+            if self._keys is None or self._index_is_stale():
+                self._keys, self._dir_mtimes = self._scan()
+                self._sorted_keys = None
+            return self._keys
+
+    def _index_is_stale(self) -> bool:
+        # entries are only added or removed in a directory if its mtime changes
+        for directory, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def _scan(self) -> Tuple[Set[str], Dict[str, int]]:
+        keys = set()
+        dir_mtimes = {}
+        stack = [(str(self.path), "")]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, prefix + entry.name + os.sep))
+                        elif entry.is_file():
+                            keys.add(prefix + entry.name)
+            except FileNotFoundError:
+                continue
+        return keys, dir_mtimes
+
+    def _index_added(self, key: Union[str, Path], parent: Path) -> None:
+        if self._keys is None:
+            return
+        relative_key = self._relative_key(key)
+        if relative_key is None:
+            self._keys = None
+            return
+        self._keys.add(relative_key)
+        self._sorted_keys = None
+        self._refresh_dir_mtimes(parent)
+
+    def _index_removed(self, key: Union[str, Path], parent: Path) -> None:
+        if self._keys is None:
+            return
+        relative_key = self._relative_key(key)
+        if relative_key is None:
+            self._keys = None
+            return
+        directory_prefix = relative_key + os.sep
+        self._keys = {
+            k
+            for k in self._keys
+            if k != relative_key and not k.startswith(directory_prefix)
+        }
+        self._sorted_keys = None
+        removed_dir = str(self.path / relative_key)
+        self._dir_mtimes = {
+            d: m
+            for d, m in self._dir_mtimes.items()
+            if d != removed_dir and not d.startswith(removed_dir + os.sep)
+        }
+        self._refresh_dir_mtimes(parent)
+
+    def _refresh_dir_mtimes(self, directory: Path) -> None:
+        # record the directories changed by this process, from `directory` up to the root
+        while True:
+            self._dir_mtimes[str(directory)] = os.stat(directory).st_mtime_ns
+            if directory == self.path or self.path not in directory.parents:
+                break
+            directory = directory.parent
 
     def _supported_files(self) -> str:
         valid_extensions = {
@@ -230,12 +338,12 @@ class DiskMemory(BaseMemory):
         file_paths = [
             str(item)
             for item in self
-            if Path(item).is_file() and Path(item).suffix in valid_extensions
+            if Path(item).suffix in valid_extensions and (self.path / item).is_file()
         ]
         return "\n".join(file_paths)
 
     def _all_files(self) -> str:
-        file_paths = [str(item) for item in self if Path(item).is_file()]
+        file_paths = [str(item) for item in self if (self.path / item).is_file()]
         return "\n".join(file_paths)
 
     def to_path_list_string(self, supported_code_files_only: bool = False) -> str:
@@ -247,6 +355,7 @@ class DiskMemory(BaseMemory):
         else:
             return self._all_files()
 
+    @traced("io")
     def to_dict(self) -> Dict[Union[str, Path], str]:
         return {file_path: self[file_path] for file_path in self}
 
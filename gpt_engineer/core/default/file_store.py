@@ -1,12 +1,52 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
 import tempfile
+import uuid
 
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Union
+from typing import Dict, Union
 
+from gpt_engineer.core.default.paths import FILE_STORE_MANIFEST_FILE, metadata_path
 from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UploadStats:
+    """
+    Summary of the changes a `FileStore.upload` made to the working directory.
+    """
+
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    bytes_written: int = 0
 
 
 class FileStore:
+    """
+    A working directory that files are uploaded to and downloaded from.
+
+    The store keeps a manifest of the content hash, size and modification time of every
+    file it uploaded, in the `.gpteng` folder of the working directory. Uploads compare
+    against it, falling back to the file on disk for files the store did not write or
+    that were modified since, and only rewrite files whose content changed. Files are
+    written to a temporary file first and renamed into place.
+
+    Attributes
+    ----------
+    working_dir : Path
+        The directory files are uploaded to.
+    last_upload : UploadStats
+        What the most recent upload wrote, skipped and deleted.
+    """
+
     def __init__(self, path: Union[str, Path, None] = None):
         if path is None:
             path = Path(tempfile.mkdtemp(prefix="gpt-engineer-"))
@@ -14,19 +54,77 @@ class FileStore:
         self.working_dir = Path(path)
         self.working_dir.mkdir(parents=True, exist_ok=True)
         self.id = self.working_dir.name.split("-")[-1]
+        self.manifest_path = (
+            Path(metadata_path(self.working_dir)) / FILE_STORE_MANIFEST_FILE
+        )
+        self.last_upload = UploadStats()
+
+    @traced("io")
+    def upload(self, files: FilesDict, delete_removed: bool = False):
+        """
+        Write the files to the working directory, skipping files that are unchanged.
+
+        Parameters
+        ----------
+        files : FilesDict
+            The files to write, keyed by their path relative to the working directory.
+        delete_removed : bool, optional
+            Whether to delete files that a previous upload included but `files` does
+            not. Other files in the working directory are never deleted. By default
+            False, as callers often upload only a subset of the files.
 
-    def upload(self, files: FilesDict):
+        Returns
+        -------
+        FileStore
+            The store itself, to allow chaining.
+        """
+        manifest = self._load_manifest()
+        stats = UploadStats()
+        uploaded = set()
+        manifest_changed = False
         for name, content in files.items():
+            key = Path(name).as_posix()
+            uploaded.add(key)
+            data = content.encode("utf-8")
             path = self.working_dir / name
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w") as f:
-                f.write(content)
+            entry = manifest.get(key)
+            if self._is_unchanged(path, entry, data):
+                stats.unchanged += 1
+                if entry is None or entry["mtime_ns"] != path.stat().st_mtime_ns:
+                    manifest[key] = self._manifest_entry(path, data)
+                    manifest_changed = True
+                continue
+            self._atomic_write(path, data)
+            manifest[key] = self._manifest_entry(path, data)
+            manifest_changed = True
+            stats.written += 1
+            stats.bytes_written += manifest[key]["size"]
+
+        if delete_removed:
+            for key in set(manifest) - uploaded:
+                path = self.working_dir / key
+                if path.is_file():
+                    path.unlink()
+                    self._remove_empty_parents(path)
+                    stats.deleted += 1
+                del manifest[key]
+                manifest_changed = True
+
+        if manifest_changed:
+            self._save_manifest(manifest)
+        self.last_upload = stats
+        logger.debug(
+            f"Uploaded to {self.working_dir}: {stats.written} written "
+            f"({stats.bytes_written} bytes), {stats.unchanged} unchanged, "
+            f"{stats.deleted} deleted"
+        )
         return self
 
+    @traced("io")
     def download(self) -> FilesDict:
         files = {}
         for path in self.working_dir.glob("**/*"):
-            if path.is_file():
+            if path.is_file() and path != self.manifest_path:
                 with open(path, "r") as f:
                     try:
                         content = f.read()
@@ -34,3 +132,53 @@ class FileStore:
                         content = "binary file"
                     files[str(path.relative_to(self.working_dir))] = content
         return FilesDict(files)
+
+    @staticmethod
+    def _is_unchanged(path: Path, entry: Union[Dict, None], data: bytes) -> bool:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != len(data):
+            return False
+        if entry is not None and stat.st_mtime_ns == entry["mtime_ns"]:
+            return entry["sha256"] == hashlib.sha256(data).hexdigest()
+        # not written by the store, or modified since: compare the actual content
+        return path.read_bytes() == data
+
+    @staticmethod
+    def _manifest_entry(path: Path, data: bytes) -> Dict:
+        stat = path.stat()
+        return {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            if path.exists():
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _remove_empty_parents(self, path: Path) -> None:
+        parent = path.parent
+        while parent != self.working_dir and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, Dict]) -> None:
+        self._atomic_write(self.manifest_path, json.dumps(manifest).encode("utf-8"))
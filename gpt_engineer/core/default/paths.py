@@ -4,10 +4,14 @@ from pathlib import Path
 
 META_DATA_REL_PATH = ".gpteng"
 MEMORY_REL_PATH = os.path.join(META_DATA_REL_PATH, "memory")
+MEMORY_DB_REL_PATH = os.path.join(META_DATA_REL_PATH, "memory.db")
 CODE_GEN_LOG_FILE = "all_output.txt"
 IMPROVE_LOG_FILE = "improve.txt"
 ENTRYPOINT_FILE = "run.sh"
 ENTRYPOINT_LOG_FILE = "gen_entrypoint_chat.txt"
+LLM_CACHE_FILE = "llm_cache.db"
+FILE_STORE_MANIFEST_FILE = "file_store_manifest.json"
+CODE_INDEX_DIR = "code_index"
 PREPROMPTS_PATH = Path(__file__).parent.parent.parent / "preprompts"
 
 
@@ -15,5 +19,9 @@ def memory_path(path):
     return os.path.join(path, MEMORY_REL_PATH)
 
 
+def memory_db_path(path):
+    return os.path.join(path, MEMORY_DB_REL_PATH)
+
+
 def metadata_path(path):
     return os.path.join(path, META_DATA_REL_PATH)
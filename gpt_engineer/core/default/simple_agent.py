@@ -42,10 +42,14 @@ class SimpleAgent(BaseAgent):
 
     @classmethod
     def with_default_config(
-        cls, path: str, ai: AI = None, preprompts_holder: PrepromptsHolder = None
+        cls,
+        path: str,
+        ai: AI = None,
+        preprompts_holder: PrepromptsHolder = None,
+        memory: BaseMemory = None,
     ):
         return cls(
-            memory=DiskMemory(memory_path(path)),
+            memory=memory if memory is not None else DiskMemory(memory_path(path)),
             execution_env=DiskExecutionEnv(),
             ai=ai,
             preprompts_holder=preprompts_holder or PrepromptsHolder(PREPROMPTS_PATH),
@@ -0,0 +1,319 @@
+"""
+Module for a SQLite-backed key-value database.
+
+This module provides `SqliteMemory`, a drop-in alternative to `DiskMemory` that stores
+all keys and values in a single SQLite database file instead of one file per key. This
+avoids many small-file writes and inode churn, e.g. on shared storage.
+
+Classes:
+    SqliteMemory:
+        A key-value store implemented on a SQLite database in WAL mode, with optional
+        zlib compression of the values and batched transactions.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from gpt_engineer.core.base_memory import BaseMemory
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.tracing import traced
+from gpt_engineer.tools.experimental.supported_languages import SUPPORTED_LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteMemory(BaseMemory):
+    """
+    A key-value store where keys and values are stored in a single SQLite database.
+
+    It can be used anywhere a `DiskMemory` is used. Keys behave like the relative file
+    paths of `DiskMemory`: deleting a key also deletes all keys "inside" it. Writes are
+    committed immediately, unless they happen inside a `batch`, which commits all of its
+    writes in one transaction.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the SQLite database file.
+    compress : bool
+        Whether new values are stored zlib-compressed.
+    """
+
+    def __init__(self, path: Union[str, Path], compress: bool = False):
+        """
+        Initialize the database, creating it if it does not exist.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            The path of the SQLite database file.
+        compress : bool, optional
+            Whether to store new values zlib-compressed, by default False.
+        """
+        self.path: Path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
+
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._conn = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, compressed INTEGER NOT NULL)"
+        )
+
+    @classmethod
+    def migrate_from_directory(
+        cls,
+        directory: Union[str, Path],
+        path: Union[str, Path],
+        compress: bool = False,
+    ) -> "SqliteMemory":
+        """
+        Copy all files of a `DiskMemory` directory, such as `.gpteng/memory`, into a new
+        or existing SQLite database, in a single transaction.
+
+        Files that are not valid UTF-8 text cannot be represented and are skipped.
+
+        Parameters
+        ----------
+        directory : Union[str, Path]
+            The directory of the `DiskMemory` to migrate.
+        path : Union[str, Path]
+            The path of the SQLite database file.
+        compress : bool, optional
+            Whether to store the values zlib-compressed, by default False.
+
+        Returns
+        -------
+        SqliteMemory
+            The database containing the migrated files.
+        """
+        disk_memory = DiskMemory(directory)
+        memory = cls(path, compress=compress)
+        with memory.batch():
+            for key in disk_memory:
+                try:
+                    memory[key] = disk_memory[key]
+                except UnicodeDecodeError:
+                    logger.warning(f"Skipping non-text file '{key}' in migration")
+        return memory
+
+    @contextmanager
+    def batch(self):
+        """
+        Group all writes and deletes inside the context into a single transaction.
+
+        Batches can be nested; the outermost batch commits, or rolls back if an
+        exception is raised.
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._conn.execute("BEGIN")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        """
+        Close the connection to the database.
+        """
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _key(key: Union[str, Path]) -> str:
+        return Path(key).as_posix()
+
+    def _encode(self, val: str) -> tuple:
+        data = val.encode("utf-8")
+        if self.compress:
+            return zlib.compress(data), 1
+        return data, 0
+
+    @staticmethod
+    def _decode(data: bytes, compressed: int) -> str:
+        if compressed:
+            data = zlib.decompress(data)
+        return bytes(data).decode("utf-8")
+
+    def __contains__(self, key: Union[str, Path]) -> bool:
+        """
+        Check if a key exists in the database.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The key to check.
+
+        Returns
+        -------
+        bool
+            True if the key exists, False otherwise.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM memory WHERE key = ?", (self._key(key),)
+            ).fetchone()
+        return row is not None
+
+    @traced("io", "SqliteMemory.get", args=("key",))
+    def __getitem__(self, key: Union[str, Path]) -> str:
+        """
+        Get the value of a key in the database.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The key to get the value of.
+
+        Returns
+        -------
+        str
+            The value.
+
+        Raises
+        ------
+        KeyError
+            If the key does not exist in the database.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, compressed FROM memory WHERE key = ?", (self._key(key),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"Key '{key}' could not be found in '{self.path}'")
+        return self._decode(*row)
+
+    def get(self, key: Union[str, Path], default: Optional[Any] = None) -> Any:
+        """
+        Get the value of a key in the database, or a default value if the key does not exist.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The key to get the value of.
+        default : any, optional
+            The default value to return if the key does not exist, by default None.
+
+        Returns
+        -------
+        any
+            The value, or the default value if the key does not exist.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    @traced("io", "SqliteMemory.set", args=("key",))
+    def __setitem__(self, key: Union[str, Path], val: str) -> None:
+        """
+        Set the value of a key in the database.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The key to set the value of.
+        val : str
+            The value to set.
+
+        Raises
+        ------
+        ValueError
+            If the key attempts to access the parent path.
+        TypeError
+            If val is not string.
+        """
+        if str(key).startswith("../"):
+            raise ValueError(f"File name {key} attempted to access parent path.")
+
+        if not isinstance(val, str):
+            raise TypeError("val must be str")
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memory (key, value, compressed) VALUES (?, ?, ?)",
+                (self._key(key), *self._encode(val)),
+            )
+
+    @traced("io", "SqliteMemory.delete", args=("key",))
+    def __delitem__(self, key: Union[str, Path]) -> None:
+        """
+        Delete a key, and all keys inside it, from the database.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The key to delete.
+
+        Raises
+        ------
+        KeyError
+            If neither the key nor any key inside it exists in the database.
+        """
+        db_key = self._key(key)
+        prefix = db_key.rstrip("/") + "/"
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM memory WHERE key = ? OR substr(key, 1, ?) = ?",
+                (db_key, len(prefix), prefix),
+            ).rowcount
+        if deleted == 0:
+            raise KeyError(f"Item '{key}' could not be found in '{self.path}'")
+
+    @traced("io", "SqliteMemory.list")
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            keys = [
+                row[0]
+                for row in self._conn.execute("SELECT key FROM memory ORDER BY key")
+            ]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def to_path_list_string(self, supported_code_files_only: bool = False) -> str:
+        """
+        Returns the keys as a list of file paths. Useful for passing to the LLM where it needs to understand the wider context of files available for reference.
+        """
+        if supported_code_files_only:
+            valid_extensions = {
+                ext for lang in SUPPORTED_LANGUAGES for ext in lang["extensions"]
+            }
+            return "\n".join(
+                key for key in self if Path(key).suffix in valid_extensions
+            )
+        return "\n".join(self)
+
+    @traced("io")
+    def to_dict(self) -> Dict[Union[str, Path], str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, compressed FROM memory ORDER BY key"
+            ).fetchall()
+        return {key: self._decode(value, compressed) for key, value, compressed in rows}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
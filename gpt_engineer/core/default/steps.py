@@ -1,9 +1,28 @@
+import asyncio
+import functools
 import inspect
 import re
 
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
-from typing import List, MutableMapping, Union
+from typing import (
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import HumanMessage, SystemMessage
 from termcolor import colored
 
@@ -11,7 +30,10 @@ from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.chat_to_files import (
+    StreamingFilesCallbackHandler,
+    StreamingFilesParser,
     chat_to_files_dict,
+    find_fuzzy_match,
     overwrite_code_with_edits,
     parse_edits,
 )
@@ -24,32 +46,198 @@ from gpt_engineer.core.default.paths import (
 )
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.token_usage import TokenUsageLog, time_parsing
+from gpt_engineer.core.tracing import span
+
+T = TypeVar("T")
+F = TypeVar("F", bound=Callable)
+
+# The registered steps, by name
+STEPS: Dict[str, Callable] = {}
+
+# The name of the innermost step running, per thread and asyncio task
+_current_step_name: ContextVar[Optional[str]] = ContextVar(
+    "current_step_name", default=None
+)
+
+# Called with the filename and content of each generated file, as soon as it is complete
+FileCallback = Callable[[str, str], None]
+
+# Number of distinct sets of preprompts whose assembled system prompts are remembered
+SYS_PROMPT_CACHE_SIZE = 16
+
+
+def current_step() -> str:
+    """
+    The name of the innermost step that is running, under which it is registered in
+    STEPS, e.g. to attribute the LLM requests of the step to it.
+
+    Raises
+    ------
+    RuntimeError
+        If no step is running.
+    """
+    name = _current_step_name.get()
+    if name is None:
+        raise RuntimeError("No step is running")
+    return name
+
+
+def step(fn: F) -> F:
+    """
+    Register a function as a step, and time and trace every run of it.
+
+    While the step runs, its name is returned by `current_step`.
+
+    The timing of each run is kept in the `TokenUsageLog` of the step's AI, which is
+    its `ai` argument, or its first positional argument. Steps without an AI run
+    untimed. When tracing is enabled, every run is also recorded as a span.
 
+    Parameters
+    ----------
+    fn : Callable
+        The step, a function or a coroutine function.
 
-def curr_fn() -> str:
-    return inspect.stack()[1].function
+    Returns
+    -------
+    Callable
+        The step, wrapped to time and trace its runs.
+    """
+
+    def time_step(args, kwargs) -> ContextManager:
+        ai = kwargs["ai"] if "ai" in kwargs else (args[0] if args else None)
+        log = getattr(ai, "token_usage_log", None)
+        if not isinstance(log, TokenUsageLog):
+            return nullcontext()
+        return log.time_step(fn.__name__)
+
+    @contextmanager
+    def running(args, kwargs) -> Iterator[None]:
+        token = _current_step_name.set(fn.__name__)
+        try:
+            with span(fn.__name__, "step"), time_step(args, kwargs):
+                yield
+        finally:
+            _current_step_name.reset(token)
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with running(args, kwargs):
+                return await fn(*args, **kwargs)
+
+        wrapper = async_wrapper
+    else:
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with running(args, kwargs):
+                return fn(*args, **kwargs)
+
+    STEPS[fn.__name__] = wrapper
+    return wrapper  # type: ignore
 
 
 def setup_sys_prompt(preprompts: MutableMapping[Union[str, Path], str]) -> str:
+    return _assemble_sys_prompt(
+        preprompts["roadmap"],
+        preprompts["generate"],
+        preprompts["file_format"],
+        preprompts["philosophy"],
+    )
+
+
+# The system prompts are memoized on the preprompts they are assembled from, which
+# PrepromptsHolder returns as the same string objects until their files change.
+@lru_cache(maxsize=SYS_PROMPT_CACHE_SIZE)
+def _assemble_sys_prompt(
+    roadmap: str, generate: str, file_format: str, philosophy: str
+) -> str:
     return (
-        preprompts["roadmap"]
-        + preprompts["generate"].replace("FILE_FORMAT", preprompts["file_format"])
+        roadmap
+        + generate.replace("FILE_FORMAT", file_format)
         + "\nUseful to know:\n"
-        + preprompts["philosophy"]
+        + philosophy
     )
 
 
+def stream_files_to(
+    on_file: Optional[FileCallback],
+) -> Optional[List[BaseCallbackHandler]]:
+    """
+    The callbacks of an LLM call passing each file of its response to `on_file` as soon
+    as its code block is complete, or None if there is no `on_file`.
+    """
+    if on_file is None:
+        return None
+    return [StreamingFilesCallbackHandler(StreamingFilesParser(on_file=on_file))]
+
+
+def _finish_gen_code(messages: List, memory: BaseMemory) -> FilesDict:
+    """
+    Log the response generating the code, and parse its files.
+    """
+    chat = messages[-1].content.strip()
+    memory[CODE_GEN_LOG_FILE] = chat
+    with time_parsing():
+        return chat_to_files_dict(chat)
+
+
+@step
 def gen_code(
-    ai: AI, prompt: str, memory: BaseMemory, preprompts_holder: PrepromptsHolder
+    ai: AI,
+    prompt: str,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[FileCallback] = None,
+) -> FilesDict:
+    preprompts = preprompts_holder.get_preprompts()
+    messages = ai.start(
+        setup_sys_prompt(preprompts),
+        prompt,
+        step_name=current_step(),
+        callbacks=stream_files_to(on_file),
+    )
+    return _finish_gen_code(messages, memory)
+
+
+@step
+async def agen_code(
+    ai: AI,
+    prompt: str,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[FileCallback] = None,
 ) -> FilesDict:
+    """
+    Asynchronous variant of `gen_code`, awaiting the LLM through `AI.astart`.
+    """
     preprompts = preprompts_holder.get_preprompts()
-    messages = ai.start(setup_sys_prompt(preprompts), prompt, step_name=curr_fn())
+    messages = await ai.astart(
+        setup_sys_prompt(preprompts),
+        prompt,
+        step_name=current_step(),
+        callbacks=stream_files_to(on_file),
+    )
+    return _finish_gen_code(messages, memory)
+
+
+def _entrypoint_request(files_dict: FilesDict) -> str:
+    return "Information about the codebase:\n\n" + files_dict.to_chat()
+
+
+def _finish_entrypoint(messages: List, memory: BaseMemory) -> FilesDict:
+    """
+    Log the response generating the entrypoint, and parse the entrypoint from it.
+    """
     chat = messages[-1].content.strip()
-    memory[CODE_GEN_LOG_FILE] = chat
-    files_dict = chat_to_files_dict(chat)
-    return files_dict
+    memory[ENTRYPOINT_LOG_FILE] = chat
+    with time_parsing():
+        return parse_entrypoint(chat)
 
 
+@step
 def gen_entrypoint(
     ai: AI,
     files_dict: FilesDict,
@@ -59,20 +247,39 @@ def gen_entrypoint(
     preprompts = preprompts_holder.get_preprompts()
     messages = ai.start(
         system=(preprompts["entrypoint"]),
-        user="Information about the codebase:\n\n" + files_dict.to_chat(),
-        step_name=curr_fn(),
+        user=_entrypoint_request(files_dict),
+        step_name=current_step(),
     )
     print()
-    chat = messages[-1].content.strip()
+    return _finish_entrypoint(messages, memory)
+
+
+@step
+async def agen_entrypoint(
+    ai: AI,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+) -> FilesDict:
+    """
+    Asynchronous variant of `gen_entrypoint`, awaiting the LLM through `AI.astart`.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = await ai.astart(
+        system=(preprompts["entrypoint"]),
+        user=_entrypoint_request(files_dict),
+        step_name=current_step(),
+    )
+    return _finish_entrypoint(messages, memory)
+
+
+def parse_entrypoint(chat: str) -> FilesDict:
     regex = r"```\S*\n(.+?)```"
     matches = re.finditer(regex, chat, re.DOTALL)
-    entrypoint_code = FilesDict(
-        {ENTRYPOINT_FILE: "\n".join(match.group(1) for match in matches)}
-    )
-    memory[ENTRYPOINT_LOG_FILE] = chat
-    return entrypoint_code
+    return FilesDict({ENTRYPOINT_FILE: "\n".join(match.group(1) for match in matches)})
 
 
+@step
 def execute_entrypoint(
     ai: AI,
     execution_env: BaseExecutionEnv,
@@ -120,11 +327,18 @@ def execute_entrypoint(
 
 def setup_sys_prompt_existing_code(
     preprompts: MutableMapping[Union[str, Path], str]
+) -> str:
+    return _assemble_sys_prompt_existing_code(
+        preprompts["improve"], preprompts["file_format"], preprompts["philosophy"]
+    )
+
+
+@lru_cache(maxsize=SYS_PROMPT_CACHE_SIZE)
+def _assemble_sys_prompt_existing_code(
+    improve: str, file_format: str, philosophy: str
 ) -> str:
     return (
-        preprompts["improve"].replace("FILE_FORMAT", preprompts["file_format"])
-        + "\nUseful to know:\n"
-        + preprompts["philosophy"]
+        improve.replace("FILE_FORMAT", file_format) + "\nUseful to know:\n" + philosophy
     )
 
 
@@ -140,7 +354,12 @@ def incorrect_edit(files_dict: FilesDict, chat: str) -> List[str,]:
     for edit in edits:
         # only trigger for existing files
         if edit.filename in files_dict:
-            if edit.before not in files_dict[edit.filename]:
+            content = files_dict[edit.filename]
+            # near misses that can be located confidently are applied without a retry
+            if (
+                edit.before not in content
+                and find_fuzzy_match(content, edit.before) is None
+            ):
                 problems.append(
                     "This section, assigned to be exchanged for an edit block, does not have an exact match in the code: "
                     + edit.before
@@ -149,6 +368,56 @@ def incorrect_edit(files_dict: FilesDict, chat: str) -> List[str,]:
     return problems
 
 
+def improve_messages(
+    prompt: str,
+    files_dict: FilesDict,
+    preprompts: MutableMapping[Union[str, Path], str],
+) -> List:
+    return [
+        SystemMessage(content=setup_sys_prompt_existing_code(preprompts)),
+        # Add files as input
+        HumanMessage(content=f"{files_dict.to_chat()}"),
+        HumanMessage(content=f"Request: {prompt}"),
+    ]
+
+
+def edit_refinement_message(problems: List[str]) -> HumanMessage:
+    return HumanMessage(
+        content="Some previously produced edits were not on the requested format, or the HEAD part was not found in the code. Details: "
+        + "\n".join(problems)
+        + "\n Please provide ALL the edits again, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
+    )
+
+
+def _check_edits(messages: List, files_dict: FilesDict) -> Tuple[str, bool]:
+    """
+    Check whether the edits of the last response can be applied, and if not, ask for
+    them again in a new message.
+
+    Returns
+    -------
+    Tuple[str, bool]
+        The response, and whether its edits can be applied.
+    """
+    chat = messages[-1].content.strip()
+    with time_parsing():
+        problems = incorrect_edit(files_dict, chat)
+    if problems:
+        messages.append(edit_refinement_message(problems))
+    return chat, not problems
+
+
+def _finish_improve(chat: str, files_dict: FilesDict, memory: BaseMemory) -> FilesDict:
+    """
+    Apply the edits of the response to the files, and log the response.
+    """
+    with time_parsing():
+        overwrite_code_with_edits(chat, files_dict)
+    memory[IMPROVE_LOG_FILE] = chat
+    return files_dict
+
+
+@step
 def improve(
     ai: AI,
     prompt: str,
@@ -157,30 +426,64 @@ def improve(
     preprompts_holder: PrepromptsHolder,
 ) -> FilesDict:
     preprompts = preprompts_holder.get_preprompts()
-    messages = [
-        SystemMessage(content=setup_sys_prompt_existing_code(preprompts)),
-    ]
+    messages = improve_messages(prompt, files_dict, preprompts)
+    # ask for the edits again while some of them cannot be applied
+    for _ in range(MAX_EDIT_REFINEMENT_STEPS + 1):
+        messages = ai.next(messages, step_name=current_step())
+        chat, edits_apply = _check_edits(messages, files_dict)
+        if edits_apply:
+            break
+    return _finish_improve(chat, files_dict, memory)
 
-    # Add files as input
-    messages.append(HumanMessage(content=f"{files_dict.to_chat()}"))
-    messages.append(HumanMessage(content=f"Request: {prompt}"))
-    problems = [""]
 
-    # check edit correctness
-    edit_refinements = 0
-    while len(problems) > 0 and edit_refinements <= MAX_EDIT_REFINEMENT_STEPS:
-        messages = ai.next(messages, step_name=curr_fn())
-        chat = messages[-1].content.strip()
-        problems = incorrect_edit(files_dict, chat)
-        if len(problems) > 0:
-            messages.append(
-                HumanMessage(
-                    content="Some previously produced edits were not on the requested format, or the HEAD part was not found in the code. Details: "
-                    + "\n".join(problems)
-                    + "\n Please provide ALL the edits again, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
-                )
-            )
-        edit_refinements += 1
-    overwrite_code_with_edits(chat, files_dict)
-    memory[IMPROVE_LOG_FILE] = chat
-    return files_dict
+@step
+async def aimprove(
+    ai: AI,
+    prompt: str,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+) -> FilesDict:
+    """
+    Asynchronous variant of `improve`, awaiting the LLM through `AI.anext`.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = improve_messages(prompt, files_dict, preprompts)
+    # ask for the edits again while some of them cannot be applied
+    for _ in range(MAX_EDIT_REFINEMENT_STEPS + 1):
+        messages = await ai.anext(messages, step_name=current_step())
+        chat, edits_apply = _check_edits(messages, files_dict)
+        if edits_apply:
+            break
+    return _finish_improve(chat, files_dict, memory)
+
+
+async def run_concurrently(
+    coroutines: Iterable[Awaitable[T]], max_concurrency: Optional[int] = None
+) -> List[T]:
+    """
+    Await the given step coroutines concurrently, with at most `max_concurrency`
+    of them in flight at any time.
+
+    Parameters
+    ----------
+    coroutines : Iterable[Awaitable[T]]
+        The coroutines to run, e.g. `agen_code(...)` calls for different projects.
+    max_concurrency : Optional[int], optional
+        The maximum number of coroutines awaited at once, by default unbounded.
+
+    Returns
+    -------
+    List[T]
+        The results, in the same order as the given coroutines.
+    """
+    if not max_concurrency:
+        return list(await asyncio.gather(*coroutines))
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(coroutine: Awaitable[T]) -> T:
+        async with semaphore:
+            return await coroutine
+
+    return list(await asyncio.gather(*(bounded(c) for c in coroutines)))
@@ -1,13 +1,43 @@
+import threading
+
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from gpt_engineer.core.default.disk_memory import DiskMemory
 
 
 class PrepromptsHolder:
+    """
+    Holds the preprompts of a folder in memory.
+
+    Preprompts are read once and cached with the modification time and size of their
+    file. Later calls only stat the files, and re-read the ones that changed, so that
+    edits to custom preprompts still apply to the next step.
+    """
+
     def __init__(self, preprompts_path: Path):
         self.preprompts_path = preprompts_path
+        self._lock = threading.Lock()
+        self._memory: Optional[DiskMemory] = None
+        # file name -> ((mtime_ns, size) of the file when read, content)
+        self._cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
 
     def get_preprompts(self) -> Dict[str, str]:
-        preprompts_repo = DiskMemory(self.preprompts_path)
-        return {file_name: preprompts_repo[file_name] for file_name in preprompts_repo}
+        with self._lock:
+            if self._memory is None:
+                self._memory = DiskMemory(self.preprompts_path)
+            preprompts = {}
+            for file_name in self._memory:
+                try:
+                    stat = (Path(self._memory.path) / file_name).stat()
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self._cache.get(file_name)
+                if cached is None or cached[0] != signature:
+                    cached = (signature, self._memory[file_name])
+                    self._cache[file_name] = cached
+                preprompts[file_name] = cached[1]
+            for file_name in self._cache.keys() - preprompts.keys():
+                del self._cache[file_name]
+            return preprompts
@@ -1,28 +1,74 @@
 import logging
+import time
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import List, Union
+from functools import lru_cache
+from typing import Iterator, List, Optional, Union
 
 import tiktoken
 
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
-
-# workaround for function moved in:
-# https://github.com/langchain-ai/langchain/blob/535db72607c4ae308566ede4af65295967bb33a8/libs/community/langchain_community/callbacks/openai_info.py
-try:
-    from langchain.callbacks.openai_info import (
-        get_openai_token_cost_for_model,  # fmt: skip
-    )
-except ImportError:
-    from langchain_community.callbacks.openai_info import (
-        get_openai_token_cost_for_model,  # fmt: skip
-    )
-
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 Message = Union[AIMessage, HumanMessage, SystemMessage]
 
+# Number of distinct message contents whose token counts are remembered per tokenizer
+MESSAGE_TOKEN_CACHE_SIZE = 4096
+
+# Context window sizes in tokens, by exact model id. Other models, e.g. Azure
+# deployment names, have no known context window.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-0314": 8192,
+    "gpt-4-0613": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-32k-0314": 32768,
+    "gpt-4-32k-0613": 32768,
+    "gpt-4-1106-preview": 128000,
+    "gpt-4-0125-preview": 128000,
+    "gpt-4-turbo-preview": 128000,
+    "gpt-4-vision-preview": 128000,
+    "gpt-4-1106-vision-preview": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-turbo-2024-04-09": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-2024-05-13": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-0301": 4096,
+    "gpt-3.5-turbo-0613": 4096,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo-16k-0613": 16385,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-3.5-turbo-0125": 16385,
+}
+
 logger = logging.getLogger(__name__)
 
+# The innermost step being timed, per thread and asyncio task
+_current_step: ContextVar[Optional["StepTiming"]] = ContextVar(
+    "current_step", default=None
+)
+
+
+def context_window(model_name: str) -> Optional[int]:
+    """
+    Get the context window of a model.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model.
+
+    Returns
+    -------
+    Optional[int]
+        The maximum number of tokens of a request and its response, or None if the
+        model id is not in MODEL_CONTEXT_WINDOWS.
+    """
+    return MODEL_CONTEXT_WINDOWS.get(model_name)
+
 
 @dataclass
 class TokenUsage:
@@ -42,6 +88,9 @@ class TokenUsage:
 class Tokenizer:
     """
     Tokenizer for counting tokens in text.
+
+    Token counts of message contents are memoized, so that counting a growing
+    conversation only encodes the messages that were not seen before.
     """
 
     def __init__(self, model_name):
@@ -51,6 +100,9 @@ class Tokenizer:
             if "gpt-4" in model_name or "gpt-3.5" in model_name
             else tiktoken.get_encoding("cl100k_base")
         )
+        self.num_tokens_cached = lru_cache(maxsize=MESSAGE_TOKEN_CACHE_SIZE)(
+            self.num_tokens
+        )
 
     def num_tokens(self, txt: str) -> int:
         """
@@ -68,10 +120,19 @@ class Tokenizer:
         """
         return len(self._tiktoken_tokenizer.encode(txt))
 
+    @property
+    def encoding_name(self) -> str:
+        """
+        The name of the tiktoken encoding, which determines the token counts.
+        """
+        return self._tiktoken_tokenizer.name
+
     def num_tokens_from_messages(self, messages: List[Message]) -> int:
         """
         Get the total number of tokens used by a list of messages.
 
+        Messages whose content was counted before are looked up instead of re-encoded.
+
         Parameters
         ----------
         messages : List[Message]
@@ -87,14 +148,53 @@ class Tokenizer:
             n_tokens += (
                 4  # Every message follows <im_start>{role/name}\n{content}<im_end>\n
             )
-            n_tokens += self.num_tokens(message.content)
+            n_tokens += self.num_tokens_cached(message.content)
         n_tokens += 2  # Every reply is primed with <im_start>assistant
         return n_tokens
 
 
+@dataclass
+class StepTiming:
+    """
+    Represents where the time of a step went.
+
+    The LLM latency and tokens of a step only include the requests sent to the API,
+    not those served from a cache. The time to first token is that of the step's
+    first request, and is only known when the response is streamed.
+    """
+
+    step_name: str
+    wall_time: float = 0.0
+    llm_calls: int = 0
+    llm_latency: float = 0.0
+    time_to_first_token: Optional[float] = None
+    parse_time: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@contextmanager
+def time_parsing() -> Iterator[None]:
+    """
+    Add the time spent in the context to the parse time of the current step, if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = _current_step.get()
+        if timing is not None:
+            timing.parse_time += time.perf_counter() - start
+
+
 class TokenUsageLog:
     """
     Represents a log of token usage statistics for a conversation.
+
+    It also keeps the timings of the steps run with the conversation's AI, see
+    `time_step`. Responses served from a cache are not sent to the API, so their
+    tokens are only counted in `cached_prompt_tokens` and `cached_completion_tokens`,
+    and are not part of the log or its cost.
     """
 
     def __init__(self, model_name):
@@ -102,10 +202,19 @@ class TokenUsageLog:
         self._cumulative_prompt_tokens = 0
         self._cumulative_completion_tokens = 0
         self._cumulative_total_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.cached_completion_tokens = 0
         self._log = []
         self._tokenizer = Tokenizer(model_name)
-
-    def update_log(self, messages: List[Message], answer: str, step_name: str) -> None:
+        self._step_timings: List[StepTiming] = []
+
+    def update_log(
+        self,
+        messages: List[Message],
+        answer: str,
+        step_name: str,
+        cached: bool = False,
+    ) -> None:
         """
         Update the token usage log with the number of tokens used in the current step.
 
@@ -117,11 +226,24 @@ class TokenUsageLog:
             The answer from the AI.
         step_name : str
             The name of the step.
+        cached : bool, optional
+            Whether the answer was served from a cache rather than the API, by default
+            False.
         """
         prompt_tokens = self._tokenizer.num_tokens_from_messages(messages)
-        completion_tokens = self._tokenizer.num_tokens(answer)
+        # the answer is part of the prompt of the next step, so remember its count
+        completion_tokens = self._tokenizer.num_tokens_cached(answer)
+        if cached:
+            self.cached_prompt_tokens += prompt_tokens
+            self.cached_completion_tokens += completion_tokens
+            return
         total_tokens = prompt_tokens + completion_tokens
 
+        timing = _current_step.get()
+        if timing is not None:
+            timing.prompt_tokens += prompt_tokens
+            timing.completion_tokens += completion_tokens
+
         self._cumulative_prompt_tokens += prompt_tokens
         self._cumulative_completion_tokens += completion_tokens
         self._cumulative_total_tokens += total_tokens
@@ -138,6 +260,107 @@ class TokenUsageLog:
             )
         )
 
+    @contextmanager
+    def time_step(self, step_name: str) -> Iterator[StepTiming]:
+        """
+        Time a step, attributing the LLM requests and parsing done meanwhile to it.
+
+        Steps may be nested, in which case requests are attributed to the innermost
+        step, and the wall time of the outer step includes that of the inner one.
+
+        Parameters
+        ----------
+        step_name : str
+            The name of the step.
+
+        Yields
+        ------
+        StepTiming
+            The timing of the step, which is added to the log when the step ends.
+        """
+        timing = StepTiming(step_name=step_name)
+        token = _current_step.set(timing)
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.wall_time = time.perf_counter() - start
+            _current_step.reset(token)
+            self._step_timings.append(timing)
+
+    def record_llm_call(
+        self, latency: float, time_to_first_token: Optional[float] = None
+    ) -> None:
+        """
+        Record the latency of a request to the LLM in the current step, if any.
+
+        Parameters
+        ----------
+        latency : float
+            The seconds until the complete response was received.
+        time_to_first_token : Optional[float], optional
+            The seconds until the first token of a streamed response was received.
+        """
+        timing = _current_step.get()
+        if timing is None:
+            return
+        timing.llm_calls += 1
+        timing.llm_latency += latency
+        if timing.time_to_first_token is None:
+            timing.time_to_first_token = time_to_first_token
+
+    def step_timings(self) -> List[StepTiming]:
+        """
+        Get the timings of the steps that ended, in the order they ended.
+
+        Returns
+        -------
+        List[StepTiming]
+            The timing of every step run.
+        """
+        return self._step_timings
+
+    def format_step_timings(self) -> str:
+        """
+        Format the step timings as a table.
+
+        Returns
+        -------
+        str
+            A table with one row per step.
+        """
+        from tabulate import tabulate
+
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value:.2f}"
+
+        rows = [
+            [
+                timing.step_name,
+                seconds(timing.wall_time),
+                timing.llm_calls,
+                seconds(timing.llm_latency),
+                seconds(timing.time_to_first_token),
+                seconds(timing.parse_time),
+                timing.prompt_tokens,
+                timing.completion_tokens,
+            ]
+            for timing in self._step_timings
+        ]
+        return tabulate(
+            rows,
+            headers=[
+                "step",
+                "wall (s)",
+                "LLM calls",
+                "LLM latency (s)",
+                "first token (s)",
+                "parsing (s)",
+                "prompt tokens",
+                "completion tokens",
+            ],
+        )
+
     def log(self) -> List[TokenUsage]:
         """
         Get the token usage log.
@@ -172,6 +395,18 @@ class TokenUsageLog:
         float
             Cost in USD.
         """
+        # workaround for function moved in:
+        # https://github.com/langchain-ai/langchain/blob/535db72607c4ae308566ede4af65295967bb33a8/libs/community/langchain_community/callbacks/openai_info.py
+        # imported here, as importing the langchain callbacks is slow
+        try:
+            from langchain.callbacks.openai_info import (
+                get_openai_token_cost_for_model,  # fmt: skip
+            )
+        except ImportError:
+            from langchain_community.callbacks.openai_info import (
+                get_openai_token_cost_for_model,  # fmt: skip
+            )
+
         result = 0
         for log in self.log():
             result += get_openai_token_cost_for_model(
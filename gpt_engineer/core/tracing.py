@@ -0,0 +1,307 @@
+"""
+Tracing of an agent run as spans in the Chrome Trace Event format.
+
+When tracing is enabled, the LLM calls, steps, file stores, memories and execution
+environments record a span for every call, with its start, duration, thread and a few
+arguments. The spans are written as a Chrome Trace Event JSON file when the process
+exits, which can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing to
+see where the time of a run went.
+
+Tracing is enabled with the `--trace` option of the CLI, or through the environment:
+
+    GPTE_TRACE      path of the trace file to write
+
+When tracing is disabled, a traced call only costs a check of the module's tracer.
+Spans of coroutines are recorded on a track of their asyncio task, so that concurrent
+steps do not overlap on the track of their thread.
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+TRACE_ENV_VAR = "GPTE_TRACE"
+
+# Longest string representation of a span argument, longer ones are truncated
+MAX_ARG_LENGTH = 200
+
+F = TypeVar("F", bound=Callable)
+
+
+class Tracer:
+    """
+    Records spans and writes them as a Chrome Trace Event JSON file.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the trace file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._named_tracks: Dict[int, str] = {}
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Record a span around the body of the `with` statement.
+
+        Parameters
+        ----------
+        name : str
+            The name of the span.
+        category : str
+            The category of the span, e.g. "llm", "step" or "io".
+        **args : Any
+            Arguments shown with the span.
+
+        Yields
+        ------
+        Dict[str, Any]
+            The arguments of the span, to add results to.
+        """
+        track = self._track()
+        start = time.perf_counter()
+        span_args = {key: _trace_value(value) for key, value in args.items()}
+        try:
+            yield span_args
+        except BaseException as e:
+            span_args["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self._pid,
+                "tid": track,
+                "args": span_args,
+            }
+            with self._lock:
+                self._events.append(event)
+
+    def _track(self) -> int:
+        """
+        The id of the track of the current asyncio task, or of the current thread.
+        """
+        # asyncio is not imported for tracing, as no task runs unless it already is
+        asyncio = sys.modules.get("asyncio")
+        try:
+            task = asyncio.current_task() if asyncio is not None else None
+        except RuntimeError:
+            task = None
+        if task is not None:
+            track, track_name = id(task), f"task {task.get_name()}"
+        else:
+            thread = threading.current_thread()
+            track, track_name = threading.get_ident(), thread.name
+        if track not in self._named_tracks:
+            with self._lock:
+                self._named_tracks[track] = track_name
+        return track
+
+    def events(self) -> List[Dict[str, Any]]:
+        """
+        The recorded events, preceded by the metadata events naming the tracks.
+        """
+        with self._lock:
+            metadata = [
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "args": {"name": "gpt-engineer"},
+                }
+            ] + [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": track,
+                    "args": {"name": track_name},
+                }
+                for track, track_name in self._named_tracks.items()
+            ]
+            return metadata + list(self._events)
+
+    def write(self) -> Path:
+        """
+        Write the trace file, replacing any previous one.
+
+        Returns
+        -------
+        Path
+            The path of the trace file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+        return self.path
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def enable_tracing(path: Union[str, Path]) -> Tracer:
+    """
+    Record spans from now on, and write them to `path` when the process exits.
+
+    Enabling tracing again only changes the path the trace is written to.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        The path of the trace file.
+
+    Returns
+    -------
+    Tracer
+        The tracer recording the spans.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(path)
+            atexit.register(_write_at_exit)
+        else:
+            _tracer.path = Path(path)
+        return _tracer
+
+
+def disable_tracing() -> Optional[Tracer]:
+    """
+    Stop recording spans, without writing them.
+
+    Returns
+    -------
+    Optional[Tracer]
+        The tracer that recorded the spans so far, if tracing was enabled.
+    """
+    global _tracer
+    with _tracer_lock:
+        tracer, _tracer = _tracer, None
+        return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """
+    The tracer recording the spans, or None if tracing is disabled.
+    """
+    return _tracer
+
+
+def span(name: str, category: str, **args: Any) -> ContextManager:
+    """
+    Record a span around the body of a `with` statement, if tracing is enabled.
+
+    See `Tracer.span`, the context manager yields None when tracing is disabled.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, category, **args)
+
+
+def traced(
+    category: str, name: Optional[str] = None, args: Sequence[str] = ()
+) -> Callable[[F], F]:
+    """
+    Decorate a function or coroutine function to record a span for every call.
+
+    Parameters
+    ----------
+    category : str
+        The category of the spans.
+    name : Optional[str]
+        The name of the spans, by default the qualified name of the function.
+    args : Sequence[str]
+        The names of the parameters of the function shown with the spans.
+
+    Returns
+    -------
+    Callable
+        The decorator.
+    """
+
+    def decorator(fn: F) -> F:
+        span_name = name or fn.__qualname__
+        signature = inspect.signature(fn) if args else None
+
+        def span_args(call_args, call_kwargs) -> Dict[str, Any]:
+            if signature is None:
+                return {}
+            bound = signature.bind_partial(*call_args, **call_kwargs).arguments
+            return {arg: bound[arg] for arg in args if arg in bound}
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*call_args, **call_kwargs):
+                tracer = _tracer
+                if tracer is None:
+                    return await fn(*call_args, **call_kwargs)
+                with tracer.span(
+                    span_name, category, **span_args(call_args, call_kwargs)
+                ):
+                    return await fn(*call_args, **call_kwargs)
+
+            return async_wrapper  # type: ignore
+
+        @functools.wraps(fn)
+        def wrapper(*call_args, **call_kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*call_args, **call_kwargs)
+            with tracer.span(span_name, category, **span_args(call_args, call_kwargs)):
+                return fn(*call_args, **call_kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def _trace_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    if len(text) > MAX_ARG_LENGTH:
+        text = text[: MAX_ARG_LENGTH - 3] + "..."
+    return text
+
+
+def _write_at_exit() -> None:
+    tracer = _tracer
+    if tracer is not None:
+        tracer.write()
+
+
+if os.getenv(TRACE_ENV_VAR):
+    enable_tracing(os.environ[TRACE_ENV_VAR])
@@ -0,0 +1,247 @@
+"""
+Recording and replaying of LLM transcripts.
+
+A transcript is a JSONL file with one line per request sent to the LLM, holding the
+request's model, temperature and messages, and the content of the response. `AI`
+records to a transcript in record mode. In replay mode it serves the recorded responses
+through `ReplayChatModel` instead of calling the API, optionally with simulated latency
+and token streaming. This allows benchmarks to run offline and deterministically, to
+measure the overhead of everything but the LLM.
+
+Both modes can be enabled through environment variables, so that they also apply to
+agents created by code that does not pass a transcript to `AI` explicitly:
+
+    GPTE_RECORD_TRANSCRIPT          path of a transcript to append requests to
+    GPTE_REPLAY_TRANSCRIPT          path of a transcript to replay
+    GPTE_REPLAY_LATENCY             seconds to wait before the first token of a reply
+    GPTE_REPLAY_TOKENS_PER_SECOND   rate at which replayed replies are streamed
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from langchain.schema import messages_to_dict
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import (
+    BaseChatModel,
+    generate_from_stream,
+)
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+RECORD_ENV_VAR = "GPTE_RECORD_TRANSCRIPT"
+REPLAY_ENV_VAR = "GPTE_REPLAY_TRANSCRIPT"
+LATENCY_ENV_VAR = "GPTE_REPLAY_LATENCY"
+TOKENS_PER_SECOND_ENV_VAR = "GPTE_REPLAY_TOKENS_PER_SECOND"
+
+# splits a reply into word-sized chunks, to stream it in replay mode
+TOKEN_REGEX = re.compile(r"\s*\S+|\s+")
+
+
+def request_key(
+    model_name: str, temperature: float, messages: List[BaseMessage]
+) -> str:
+    """
+    Compute a key identifying a request to the LLM.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model the request is sent to.
+    temperature : float
+        The sampling temperature of the request.
+    messages : List[BaseMessage]
+        The message history sent to the model.
+
+    Returns
+    -------
+    str
+        A hex digest identifying the request.
+    """
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "temperature": temperature,
+            "messages": [
+                {"type": message.type, "content": message.content}
+                for message in messages
+            ],
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptStore:
+    """
+    A transcript of LLM requests and responses, stored as a JSONL file.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the transcript file.
+    replay : bool
+        Whether the transcript is replayed, rather than recorded to.
+    latency : float
+        In replay mode, the seconds to wait before the first token of a response.
+    tokens_per_second : Optional[float]
+        In replay mode, the rate at which responses are streamed, or None to stream
+        them without delay.
+    """
+
+    _instances: Dict[Path, "TranscriptStore"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        replay: bool = False,
+        latency: float = 0.0,
+        tokens_per_second: Optional[float] = None,
+    ):
+        self.path = Path(path)
+        self.replay = replay
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self._lock = threading.Lock()
+        self._responses: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["TranscriptStore"]:
+        """
+        Return the transcript configured through the environment, if any.
+
+        Instances are shared per path, so that all `AI` instances of a process that
+        record to the same transcript append to it through the same lock.
+        """
+        replay_path = os.getenv(REPLAY_ENV_VAR)
+        path = replay_path or os.getenv(RECORD_ENV_VAR)
+        if not path:
+            return None
+        with cls._instances_lock:
+            key = Path(path).absolute()
+            if key not in cls._instances:
+                tokens_per_second = os.getenv(TOKENS_PER_SECOND_ENV_VAR)
+                cls._instances[key] = cls(
+                    path,
+                    replay=bool(replay_path),
+                    latency=float(os.getenv(LATENCY_ENV_VAR, 0)),
+                    tokens_per_second=float(tokens_per_second)
+                    if tokens_per_second
+                    else None,
+                )
+            return cls._instances[key]
+
+    def record(
+        self,
+        model_name: str,
+        temperature: float,
+        messages: List[BaseMessage],
+        response: str,
+    ) -> None:
+        """
+        Append a request and the content of its response to the transcript.
+        """
+        key = request_key(model_name, temperature, messages)
+        line = json.dumps(
+            {
+                "key": key,
+                "model": model_name,
+                "temperature": temperature,
+                "messages": messages_to_dict(messages),
+                "response": response,
+            }
+        )
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            if self._responses is not None:
+                self._responses[key] = response
+
+    def lookup(
+        self, model_name: str, temperature: float, messages: List[BaseMessage]
+    ) -> str:
+        """
+        Return the recorded response to a request.
+
+        Raises
+        ------
+        KeyError
+            If the request was not recorded in the transcript.
+        """
+        key = request_key(model_name, temperature, messages)
+        with self._lock:
+            if self._responses is None:
+                self._responses = self._load()
+            response = self._responses.get(key)
+        if response is None:
+            raise KeyError(f"No response to request {key} recorded in {self.path}")
+        return response
+
+    def _load(self) -> Dict[str, str]:
+        responses = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        responses[entry["key"]] = entry["response"]
+        return responses
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    A chat model that answers requests with the responses recorded in a transcript.
+
+    Responses are streamed token by token when `streaming` is set, honouring the
+    latency and token rate of the transcript.
+    """
+
+    transcript: Any
+    model_name: str
+    temperature: float
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(
+                self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
+        content = self.transcript.lookup(self.model_name, self.temperature, messages)
+        time.sleep(self.transcript.latency)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))]
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        content = self.transcript.lookup(self.model_name, self.temperature, messages)
+        time.sleep(self.transcript.latency)
+        for token in TOKEN_REGEX.findall(content):
+            if self.transcript.tokens_per_second:
+                time.sleep(1 / self.transcript.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token)
@@ -1,6 +1,6 @@
 from platform import platform
 from sys import version_info
-from typing import List, Union
+from typing import List, Optional, Union
 
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from termcolor import colored
@@ -10,9 +10,16 @@ from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.chat_to_files import chat_to_files_dict
 from gpt_engineer.core.default.paths import CODE_GEN_LOG_FILE, ENTRYPOINT_FILE
-from gpt_engineer.core.default.steps import curr_fn, setup_sys_prompt
+from gpt_engineer.core.default.steps import (
+    FileCallback,
+    current_step,
+    setup_sys_prompt,
+    step,
+    stream_files_to,
+)
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.token_usage import time_parsing
 
 # Type hint for chat messages
 Message = Union[AIMessage, HumanMessage, SystemMessage]
@@ -31,6 +38,7 @@ def get_platform_info():
     return a + b
 
 
+@step
 def self_heal(
     ai: AI,
     execution_env: BaseExecutionEnv,
@@ -93,19 +101,26 @@ def self_heal(
             messages.append(SystemMessage(content=stdout_full + "\n " + stderr_full))
 
             messages = ai.next(
-                messages, preprompts["file_format_fix"], step_name=curr_fn()
+                messages, preprompts["file_format_fix"], step_name=current_step()
             )
         else:  # the process did not fail, we are done here.
             return files_dict
 
-        files_dict = {**files_dict, **chat_to_files_dict(messages[-1].content.strip())}
+        with time_parsing():
+            new_files = chat_to_files_dict(messages[-1].content.strip())
+        files_dict = {**files_dict, **new_files}
         attempts += 1
 
     return files_dict
 
 
+@step
 def clarified_gen(
-    ai: AI, prompt: str, memory: BaseMemory, preprompts_holder: PrepromptsHolder
+    ai: AI,
+    prompt: str,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[FileCallback] = None,
 ) -> FilesDict:
     """
     Generates code based on clarifications obtained from the user.
@@ -118,6 +133,8 @@ def clarified_gen(
     - ai (AI): An instance of the AI model, responsible for processing and generating the code.
     - dbs (DBs): An instance containing the database configurations, which includes system
       and input prompts.
+    - on_file (Optional[FileCallback]): Called with each generated file as soon as it is
+      complete, while the rest of the response is still streamed.
 
     Returns:
     - List[dict]: A list of message dictionaries capturing the AI's interactions and generated
@@ -127,7 +144,7 @@ def clarified_gen(
     messages: List[Message] = [SystemMessage(content=preprompts["clarify"])]
     user_input = prompt
     while True:
-        messages = ai.next(messages, user_input, step_name=curr_fn())
+        messages = ai.next(messages, user_input, step_name=current_step())
         msg = messages[-1].content.strip()
 
         if "nothing to clarify" in msg.lower():
@@ -147,7 +164,7 @@ def clarified_gen(
             messages = ai.next(
                 messages,
                 "Make your own assumptions and state them explicitly before starting",
-                step_name=curr_fn(),
+                step_name=current_step(),
             )
             print()
 
@@ -167,17 +184,24 @@ def clarified_gen(
     messages = ai.next(
         messages,
         preprompts["generate"].replace("FILE_FORMAT", preprompts["file_format"]),
-        step_name=curr_fn(),
+        step_name=current_step(),
+        callbacks=stream_files_to(on_file),
     )
     print()
     chat = messages[-1].content.strip()
     memory[CODE_GEN_LOG_FILE] = chat
-    files_dict = chat_to_files_dict(chat)
+    with time_parsing():
+        files_dict = chat_to_files_dict(chat)
     return files_dict
 
 
+@step
 def lite_gen(
-    ai: AI, prompt: str, memory: BaseMemory, preprompts_holder: PrepromptsHolder
+    ai: AI,
+    prompt: str,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[FileCallback] = None,
 ) -> FilesDict:
     """
     Executes the AI model using the main prompt and saves the generated results.
@@ -191,6 +215,8 @@ def lite_gen(
     - ai (AI): An instance of the AI model.
     - dbs (DBs): An instance containing the database configurations, including input prompts
       and file formatting preferences.
+    - on_file (Optional[FileCallback]): Called with each generated file as soon as it is
+      complete, while the rest of the response is still streamed.
 
     Returns:
     - List[Message]: A list of message objects encapsulating the AI's output.
@@ -200,8 +226,14 @@ def lite_gen(
     set up and functional. Ensure these prerequisites before invoking `lite_gen`.
     """
     preprompts = preprompts_holder.get_preprompts()
-    messages = ai.start(prompt, preprompts["file_format"], step_name=curr_fn())
+    messages = ai.start(
+        prompt,
+        preprompts["file_format"],
+        step_name=current_step(),
+        callbacks=stream_files_to(on_file),
+    )
     chat = messages[-1].content.strip()
     memory[CODE_GEN_LOG_FILE] = chat
-    files_dict = chat_to_files_dict(chat)
+    with time_parsing():
+        files_dict = chat_to_files_dict(chat)
     return files_dict
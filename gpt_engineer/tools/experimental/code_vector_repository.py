@@ -1,17 +1,50 @@
-from typing import Dict, List
-
-from llama_index import Document, SimpleDirectoryReader, VectorStoreIndex
+import hashlib
+import json
+
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from llama_index import (
+    Document,
+    SimpleDirectoryReader,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
 from llama_index.retrievers import BM25Retriever
 from llama_index.schema import NodeWithScore
 
+from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.tools.experimental.document_chunker import DocumentChunker
 
+MANIFEST_FILE = "code_index_manifest.json"
+
 
 class CodeVectorRepository:
-    def __init__(self):
+    """
+    A vector index of the code chunks of a set of files.
+
+    The index is updated incrementally: every file is keyed by the hash of its content,
+    and on each load only the files that were added or changed are chunked and inserted,
+    while the chunks of changed and removed files are deleted. With a `persist_dir`,
+    the index and the content hashes are stored on disk, so that the next instance only
+    processes the files that changed since.
+
+    Attributes
+    ----------
+    persist_dir : Optional[Path]
+        The folder the index is stored in, or None to keep it in memory only.
+    """
+
+    def __init__(self, persist_dir: Optional[Union[str, Path]] = None):
+        self.persist_dir = Path(persist_dir) if persist_dir is not None else None
         self._index = None
         self._query_engine = None
         self._retriever = None
+        # filename -> {"hash": content hash, "chunk_ids": ids of the chunk documents}
+        self._manifest: Dict[str, Dict] = {}
+        if self.persist_dir is not None and (self.persist_dir / MANIFEST_FILE).exists():
+            self._load_from_storage()
 
     def _load_documents_from_directory(self, directory_path) -> List[Document]:
         def name_metadata_storer(filename: str) -> Dict:
@@ -29,15 +62,106 @@ class CodeVectorRepository:
     def load_from_directory(self, directory_path: str):
         documents = self._load_documents_from_directory(directory_path)
 
-        chunked_langchain_documents = DocumentChunker.chunk_documents(
-            [doc.to_langchain_format() for doc in documents]
+        files: Dict[str, str] = {}
+        for doc in documents:
+            filename = doc.metadata["filename"]
+            files[filename] = files.get(filename, "") + doc.text
+
+        self.load_from_files_dict(FilesDict(files))
+
+    def load_from_files_dict(self, files_dict: FilesDict):
+        """
+        Update the index to contain the code chunks of exactly the given files.
+
+        Only the files that are not indexed yet, or whose content changed, are chunked
+        and inserted. The `filename` metadata of the chunks is the key of their file.
+        """
+        hashes = {
+            filename: hashlib.sha256(content.encode("utf-8")).hexdigest()
+            for filename, content in files_dict.items()
+        }
+        removed = [
+            filename
+            for filename, entry in self._manifest.items()
+            if hashes.get(filename) != entry["hash"]
+        ]
+        added = [
+            filename
+            for filename, content_hash in hashes.items()
+            if filename not in self._manifest
+            or self._manifest[filename]["hash"] != content_hash
+        ]
+        if self._index is not None and not removed and not added:
+            return
+
+        for filename in removed:
+            if self._index is not None:
+                for chunk_id in self._manifest[filename]["chunk_ids"]:
+                    self._index.delete_ref_doc(chunk_id, delete_from_docstore=True)
+            del self._manifest[filename]
+
+        chunked_documents = self._chunk_files(
+            {filename: files_dict[filename] for filename in added}, hashes
         )
+        if self._index is None:
+            self._index = VectorStoreIndex.from_documents(chunked_documents)
+        else:
+            for document in chunked_documents:
+                self._index.insert(document)
+
+        self._query_engine = None
+        self._retriever = None
+        if self.persist_dir is not None:
+            self._persist()
 
-        chunked_documents = [
-            Document.from_langchain_format(doc) for doc in chunked_langchain_documents
+    def _chunk_files(
+        self, files: Dict[str, str], hashes: Dict[str, str]
+    ) -> List[Document]:
+        """
+        Chunk files into documents whose ids derive from the name and content hash of
+        their file, so that files with the same content have distinct chunks.
+        """
+        documents = [
+            Document(text=content, metadata={"filename": filename})
+            for filename, content in files.items()
         ]
+        chunked_langchain_documents = DocumentChunker.chunk_documents(
+            [doc.to_langchain_format() for doc in documents]
+        )
 
-        self._index = VectorStoreIndex.from_documents(chunked_documents)
+        for filename in files:
+            self._manifest[filename] = {"hash": hashes[filename], "chunk_ids": []}
+        chunked_documents = []
+        for doc in chunked_langchain_documents:
+            entry = self._manifest[doc.metadata["filename"]]
+            file_id = hashlib.sha256(
+                (doc.metadata["filename"] + entry["hash"]).encode("utf-8")
+            ).hexdigest()
+            chunk_id = f"{file_id}-{len(entry['chunk_ids'])}"
+            entry["chunk_ids"].append(chunk_id)
+            chunked_document = Document.from_langchain_format(doc)
+            chunked_document.id_ = chunk_id
+            chunked_documents.append(chunked_document)
+        return chunked_documents
+
+    def _load_from_storage(self):
+        try:
+            storage_context = StorageContext.from_defaults(
+                persist_dir=str(self.persist_dir)
+            )
+            self._index = load_index_from_storage(storage_context)
+            self._manifest = json.loads((self.persist_dir / MANIFEST_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            # a missing or inconsistent index is rebuilt on the next load
+            self._index = None
+            self._manifest = {}
+
+    def _persist(self):
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self._index.storage_context.persist(persist_dir=str(self.persist_dir))
+        # written last, so that an interrupted persist leaves no manifest pointing at
+        # chunks missing from the index
+        (self.persist_dir / MANIFEST_FILE).write_text(json.dumps(self._manifest))
 
     def query(self, query_string: str):
         """
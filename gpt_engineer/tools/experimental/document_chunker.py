@@ -1,13 +1,35 @@
+import threading
+
 from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, NamedTuple
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
 
 import tree_sitter_languages
 
 from langchain.docstore.document import Document
 from langchain.text_splitter import TextSplitter
 
-from gpt_engineer.tools.experimental.supported_languages import SUPPORTED_LANGUAGES
+from gpt_engineer.tools.experimental.supported_languages import LANGUAGES_BY_EXTENSION
+
+# Idle tree-sitter parsers by language. Creating a parser loads its language library,
+# which is much slower than parsing a typical file, and a parser must not be used by
+# two threads at once, so parsers are pooled rather than shared.
+_parser_pool: Dict[str, List[Any]] = defaultdict(list)
+_parser_pool_lock = threading.Lock()
+
+
+@contextmanager
+def _pooled_parser(language: str) -> Iterator[Any]:
+    with _parser_pool_lock:
+        parser = _parser_pool[language].pop() if _parser_pool[language] else None
+    if parser is None:
+        parser = tree_sitter_languages.get_parser(language)
+    try:
+        yield parser
+    finally:
+        with _parser_pool_lock:
+            _parser_pool[language].append(parser)
 
 
 class CodeSplitter(TextSplitter):
@@ -28,34 +50,42 @@ class CodeSplitter(TextSplitter):
         self.chunk_lines_overlap = chunk_lines_overlap
         self.max_chars = max_chars
 
-    def _chunk_node(self, node: Any, text: str, last_end: int = 0) -> List[str]:
-        new_chunks = []
-        current_chunk = ""
+    def _chunk_node(self, node: Any, last_end: int = 0) -> List[Tuple[int, int]]:
+        """
+        Group the children of a node into chunks of at most max_chars, recursing into
+        children that are too big. Chunks are returned as (start, end) byte offsets
+        into the source, so that each chunk is sliced from it only once.
+        """
+        spans = []
+        chunk_start = None
         for child in node.children:
-            if child.end_byte - child.start_byte > self.max_chars:
+            child_size = child.end_byte - child.start_byte
+            chunk_size = 0 if chunk_start is None else last_end - chunk_start
+            if child_size > self.max_chars:
                 # Child is too big, recursively chunk the child
-                if len(current_chunk) > 0:
-                    new_chunks.append(current_chunk)
-                current_chunk = ""
-                new_chunks.extend(self._chunk_node(child, text, last_end))
-            elif (
-                len(current_chunk) + child.end_byte - child.start_byte > self.max_chars
-            ):
+                if chunk_size > 0:
+                    spans.append((chunk_start, last_end))
+                chunk_start = None
+                spans.extend(self._chunk_node(child, last_end))
+            elif chunk_size + child_size > self.max_chars:
                 # Child would make the current chunk too big, so start a new chunk
-                new_chunks.append(current_chunk)
-                current_chunk = text[last_end : child.end_byte]
-            else:
-                current_chunk += text[last_end : child.end_byte]
+                if chunk_size > 0:
+                    spans.append((chunk_start, last_end))
+                chunk_start = last_end
+            elif chunk_start is None:
+                chunk_start = last_end
             last_end = child.end_byte
-        if len(current_chunk) > 0:
-            new_chunks.append(current_chunk)
-        return new_chunks
+        if chunk_start is not None and last_end > chunk_start:
+            spans.append((chunk_start, last_end))
+        return spans
 
     def split_text(self, text: str) -> List[str]:
         """Split incoming code and return chunks using the AST."""
 
+        source = bytes(text, "utf-8")
         try:
-            parser = tree_sitter_languages.get_parser(self.language)
+            with _pooled_parser(self.language) as parser:
+                tree = parser.parse(source)
         except Exception as e:
             print(
                 f"Could not get parser for language {self.language}. Check "
@@ -64,10 +94,11 @@ class CodeSplitter(TextSplitter):
             )
             raise e
 
-        tree = parser.parse(bytes(text, "utf-8"))
-
         if not tree.root_node.children or tree.root_node.children[0].type != "ERROR":
-            chunks = [chunk.strip() for chunk in self._chunk_node(tree.root_node, text)]
+            chunks = [
+                source[start:end].decode("utf-8").strip()
+                for start, end in self._chunk_node(tree.root_node)
+            ]
 
             return chunks
         else:
@@ -110,21 +141,14 @@ def _sort_documents_by_programming_language_or_other(
 
     for doc in documents:
         filename = str(doc.metadata.get("filename"))
-        extension = Path(filename).suffix
-        language_found = False
-
-        for lang in SUPPORTED_LANGUAGES:
-            if extension in lang["extensions"]:
-                doc.metadata["is_code"] = True
-                doc.metadata["code_language"] = lang["name"]
-                doc.metadata["code_language_tree_sitter_name"] = lang[
-                    "tree_sitter_name"
-                ]
-                docs_to_split[lang["tree_sitter_name"]].append(doc)
-                language_found = True
-                break
-
-        if not language_found:
+        lang = LANGUAGES_BY_EXTENSION.get(Path(filename).suffix)
+
+        if lang is not None:
+            doc.metadata["is_code"] = True
+            doc.metadata["code_language"] = lang["name"]
+            doc.metadata["code_language_tree_sitter_name"] = lang["tree_sitter_name"]
+            docs_to_split[lang["tree_sitter_name"]].append(doc)
+        else:
             doc.metadata["isCode"] = False
             other_docs.append(doc)
 
@@ -1,19 +1,23 @@
-import os
-import tempfile
+from pathlib import Path
+from typing import Optional
 
 from langchain.schema import HumanMessage, SystemMessage
 
 from gpt_engineer.core.ai import AI
 from gpt_engineer.core.base_memory import BaseMemory
 from gpt_engineer.core.chat_to_files import overwrite_code_with_edits
-from gpt_engineer.core.default.disk_memory import DiskMemory
-from gpt_engineer.core.default.paths import IMPROVE_LOG_FILE
-from gpt_engineer.core.default.steps import curr_fn, setup_sys_prompt_existing_code
+from gpt_engineer.core.default.paths import CODE_INDEX_DIR, IMPROVE_LOG_FILE
+from gpt_engineer.core.default.steps import (
+    current_step,
+    setup_sys_prompt_existing_code,
+    step,
+)
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.tools.experimental.code_vector_repository import CodeVectorRepository
 
 
+@step
 def improve_automatic_file_selection(
     ai: AI,
     prompt: str,
@@ -21,17 +25,12 @@ def improve_automatic_file_selection(
     memory: BaseMemory,
     preprompts_holder: PrepromptsHolder,
 ):
-    code_vector_repository = CodeVectorRepository()
-    # ToDo: Replace this hacky way to get the right langchain document format
-    temp_dir = tempfile.mkdtemp()
-    temp_saver = DiskMemory(temp_dir)
-    for file, content in code.items():
-        temp_saver[file] = content
-    code_vector_repository.load_from_directory(temp_dir)
+    code_vector_repository = CodeVectorRepository(_code_index_dir(memory))
+    code_vector_repository.load_from_files_dict(code)
     relevant_documents = code_vector_repository.relevent_code_chunks(prompt)
     relevant_code = FilesDict()
     for doc in relevant_documents:
-        file_path = os.path.relpath(doc.metadata["filename"], temp_dir)
+        file_path = doc.metadata["filename"]
         relevant_code[file_path] = code[file_path]
     print(
         "Relevant documents to be modified are: "
@@ -46,8 +45,19 @@ def improve_automatic_file_selection(
 
     messages.append(HumanMessage(content=f"Request: {prompt}"))
 
-    messages = ai.next(messages, step_name=curr_fn())
+    messages = ai.next(messages, step_name=current_step())
     chat = messages[-1].content.strip()
     overwrite_code_with_edits(chat, code)
     memory[IMPROVE_LOG_FILE] = chat
     return code
+
+
+def _code_index_dir(memory: BaseMemory) -> Optional[Path]:
+    """
+    The folder to persist the code index in: next to the memory, in the metadata folder
+    of the project, or None if the memory is not stored on disk.
+    """
+    memory_path = getattr(memory, "path", None)
+    if memory_path is None:
+        return None
+    return Path(memory_path).parent / CODE_INDEX_DIR
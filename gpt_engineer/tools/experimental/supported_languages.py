@@ -47,3 +47,11 @@ SUPPORTED_LANGUAGES = [
     #     "tree_sitter_name": "swift"
     # },
 ]
+
+# The supported language of each file extension. Languages are iterated in reverse, so
+# that the first language listing an extension wins.
+LANGUAGES_BY_EXTENSION = {
+    extension: language
+    for language in reversed(SUPPORTED_LANGUAGES)
+    for extension in language["extensions"]
+}
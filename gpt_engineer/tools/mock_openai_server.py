@@ -0,0 +1,319 @@
+"""
+A local stand-in for the OpenAI chat completions API, for load and latency testing.
+
+The server answers `POST /v1/chat/completions` requests, streamed over server-sent
+events or not, with scripted responses. It simulates the time to the first token, a
+token rate, random server errors and bursts of rate-limit (429) errors. This allows
+`AI` and the CLI to be driven at high concurrency without calling a real model:
+
+    python -m gpt_engineer.tools.mock_openai_server --port 8000 --ttft 0.5
+
+and point `AI(base_url="http://127.0.0.1:8000/v1")`, or the `OPENAI_API_BASE`
+environment variable, at it. Unless responses are scripted with `--responses`, the
+server answers code generation requests in the `file_format` of the preprompts,
+entrypoint requests with a shell command and improve requests with an edit block on
+the first file it was sent, so that the answers can be parsed by `chat_to_files`.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import typer
+
+from gpt_engineer.core.chat_to_files import chat_to_files_dict
+from gpt_engineer.core.transcripts import TOKEN_REGEX
+
+FILE_FORMAT_RESPONSE = """main.py
+```python
+print("Hello World!")
+```
+"""
+
+ENTRYPOINT_RESPONSE = """```sh
+python main.py
+```
+"""
+
+
+@dataclass
+class MockServerConfig:
+    """
+    The behaviour of a `MockOpenAIServer`.
+
+    Attributes
+    ----------
+    ttft : float
+        The seconds before the first token of a response is sent.
+    tokens_per_second : Optional[float]
+        The rate at which the tokens of a response are sent, or None for no delay.
+    error_rate : float
+        The probability that a request fails with a server error (500).
+    rate_limit_every : int
+        After this many requests, a burst of rate-limit errors starts; 0 disables them.
+    rate_limit_burst : int
+        The number of consecutive requests that fail with a rate-limit error (429).
+    responses : List[str]
+        Responses to answer with, in turn, instead of the default ones.
+    seed : int
+        The seed of the random server errors.
+    """
+
+    ttft: float = 0.0
+    tokens_per_second: Optional[float] = None
+    error_rate: float = 0.0
+    rate_limit_every: int = 0
+    rate_limit_burst: int = 1
+    responses: List[str] = field(default_factory=list)
+    seed: int = 0
+
+
+class MockOpenAIServer:
+    """
+    A threaded HTTP server imitating the OpenAI chat completions API.
+
+    It can be used as a context manager, which runs the server in a background thread.
+
+    Attributes
+    ----------
+    config : MockServerConfig
+        The simulated latency, errors and responses.
+    url : str
+        The base URL of the API, to pass to `AI` as `base_url`.
+    requests : int
+        The number of requests received so far.
+    """
+
+    def __init__(
+        self,
+        config: Optional[MockServerConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.config = config or MockServerConfig()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._responses = (
+            itertools.cycle(self.config.responses) if self.config.responses else None
+        )
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        host, port = self._httpd.server_address[:2]
+        self.url = f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _next_outcome(self) -> Optional[int]:
+        """
+        Count a request and return the error status it fails with, if any.
+        """
+        with self._lock:
+            index = self.requests
+            self.requests += 1
+            config = self.config
+            if config.rate_limit_every and (
+                index % (config.rate_limit_every + config.rate_limit_burst)
+                >= config.rate_limit_every
+            ):
+                return 429
+            if self._random.random() < config.error_rate:
+                return 500
+            return None
+
+    def _response_for(self, messages: List[Dict]) -> str:
+        with self._lock:
+            if self._responses is not None:
+                return next(self._responses)
+        system = " ".join(m["content"] for m in messages if m["role"] == "system")
+        if ">>>>>>> updated" in system:
+            return _edit_response(messages)
+        if "unix terminal commands" in system:
+            return ENTRYPOINT_RESPONSE
+        return FILE_FORMAT_RESPONSE
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, _error("Unknown endpoint", "invalid_request"))
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = json.loads(body or b"{}")
+                status = server._next_outcome()
+                if status == 429:
+                    self._send_json(429, _error("Rate limit reached", "requests"))
+                    return
+                if status == 500:
+                    self._send_json(500, _error("Simulated server error", "server"))
+                    return
+
+                content = server._response_for(request.get("messages", []))
+                model = request.get("model", "mock")
+                tokens = TOKEN_REGEX.findall(content)
+                time.sleep(server.config.ttft)
+                if request.get("stream"):
+                    self._stream(model, tokens)
+                else:
+                    if server.config.tokens_per_second:
+                        time.sleep(len(tokens) / server.config.tokens_per_second)
+                    self._send_json(200, _completion(model, content, request, tokens))
+
+            def _send_json(self, status: int, payload: Dict) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, tokens: List[str]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                deltas = [{"role": "assistant", "content": ""}]
+                deltas += [{"content": token} for token in tokens]
+                for index, delta in enumerate(deltas):
+                    if index and server.config.tokens_per_second:
+                        time.sleep(1 / server.config.tokens_per_second)
+                    self._send_event(_chunk(completion_id, model, delta, None))
+                self._send_event(_chunk(completion_id, model, {}, "stop"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _send_event(self, payload: Dict) -> None:
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+
+def _edit_response(messages: List[Dict]) -> str:
+    """
+    An edit block that replaces the first line of the first file sent with itself.
+    """
+    for message in messages:
+        if message["role"] != "user":
+            continue
+        for path, content in chat_to_files_dict(message["content"]).items():
+            lines = [line for line in content.splitlines() if line.strip()]
+            if lines:
+                return (
+                    "PLANNING:\nNo changes are needed.\n\nOUTPUT:\n"
+                    f"```\n{path}\n<<<<<<< HEAD\n{lines[0]}\n=======\n{lines[0]}\n"
+                    ">>>>>>> updated\n```\n"
+                )
+    return "PLANNING:\nNo changes are needed.\n"
+
+
+def _error(message: str, error_type: str) -> Dict:
+    return {"error": {"message": message, "type": error_type, "code": None}}
+
+
+def _chunk(
+    completion_id: str, model: str, delta: Dict, finish_reason: Optional[str]
+) -> Dict:
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _completion(model: str, content: str, request: Dict, tokens: List[str]) -> Dict:
+    prompt_tokens = sum(
+        len(TOKEN_REGEX.findall(m.get("content", "")))
+        for m in request.get("messages", [])
+    )
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        },
+    }
+
+
+def main(
+    host: str = typer.Option("127.0.0.1", help="interface to listen on"),
+    port: int = typer.Option(8000, help="port to listen on"),
+    ttft: float = typer.Option(0.0, help="seconds to the first token"),
+    tokens_per_second: Optional[float] = typer.Option(
+        None, help="rate at which tokens are sent"
+    ),
+    error_rate: float = typer.Option(0.0, help="fraction of requests failing with 500"),
+    rate_limit_every: int = typer.Option(
+        0, help="requests between bursts of 429 errors, 0 to disable"
+    ),
+    rate_limit_burst: int = typer.Option(1, help="consecutive 429 errors per burst"),
+    responses: Optional[Path] = typer.Option(
+        None, help="JSON file with a list of responses to answer with, in turn"
+    ),
+    seed: int = typer.Option(0, help="seed of the random server errors"),
+):
+    config = MockServerConfig(
+        ttft=ttft,
+        tokens_per_second=tokens_per_second,
+        error_rate=error_rate,
+        rate_limit_every=rate_limit_every,
+        rate_limit_burst=rate_limit_burst,
+        responses=json.loads(responses.read_text()) if responses else [],
+        seed=seed,
+    )
+    server = MockOpenAIServer(config, host, port)
+    print(f"Serving a mock OpenAI API at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    typer.run(main)
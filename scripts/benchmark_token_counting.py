@@ -0,0 +1,66 @@
+"""
+Benchmark token counting time against conversation history length.
+
+Simulates a conversation that grows by one user prompt and one AI answer per step,
+as happens in the `improve` refinement loop and in `self_heal`, and reports the time
+`TokenUsageLog.update_log` takes per step compared to re-encoding the whole history.
+"""
+import random
+import string
+import time
+
+import typer
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from tabulate import tabulate
+
+from gpt_engineer.core.token_usage import Tokenizer, TokenUsageLog
+
+
+def random_text(n_words: int, rng: random.Random) -> str:
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        for _ in range(n_words)
+    )
+
+
+def main(
+    max_history: int = typer.Option(
+        64, help="number of messages in the longest history"
+    ),
+    words_per_message: int = typer.Option(2000, help="words per synthetic message"),
+    model: str = typer.Option("gpt-4", help="model whose tokenizer is used"),
+    seed: int = 0,
+):
+    rng = random.Random(seed)
+    tokenizer = Tokenizer(model)
+    token_usage_log = TokenUsageLog(model)
+
+    messages = [SystemMessage(content=random_text(words_per_message, rng))]
+    rows = []
+    while len(messages) < max_history:
+        messages.append(HumanMessage(content=random_text(words_per_message, rng)))
+        answer = random_text(words_per_message, rng)
+
+        t0 = time.perf_counter()
+        uncached_tokens = sum(tokenizer.num_tokens(m.content) for m in messages)
+        uncached_tokens += tokenizer.num_tokens(answer)
+        t1 = time.perf_counter()
+        token_usage_log.update_log(messages, answer, "benchmark")
+        t2 = time.perf_counter()
+
+        rows.append(
+            [len(messages), uncached_tokens, f"{t1 - t0:.4f}", f"{t2 - t1:.4f}"]
+        )
+        messages.append(AIMessage(content=answer))
+
+    print(
+        tabulate(
+            rows,
+            headers=["messages", "tokens", "full re-encode (s)", "update_log (s)"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,264 @@
+"""
+Micro-benchmarks for the code paths of gpt-engineer that do not involve the LLM.
+
+Times parsing of chat responses into files and edits, applying edits, formatting files
+for the chat, iterating a DiskMemory, uploading to and downloading from a FileStore, and
+listing the files of a project, on synthetic inputs of configurable scale. Every
+benchmark runs after warm-up rounds with garbage collection disabled, and the results
+are written as JSON, so that runs can be compared to spot performance regressions.
+
+    python scripts/micro_benchmarks.py --scale small --output results.json
+"""
+import gc
+import json
+import platform
+import random
+import shutil
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import typer
+
+from gpt_engineer.applications.cli.file_selector import FileSelector
+from gpt_engineer.benchmark.results import git_revision
+from gpt_engineer.core.chat_to_files import apply_edits, chat_to_files_dict, parse_edits
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.files_dict import FilesDict
+
+SCALES = {
+    "small": {
+        "response_files": 200,
+        "edits": 200,
+        "repository_files": 2_000,
+        "large_edit_bytes": 500_000,
+    },
+    "large": {
+        "response_files": 5_000,
+        "edits": 2_000,
+        "repository_files": 100_000,
+        "large_edit_bytes": 5_000_000,
+    },
+}
+
+
+@dataclass
+class Benchmark:
+    """
+    A benchmarked operation.
+
+    `setup` runs untimed before every round and returns the argument that is passed to
+    the timed `run`.
+    """
+
+    name: str
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None
+
+
+# Synthetic inputs
+
+
+def random_line(rng: random.Random) -> str:
+    name = "".join(rng.choices(string.ascii_lowercase, k=8))
+    return f"    {name} = compute({rng.randint(0, 10**6)}, '{name}')"
+
+
+def generate_files(
+    n_files: int, lines_per_file: int, rng: random.Random, files_per_dir: int = 100
+) -> FilesDict:
+    return FilesDict(
+        {
+            f"pkg{i // files_per_dir}/module_{i}.py": "\n".join(
+                [f"def function_{i}():"]
+                + [random_line(rng) for _ in range(lines_per_file)]
+            )
+            for i in range(n_files)
+        }
+    )
+
+
+def generate_files_response(files_dict: FilesDict) -> str:
+    return "\n\n".join(
+        f"{path}\n```python\n{content}\n```" for path, content in files_dict.items()
+    )
+
+
+def generate_edits_response(files_dict: FilesDict, rng: random.Random) -> str:
+    blocks = []
+    for path, content in files_dict.items():
+        lines = content.split("\n")
+        line = rng.choice(lines[1:])
+        blocks.append(
+            f"```python\n{path}\n<<<<<<< HEAD\n{line}\n=======\n"
+            f"{line}  # edited\n>>>>>>> updated\n```"
+        )
+    return "PLANNING:\nEdit every file.\n\nOUTPUT:\n" + "\n\n".join(blocks)
+
+
+def write_repository(path: Path, files_dict: FilesDict) -> Path:
+    for name, content in files_dict.items():
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(content)
+    return path
+
+
+# Benchmarks
+
+
+def build_benchmarks(
+    scale: Dict[str, int], workdir: Path, seed: int
+) -> List[Benchmark]:
+    rng = random.Random(seed)
+
+    response_files = generate_files(scale["response_files"], 40, rng)
+    files_response = generate_files_response(response_files)
+
+    edited_files = generate_files(scale["edits"], 40, rng)
+    edits_response = generate_edits_response(edited_files, rng)
+    edits = parse_edits(edits_response)
+
+    large_lines = scale["large_edit_bytes"] // 40
+    large_file = FilesDict(
+        {"large.py": generate_files(1, large_lines, rng)["pkg0/module_0.py"]}
+    )
+    large_lines_list = large_file["large.py"].split("\n")
+    large_before = "\n".join(large_lines_list[1 : large_lines // 2])
+    large_edits = parse_edits(
+        f"```python\nlarge.py\n<<<<<<< HEAD\n{large_before}\n=======\n"
+        f"{large_before.upper()}\n>>>>>>> updated\n```"
+    )
+
+    repository_files = generate_files(scale["repository_files"], 5, rng)
+    repository = write_repository(workdir / "repository", repository_files)
+    upload_dirs = iter(range(10**9))
+
+    def fresh_store() -> FileStore:
+        return FileStore(workdir / f"upload_{next(upload_dirs)}")
+
+    def populated_store() -> FileStore:
+        return fresh_store().upload(repository_files)
+
+    return [
+        Benchmark("chat_to_files_dict", lambda _: chat_to_files_dict(files_response)),
+        Benchmark("parse_edits", lambda _: parse_edits(edits_response)),
+        Benchmark(
+            "apply_edits",
+            lambda files: apply_edits(edits, files),
+            setup=lambda: FilesDict(edited_files),
+        ),
+        Benchmark(
+            "apply_edits_large",
+            lambda files: apply_edits(large_edits, files),
+            setup=lambda: FilesDict(large_file),
+        ),
+        Benchmark("FilesDict.to_chat", lambda _: response_files.to_chat()),
+        Benchmark(
+            "DiskMemory.__iter__",
+            lambda memory: list(memory),
+            setup=lambda: DiskMemory(repository),
+        ),
+        Benchmark(
+            "FileStore.upload",
+            lambda store: store.upload(repository_files),
+            setup=fresh_store,
+        ),
+        Benchmark(
+            "FileStore.upload_unchanged",
+            lambda store: store.upload(repository_files),
+            setup=populated_store,
+        ),
+        Benchmark("FileStore.download", lambda _: FileStore(repository).download()),
+        Benchmark(
+            "FileSelector.get_current_files",
+            lambda selector: selector.get_current_files(repository),
+            setup=lambda: FileSelector(repository),
+        ),
+    ]
+
+
+# Runner
+
+
+def time_benchmark(benchmark: Benchmark, rounds: int, warmup: int) -> Dict[str, Any]:
+    timings = []
+    for round_index in range(warmup + rounds):
+        argument = benchmark.setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            benchmark.run(argument)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if round_index >= warmup:
+            timings.append(elapsed)
+    return {
+        "name": benchmark.name,
+        "rounds": rounds,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def main(
+    scale: str = typer.Option("small", help=f"input sizes, one of {list(SCALES)}"),
+    rounds: int = typer.Option(5, help="timed rounds per benchmark"),
+    warmup: int = typer.Option(1, help="untimed rounds per benchmark"),
+    only: Optional[str] = typer.Option(
+        None, help="only run benchmarks whose name contains this string"
+    ),
+    output: Optional[Path] = typer.Option(None, help="write the JSON results here"),
+    seed: int = 0,
+):
+    if scale not in SCALES:
+        raise typer.BadParameter(f"unknown scale {scale}, use one of {list(SCALES)}")
+    workdir = Path(tempfile.mkdtemp(prefix="gpte-micro-benchmarks-"))
+    try:
+        benchmarks = build_benchmarks(SCALES[scale], workdir, seed)
+        results = []
+        for benchmark in benchmarks:
+            if only and only not in benchmark.name:
+                continue
+            result = time_benchmark(benchmark, rounds, warmup)
+            print(
+                f"{result['name']:<32} median {result['median']:.4f}s "
+                f"(min {result['min']:.4f}s, stdev {result['stdev']:.4f}s)",
+                file=sys.stderr,
+            )
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(
+        {
+            "metadata": {
+                "scale": scale,
+                "parameters": SCALES[scale],
+                "seed": seed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "git_revision": git_revision(),
+            },
+            "benchmarks": results,
+        },
+        indent=2,
+    )
+    if output:
+        output.write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    typer.run(main)
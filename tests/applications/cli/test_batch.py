@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+from typer.testing import CliRunner
+
+from gpt_engineer.applications.cli.batch import (
+    BatchEntry,
+    format_summary,
+    load_manifest,
+    run_batch,
+)
+from gpt_engineer.applications.cli.main import app
+from gpt_engineer.core.default.paths import ENTRYPOINT_FILE
+from gpt_engineer.tools.mock_openai_server import MockOpenAIServer, MockServerConfig
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-mock")
+    with MockOpenAIServer() as server:
+        monkeypatch.setenv("OPENAI_API_BASE", server.url)
+        yield server
+
+
+def test_load_jsonl_manifest(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        '{"project_path": "a", "prompt": "make a"}\n'
+        "\n"
+        '{"project_path": "b", "mode": "improve", "model": "gpt-3.5-turbo"}\n'
+    )
+
+    assert load_manifest(manifest) == [
+        BatchEntry(str(tmp_path / "a"), prompt="make a"),
+        BatchEntry(str(tmp_path / "b"), mode="improve", model="gpt-3.5-turbo"),
+    ]
+
+
+def test_load_toml_manifest(tmp_path):
+    manifest = tmp_path / "manifest.toml"
+    manifest.write_text(
+        '[[projects]]\nproject_path = "a"\nprompt = "make a"\nmode = "lite"\n\n'
+        '[[projects]]\nproject_path = "/abs/b"\ntemperature = 0.5\n'
+    )
+
+    assert load_manifest(manifest) == [
+        BatchEntry(str(tmp_path / "a"), prompt="make a", mode="lite"),
+        BatchEntry("/abs/b", temperature=0.5),
+    ]
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        ('{"prompt": "make a"}', "no project_path"),
+        ('{"project_path": "a", "mode": "clarify"}', "unknown mode"),
+        ('{"project_path": "a", "path": "b"}', "unknown keys"),
+        ('["a"]', "not an object"),
+        ('{"project_path": 5}', "project_path must be a string"),
+        ('{"project_path": "a", "prompt": ["make", "a"]}', "prompt must be a string"),
+        ('{"project_path": "a", "mode": 1}', "mode must be a string"),
+        ('{"project_path": "a", "model": null}', "model must be a string"),
+        ('{"project_path": "a", "temperature": "hot"}', "temperature must be a number"),
+        ('{"project_path": "a", "temperature": true}', "temperature must be a number"),
+        ('{"project_path": "a",', "line 1: invalid JSON"),
+    ],
+)
+def test_invalid_manifest_entries(tmp_path, line, error):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(line + "\n")
+
+    with pytest.raises(ValueError, match=error):
+        load_manifest(manifest)
+
+
+def test_run_batch(tmp_path, server):
+    entries = [
+        BatchEntry(str(tmp_path / "gen"), prompt="hello world"),
+        BatchEntry(str(tmp_path / "lite"), prompt="hello world", mode="lite"),
+        BatchEntry(str(tmp_path / "no_prompt")),
+    ]
+
+    results = run_batch(entries, model="gpt-4", temperature=0.1, workers=2)
+
+    assert [result.status for result in results] == ["ok", "ok", "failed"]
+    assert (tmp_path / "gen" / "main.py").exists()
+    assert (tmp_path / "gen" / ENTRYPOINT_FILE).exists()
+    assert (tmp_path / "lite" / "main.py").exists()
+    for result in results[:2]:
+        assert result.prompt_tokens > 0 and result.completion_tokens > 0
+        assert result.cost > 0
+    assert "No prompt given" in results[2].error
+    assert results[2].prompt_tokens == 0
+    assert "2/3 ok" in format_summary(results)
+
+
+def test_run_batch_improves_a_project(tmp_path, monkeypatch):
+    (tmp_path / "main.py").write_text("print('hi')\n")
+    edit = (
+        "```\nmain.py\n<<<<<<< HEAD\nprint('hi')\n=======\nprint('hello')\n"
+        ">>>>>>> updated\n```\n"
+    )
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-mock")
+
+    with MockOpenAIServer(MockServerConfig(responses=[edit])) as server:
+        monkeypatch.setenv("OPENAI_API_BASE", server.url)
+        (result,) = run_batch(
+            [BatchEntry(str(tmp_path), prompt="say hello", mode="improve")],
+            model="gpt-4",
+            temperature=0.1,
+        )
+
+    assert result.status == "ok", result.error
+    assert result.files_written == 1
+    assert (tmp_path / "main.py").read_text() == "print('hello')\n"
+
+
+def test_batch_command(tmp_path, server):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('{"project_path": "project", "prompt": "hello world"}\n')
+    summary = tmp_path / "summary.json"
+
+    result = CliRunner().invoke(
+        app, ["batch", str(manifest), "--summary", str(summary)]
+    )
+
+    assert result.exit_code == 0, result.output
+    (project,) = json.loads(summary.read_text())
+    assert project["status"] == "ok"
+    assert project["project_path"] == str(tmp_path / "project")
+    assert (tmp_path / "project" / "main.py").exists()
+
+
+def test_invalid_toml_manifest_entry(tmp_path):
+    manifest = tmp_path / "manifest.toml"
+    manifest.write_text("[[projects]]\nproject_path = 5\n")
+
+    with pytest.raises(ValueError, match="project 1: project_path must be a string"):
+        load_manifest(manifest)
+
+
+def test_batch_command_with_an_invalid_manifest(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('{"project_path": "project", "mode": "clarify"}\n')
+
+    result = CliRunner().invoke(app, ["batch", str(manifest)])
+
+    assert result.exit_code == 1
+    assert "unknown mode" in result.output
+    assert isinstance(result.exception, SystemExit)
+
+
+def test_main_command_is_the_default():
+    result = CliRunner().invoke(app, ["--help"])
+
+    assert result.exit_code == 0
+    assert "PROJECT_PATH" in result.output
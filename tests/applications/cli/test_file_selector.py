@@ -0,0 +1,161 @@
+import os
+
+from pathlib import Path
+
+import pytest
+
+from gpt_engineer.applications.cli.file_selector import (
+    ContextWindowExceededError,
+    FileSelector,
+    IgnoreRules,
+)
+
+
+def write(root: Path, files):
+    for name, content in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(content)
+
+
+@pytest.fixture
+def project(tmp_path):
+    write(
+        tmp_path,
+        {
+            "main.py": "",
+            "src/app.py": "",
+            "src/app.pyc": "",
+            "src/generated/schema.py": "",
+            "node_modules/lib/index.js": "",
+            ".git/config": "",
+            "docs/.hidden.md": "",
+            "build/out.txt": "",
+            "logs/debug.log": "",
+            "logs/keep.log": "",
+            "sub/.gitignore": "*.tmp\n/local.py\n",
+            "sub/cache.tmp": "",
+            "sub/local.py": "",
+            "sub/inner/local.py": "",
+            ".gitignore": "# comment\n*.pyc\nbuild/\nlogs/*.log\n!logs/keep.log\n",
+            ".gpteignore": "src/generated\n",
+        },
+    )
+    return tmp_path
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_get_current_files_prunes_ignored_paths(project, workers):
+    files = FileSelector(project, workers=workers).get_current_files(project)
+
+    assert files == sorted(
+        [
+            "main.py",
+            str(Path("src/app.py")),
+            str(Path("logs/keep.log")),
+            str(Path("sub/inner/local.py")),
+        ]
+    )
+
+
+def test_get_current_files_does_not_descend_into_ignored_folders(project, monkeypatch):
+    scanned = []
+    scandir = os.scandir
+
+    def recording_scandir(path):
+        scanned.append(Path(path).name)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", recording_scandir)
+    FileSelector(project).get_current_files(project)
+
+    assert "node_modules" not in scanned
+    assert "build" not in scanned
+    assert "generated" not in scanned
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, ignored",
+    [
+        ("*.log", "a/b/c.log", False, True),
+        ("/main.py", "main.py", False, True),
+        ("/main.py", "src/main.py", False, False),
+        ("docs/", "docs", False, False),
+        ("docs/", "docs", True, True),
+        ("**/cache", "a/b/cache", True, True),
+        ("a/**/z.txt", "a/z.txt", False, True),
+        ("a/**/z.txt", "a/b/c/z.txt", False, True),
+        ("data/**", "data/x/y", False, True),
+        ("file[0-9].txt", "file7.txt", False, True),
+        ("file[!0-9].txt", "file7.txt", False, False),
+        ("\\#literal", "#literal", False, True),
+    ],
+)
+def test_ignore_rules_patterns(pattern, path, is_dir, ignored):
+    pattern, negated, dir_only = IgnoreRules.parse_line(pattern)
+    rules = IgnoreRules([("", pattern, negated, dir_only)])
+
+    assert rules.is_ignored(path, is_dir) == ignored
+
+
+def test_editor_file_selector_annotates_token_counts(tmp_path, monkeypatch):
+    write(tmp_path, {"a.py": "print('hello')\n", "b.py": "x = 1\n"})
+    selector = FileSelector(tmp_path, model_name="gpt-4")
+    monkeypatch.setattr(selector, "open_with_default_editor", lambda path: None)
+    # with every file commented out, nothing is selected
+    with pytest.raises(Exception, match="No files were selected"):
+        selector.editor_file_selector(tmp_path, True)
+
+    toml_text = selector.toml_path.read_text()
+    tokens = selector.tokenizer.num_tokens("print('hello')\n")
+    assert f'# "a.py" = "selected"  # {tokens} tokens' in toml_text
+    assert "context window of 8192 tokens" in toml_text
+
+    selector.toml_path.write_text(toml_text.replace('# "a.py"', '"a.py"'))
+    assert selector.get_files_from_toml(tmp_path, selector.toml_path) == ["a.py"]
+
+
+def test_file_token_counts_are_cached(tmp_path, monkeypatch):
+    write(tmp_path, {"a.py": "x = 1\n", "b.py": "y = 2\n"})
+    FileSelector(tmp_path, model_name="gpt-4").file_token_counts(["a.py", "b.py"])
+
+    selector = FileSelector(tmp_path, model_name="gpt-4")
+    counted = []
+    num_tokens = selector.tokenizer.num_tokens
+    monkeypatch.setattr(
+        selector.tokenizer,
+        "num_tokens",
+        lambda txt: counted.append(txt) or num_tokens(txt),
+    )
+    (tmp_path / "b.py").write_text("y = 2 + 3\n")
+    counts = selector.file_token_counts(["a.py", "b.py"])
+
+    assert counted == ["y = 2 + 3\n"]
+    assert counts == {"a.py": num_tokens("x = 1\n"), "b.py": num_tokens("y = 2 + 3\n")}
+
+
+def test_check_context_budget(tmp_path, capsys):
+    write(tmp_path, {"small.py": "x = 1\n", "large.py": "x = 1\n" * 2000})
+    selector = FileSelector(tmp_path, model_name="gpt-4")
+
+    selector.check_context_budget(["small.py"])
+    assert "Warning" not in capsys.readouterr().out
+
+    selector.context_window = 12000
+    selector.check_context_budget(["large.py"])
+    assert "Warning" in capsys.readouterr().out
+
+    selector.context_window = 1000
+    with pytest.raises(ContextWindowExceededError, match="context window"):
+        selector.check_context_budget(["small.py", "large.py"])
+
+    selector.enforce_context_window = False
+    selector.check_context_budget(["small.py", "large.py"])
+    assert "Warning" in capsys.readouterr().out
+
+
+def test_check_context_budget_of_unknown_model(tmp_path, capsys):
+    write(tmp_path, {"large.py": "x = 1\n" * 20000})
+    selector = FileSelector(tmp_path, model_name="my-azure-deployment")
+
+    selector.check_context_budget(["large.py"])
+    assert "is unknown" in capsys.readouterr().out
@@ -1,13 +1,20 @@
 # Generated by CodiumAI
 import os
 
+import pytest
+
 import gpt_engineer.applications.cli.main as main
+import gpt_engineer.core.ai
 
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.paths import ENTRYPOINT_FILE, META_DATA_REL_PATH
 from tests.caching_ai import CachingAI
 
-main.AI = CachingAI
+
+@pytest.fixture(autouse=True)
+def caching_ai(monkeypatch):
+    # main imports AI when it runs, so it gets the caching one
+    monkeypatch.setattr(gpt_engineer.core.ai, "AI", CachingAI)
 
 
 def simplified_main(path: str, mode: str = ""):
@@ -35,6 +42,11 @@ def simplified_main(path: str, mode: str = ""):
         self_heal_mode=self_heal_mode,
         azure_endpoint=azure_endpoint,
         use_custom_preprompts=False,
+        llm_cache=False,
+        sqlite_memory=False,
+        ignore_context_window=False,
+        stream_files=False,
+        trace="",
         verbose=verbose,
     )
 
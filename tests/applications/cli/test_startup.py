@@ -0,0 +1,29 @@
+import json
+import subprocess
+import sys
+
+# Packages that must only be imported when the CLI runs, not when it starts
+LAZY_PACKAGES = {
+    "openai",
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "tiktoken",
+    "toml",
+}
+
+
+def test_cli_imports_heavy_packages_lazily():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, sys; import gpt_engineer.applications.cli.main; "
+            "print(json.dumps(sorted({m.split('.')[0] for m in sys.modules})))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert LAZY_PACKAGES.isdisjoint(json.loads(result.stdout))
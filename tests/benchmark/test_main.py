@@ -0,0 +1,39 @@
+from typer.testing import CliRunner
+
+from gpt_engineer.benchmark.__main__ import app
+
+
+def test_run_command_is_the_default():
+    result = CliRunner().invoke(app, ["agent.py", "gpteng", "--help"])
+
+    assert result.exit_code == 0
+    assert "PATH_TO_AGENT" in result.output
+
+
+def test_other_commands_are_still_found():
+    result = CliRunner().invoke(app, ["compare", "--help"])
+
+    assert result.exit_code == 0
+    assert "RUN_A" in result.output
+
+
+def test_compare_reports_a_missing_results_file(tmp_path):
+    result = CliRunner().invoke(
+        app, ["compare", "a", "b", "--results-path", str(tmp_path / "missing.jsonl")]
+    )
+
+    assert result.exit_code == 1
+    assert "Cannot load the runs" in result.output
+    assert isinstance(result.exception, SystemExit)
+
+
+def test_compare_reports_an_unknown_run(tmp_path):
+    results = tmp_path / "results.jsonl"
+    results.write_text('{"run_id": "a"}\n')
+
+    result = CliRunner().invoke(
+        app, ["compare", "a", "b", "--results-path", str(results)]
+    )
+
+    assert result.exit_code == 1
+    assert "No results for run b" in result.output
@@ -0,0 +1,68 @@
+import pytest
+
+from gpt_engineer.benchmark.results import (
+    compare_runs,
+    load_run,
+    permutation_p_value,
+    print_comparison,
+    save_results,
+)
+from gpt_engineer.benchmark.types import TaskResult
+
+
+def task_result(name, duration, passed):
+    return TaskResult(
+        task_name=name,
+        assertion_results={"works": passed},
+        duration=duration,
+        prompt_tokens=10,
+        completion_tokens=5,
+    )
+
+
+def test_save_and_load_run(tmp_path):
+    path = tmp_path / "results.jsonl"
+    save_results(path, "a", [task_result("t1", 1.0, True)], "agent.py", "gptme", "m")
+    save_results(path, "b", [task_result("t1", 2.0, False)], "agent.py", "gptme")
+
+    run = load_run(path, "a")
+
+    assert len(run) == 1
+    assert run[0]["task_name"] == "t1"
+    assert run[0]["model"] == "m"
+    assert run[0]["prompt_tokens"] == 10
+    assert run[0]["assertion_results"] == {"works": True}
+    with pytest.raises(ValueError):
+        load_run(path, "c")
+
+
+def test_compare_runs(tmp_path, capsys):
+    path = tmp_path / "results.jsonl"
+    for duration in [1.0, 1.1, 0.9, 1.0, 1.05]:
+        save_results(path, "a", [task_result("t1", duration, False)], "x.py", "b")
+    for duration in [2.0, 2.1, 1.9, 2.0, 2.05]:
+        save_results(path, "b", [task_result("t1", duration, True)], "x.py", "b")
+    save_results(path, "b", [task_result("only_in_b", 1.0, True)], "x.py", "b")
+
+    rows = compare_runs(load_run(path, "a"), load_run(path, "b"))
+
+    assert [row["task_name"] for row in rows] == ["t1"]
+    assert rows[0]["samples"] == (5, 5)
+    assert rows[0]["duration"] == pytest.approx((1.01, 2.01))
+    assert rows[0]["pass_rate"] == (0.0, 1.0)
+    assert rows[0]["duration_p_value"] < 0.05
+    print_comparison(rows)
+    assert "t1" in capsys.readouterr().out
+
+
+def test_compare_single_samples_has_no_p_value():
+    run_a = [{"task_name": "t", "duration": 1.0, "assertion_results": {"x": True}}]
+    run_b = [{"task_name": "t", "duration": 2.0, "assertion_results": {"x": True}}]
+
+    (row,) = compare_runs(run_a, run_b)
+
+    assert row["duration_p_value"] is None
+
+
+def test_permutation_p_value_of_equal_samples():
+    assert permutation_p_value([1.0, 1.0, 1.0], [1.0, 1.0, 1.0]) == 1.0
@@ -0,0 +1,135 @@
+import signal
+import threading
+import time
+
+import pytest
+
+from gpt_engineer.benchmark.run import execute, run
+from gpt_engineer.benchmark.types import Benchmark, Task
+from gpt_engineer.core.base_agent import BaseAgent
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.files_dict import FilesDict
+
+
+class EchoAgent(BaseAgent):
+    """Writes the prompt to a file, taking longer for earlier tasks."""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.threads = set()
+
+    def init(self, prompt):
+        return FilesDict({"out.txt": prompt})
+
+    def improve(self, files_dict, prompt, execution_command=None):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delays[prompt])
+        return FilesDict({"out.txt": prompt})
+
+
+def make_benchmark(n_tasks):
+    return Benchmark(
+        name="test",
+        tasks=[
+            Task(
+                name=f"task{i}",
+                initial_code=FilesDict({}),
+                command="cat out.txt",
+                prompt=str(i),
+                assertions={
+                    "echoes prompt": lambda assertable, i=i: assertable.stdout == str(i)
+                },
+            )
+            for i in range(n_tasks)
+        ],
+    )
+
+
+def test_run_sequential():
+    benchmark = make_benchmark(3)
+    agent = EchoAgent({"0": 0, "1": 0, "2": 0})
+
+    results = run(agent, benchmark)
+
+    assert [r.task_name for r in results] == ["task0", "task1", "task2"]
+    assert all(r.assertion_results["echoes prompt"] for r in results)
+
+
+def test_run_concurrent_keeps_task_order():
+    benchmark = make_benchmark(4)
+    delays = {"0": 0.3, "1": 0.2, "2": 0.1, "3": 0}
+    agents = []
+
+    def agent_factory():
+        agents.append(EchoAgent(delays))
+        return agents[-1]
+
+    results = run(None, benchmark, workers=4, agent_factory=agent_factory)
+
+    assert [r.task_name for r in results] == ["task0", "task1", "task2", "task3"]
+    assert all(r.assertion_results["echoes prompt"] for r in results)
+    assert len(agents) == 4
+    assert len({thread for agent in agents for thread in agent.threads}) > 1
+
+
+def test_run_filters_task_name():
+    results = run(EchoAgent({"1": 0}), make_benchmark(3), task_name="task1")
+
+    assert [r.task_name for r in results] == ["task1"]
+
+
+def test_run_concurrent_requires_agent_factory():
+    with pytest.raises(ValueError):
+        run(EchoAgent({}), make_benchmark(2), workers=2)
+
+
+def run_command(command, **limits):
+    env = DiskExecutionEnv()
+    return execute(env, FilesDict({}), command, Benchmark("test", [], **limits))
+
+
+def test_execute_records_exit_code_and_peak_rss():
+    assertable = run_command("echo out; echo err >&2; exit 3")
+
+    assert assertable.stdout == "out\n"
+    assert assertable.stderr == "err\n"
+    assert assertable.exit_code == 3
+    assert assertable.process.returncode == 3
+    assert not assertable.timed_out
+    assert assertable.peak_rss > 0
+
+
+def test_execute_times_out_silent_command():
+    start = time.monotonic()
+    assertable = run_command("sleep 30", timeout=1)
+
+    assert time.monotonic() - start < 5
+    assert assertable.timed_out
+    assert assertable.exit_code == -signal.SIGKILL
+
+
+def test_execute_enforces_cpu_limit():
+    assertable = run_command("while true; do :; done", timeout=10, cpu_limit=1)
+
+    assert assertable.timed_out
+    assert assertable.exit_code != 0
+
+
+def test_execute_caps_output():
+    assertable = run_command("yes | head -c 100000", max_output_bytes=1000)
+
+    assert len(assertable.stdout) < 1100
+    assert assertable.stdout.startswith("[... 99000 bytes truncated ...]")
+
+
+def test_execute_without_resource_limits(monkeypatch):
+    # as on Windows, where there are no process groups, CPU limits or wait4
+    monkeypatch.setattr("gpt_engineer.benchmark.run.SUPPORTS_RESOURCE_LIMITS", False)
+
+    assertable = run_command("echo out; exit 3", cpu_limit=1)
+    assert assertable.stdout == "out\n"
+    assert assertable.exit_code == 3
+    assert assertable.peak_rss is None
+
+    assertable = run_command("sleep 30", timeout=1)
+    assert assertable.timed_out
@@ -18,6 +18,9 @@ class CachingAI(AI):
         self.temperature = 0.1
         self.azure_endpoint = ""
         self.streaming = False
+        self.response_cache = None
+        self.transcript = None
+        self.base_url = None
         try:
             self.model_name = "gpt-4-1106-preview"
             self.llm = self._create_chat_model()
@@ -34,6 +37,7 @@ class CachingAI(AI):
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        callbacks=None,
     ) -> List[Message]:
         """
         Advances the conversation by sending message history
@@ -47,6 +51,8 @@ class CachingAI(AI):
             The prompt to use, by default None.
         step_name : str
             The name of the step.
+        callbacks : Optional[Callbacks], optional
+            Additional callback handlers for this request, by default None.
 
         Returns
         -------
@@ -69,7 +75,6 @@ class CachingAI(AI):
 
         messages_key = self.serialize_messages(messages)
         if messages_key not in cache:
-            callbacks = []
             print("calling backoff inference")
             response = self.backoff_inference(messages, callbacks)
             self.token_usage_log.update_log(
@@ -1,9 +1,12 @@
 import typer
 
+import gpt_engineer.core.ai
+
 from gpt_engineer.applications.cli.main import main
 from tests.caching_ai import CachingAI
 
-main.__globals__["AI"] = CachingAI
+# main imports AI when it runs, so it gets the caching one
+gpt_engineer.core.ai.AI = CachingAI
 app = typer.Typer()
 app.command()(main)
 
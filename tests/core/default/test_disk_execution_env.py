@@ -1,4 +1,8 @@
+import os
+import selectors
+import signal
 import tempfile
+import time
 import unittest
 
 from unittest.mock import MagicMock, patch
@@ -50,12 +54,60 @@ class TestOnDiskExecutionEnv(unittest.TestCase):
         }
         with patch("subprocess.Popen") as mock_popen:
             mock_process = MagicMock()
-            mock_process.poll.side_effect = KeyboardInterrupt
+            mock_process.communicate.side_effect = KeyboardInterrupt
             mock_popen.return_value = mock_process
-            stdout_full, stderr_full, returncode = self.env.upload(FilesDict(code)).run(
-                f"bash {ENTRYPOINT_FILE}"
-            )
-            mock_process.kill.assert_called_once()
+            with patch("os.killpg") as mock_killpg, patch(
+                "gpt_engineer.core.default.disk_execution_env.capture_output",
+                side_effect=KeyboardInterrupt,
+            ):
+                stdout_full, stderr_full, returncode = self.env.upload(
+                    FilesDict(code)
+                ).run(f"bash {ENTRYPOINT_FILE}")
+            if os.name == "posix":
+                mock_killpg.assert_called_once()
+            else:
+                mock_process.kill.assert_called_once()
+
+    @unittest.skipUnless(os.name == "posix", "process groups are POSIX only")
+    def test_kills_process_group_on_keyboard_interrupt(self):
+        # the background sleep would keep running if only the shell were killed
+        code = {ENTRYPOINT_FILE: "sleep 30 & echo $! > pid.txt; wait"}
+        pid_file = self.env.upload(FilesDict(code)).store.working_dir / "pid.txt"
+
+        def interrupt_once_started(*args, **kwargs):
+            while not pid_file.exists() or not pid_file.read_text().strip():
+                time.sleep(0.01)
+            raise KeyboardInterrupt
+
+        with patch.object(
+            selectors.DefaultSelector, "select", side_effect=interrupt_once_started
+        ):
+            stdout, stderr, returncode = self.env.run(f"bash {ENTRYPOINT_FILE}")
+
+        assert returncode == -signal.SIGKILL
+        sleep_pid = int(pid_file.read_text())
+        time.sleep(0.2)
+        try:
+            with open(f"/proc/{sleep_pid}/stat") as f:
+                assert f.read().split()[2] == "Z"
+        except FileNotFoundError:
+            pass
+
+    def test_stderr_only_output(self):
+        code = {ENTRYPOINT_FILE: "for i in 1 2 3; do echo err$i >&2; done; echo done"}
+        stdout, stderr, returncode = self.env.upload(FilesDict(code)).run(
+            f"bash {ENTRYPOINT_FILE}"
+        )
+        assert stdout == "done\n"
+        assert stderr == "err1\nerr2\nerr3\n"
+        assert returncode == 0
+
+    def test_timeout_while_silent(self):
+        code = {ENTRYPOINT_FILE: "sleep 30"}
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            self.env.upload(FilesDict(code)).run(f"bash {ENTRYPOINT_FILE}", timeout=1)
+        assert time.monotonic() - start < 5
 
     def test_execution_with_output(self):
         entrypoint_content = """
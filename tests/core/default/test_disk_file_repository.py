@@ -1,3 +1,5 @@
+import os
+
 import pytest
 
 from gpt_engineer.core.default.disk_memory import DiskMemory
@@ -155,3 +157,55 @@ class TestOnDiskRepository:
         db["large_file"] = large_content
 
         assert db["large_file"] == large_content
+
+    #  keeps its key index up to date without walking the directory tree
+    def test_index_tracks_own_changes(self, tmp_path, monkeypatch):
+        db = DiskMemory(tmp_path)
+        db["file1.txt"] = "content1"
+        assert len(db) == 1
+
+        def no_scan(*args):
+            raise AssertionError("directory tree was scanned")
+
+        monkeypatch.setattr(db, "_scan", no_scan)
+        db["file2.txt"] = "content2"
+        db["directory/file3.txt"] = "content3"
+        del db["file1.txt"]
+
+        assert len(db) == 2
+        assert list(db) == ["directory/file3.txt", "file2.txt"]
+        assert "file2.txt" in db
+        assert "file1.txt" not in db
+        assert db.to_dict() == {
+            "directory/file3.txt": "content3",
+            "file2.txt": "content2",
+        }
+
+    #  notices files that were added or removed by someone else
+    def test_index_revalidates_external_changes(self, tmp_path):
+        db = DiskMemory(tmp_path)
+        db["directory/file1.txt"] = "content1"
+        assert len(db) == 1
+
+        (tmp_path / "directory" / "file2.txt").write_text("content2")
+        (tmp_path / "new_directory").mkdir()
+        (tmp_path / "new_directory" / "file3.txt").write_text("content3")
+        (tmp_path / "directory" / "file1.txt").unlink()
+
+        assert list(db) == ["directory/file2.txt", "new_directory/file3.txt"]
+        assert "directory/file1.txt" not in db
+
+    #  lists only keys whose file still exists, even if the index has not noticed yet
+    def test_path_list_only_has_existing_files(self, tmp_path):
+        db = DiskMemory(tmp_path)
+        db["main.py"] = "print('hi')"
+        db["notes.txt"] = "notes"
+        db["gone.py"] = "x = 1"
+        assert len(db) == 3
+        mtime = os.stat(tmp_path).st_mtime_ns
+        (tmp_path / "gone.py").unlink()
+        # keep the directory looking unchanged, so that the index is not rescanned
+        os.utime(tmp_path, ns=(mtime, mtime))
+
+        assert db.to_path_list_string() == "main.py\nnotes.txt"
+        assert db.to_path_list_string(supported_code_files_only=True) == "main.py"
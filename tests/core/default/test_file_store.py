@@ -0,0 +1,74 @@
+import os
+
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.files_dict import FilesDict
+
+
+def test_upload_and_download(tmp_path):
+    store = FileStore(tmp_path)
+    store.upload(FilesDict({"main.py": "print('hi')", "src/util.py": "x = 1"}))
+
+    assert (tmp_path / "src" / "util.py").read_text() == "x = 1"
+    assert store.download() == {"main.py": "print('hi')", "src/util.py": "x = 1"}
+    assert store.last_upload.written == 2
+    assert store.last_upload.bytes_written == len("print('hi')") + len("x = 1")
+
+
+def test_upload_skips_unchanged_files(tmp_path):
+    store = FileStore(tmp_path)
+    store.upload(FilesDict({"a.py": "a = 1", "b.py": "b = 1"}))
+    mtime = (tmp_path / "a.py").stat().st_mtime_ns
+
+    store.upload(FilesDict({"a.py": "a = 1", "b.py": "b = 2"}))
+
+    assert (tmp_path / "a.py").stat().st_mtime_ns == mtime
+    assert (tmp_path / "b.py").read_text() == "b = 2"
+    assert store.last_upload.written == 1
+    assert store.last_upload.unchanged == 1
+    assert store.last_upload.bytes_written == len("b = 2")
+
+
+def test_upload_skips_identical_existing_files(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1")
+    store = FileStore(tmp_path)
+
+    store.upload(FilesDict({"a.py": "a = 1"}))
+
+    assert store.last_upload.written == 0
+    assert store.last_upload.unchanged == 1
+
+
+def test_upload_rewrites_files_modified_on_disk(tmp_path):
+    store = FileStore(tmp_path)
+    store.upload(FilesDict({"a.py": "a = 1"}))
+    (tmp_path / "a.py").write_text("a = 2")
+
+    store.upload(FilesDict({"a.py": "a = 1"}))
+
+    assert (tmp_path / "a.py").read_text() == "a = 1"
+    assert store.last_upload.written == 1
+
+
+def test_upload_preserves_file_mode(tmp_path):
+    store = FileStore(tmp_path)
+    store.upload(FilesDict({"run.sh": "echo 1"}))
+    os.chmod(tmp_path / "run.sh", 0o755)
+
+    store.upload(FilesDict({"run.sh": "echo 2"}))
+
+    assert (tmp_path / "run.sh").stat().st_mode & 0o777 == 0o755
+
+
+def test_upload_deletes_removed_files(tmp_path):
+    (tmp_path / "notes.txt").write_text("not uploaded")
+    store = FileStore(tmp_path)
+    store.upload(FilesDict({"a.py": "a = 1", "pkg/b.py": "b = 1"}))
+
+    store.upload(FilesDict({"a.py": "a = 1"}))
+    assert (tmp_path / "pkg" / "b.py").exists()
+
+    store.upload(FilesDict({"a.py": "a = 1"}), delete_removed=True)
+    assert not (tmp_path / "pkg").exists()
+    assert (tmp_path / "notes.txt").exists()
+    assert store.last_upload.deleted == 1
+    assert store.download() == {"a.py": "a = 1", "notes.txt": "not uploaded"}
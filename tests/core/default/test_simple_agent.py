@@ -5,6 +5,7 @@ import pytest
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.paths import ENTRYPOINT_FILE
 from gpt_engineer.core.default.simple_agent import SimpleAgent
+from gpt_engineer.core.default.sqlite_memory import SqliteMemory
 from gpt_engineer.core.files_dict import FilesDict
 from tests.caching_ai import CachingAI
 
@@ -26,6 +27,14 @@ def test_init():
     assert code[outfile] == "Hello World!"
 
 
+def test_default_config_keeps_an_empty_memory(tmp_path):
+    memory = SqliteMemory(tmp_path / "memory.db")
+
+    agent = SimpleAgent.with_default_config(str(tmp_path), CachingAI(), memory=memory)
+
+    assert agent.memory is memory
+
+
 def test_improve():
     temp_dir = tempfile.mkdtemp()
     code = FilesDict(
@@ -0,0 +1,127 @@
+import pytest
+
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.sqlite_memory import SqliteMemory
+
+
+def test_DB_operations(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+
+    db["test_key"] = "test_value"
+    assert db["test_key"] == "test_value"
+    assert "test_key" in db
+    assert len(db) == 1
+
+    db["test_key"] = "new_value"
+    assert db["test_key"] == "new_value"
+
+    del db["test_key"]
+    assert "test_key" not in db
+    assert db.get("test_key", "default") == "default"
+    with pytest.raises(KeyError):
+        db["test_key"]
+    with pytest.raises(KeyError):
+        del db["test_key"]
+
+
+def test_persistence(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+    db["a/b.txt"] = "content"
+    db.close()
+
+    assert SqliteMemory(tmp_path / "memory.db")["a/b.txt"] == "content"
+
+
+def test_error_messages(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+
+    with pytest.raises(TypeError, match="val must be str"):
+        db["key"] = ["Invalid", "value"]
+    with pytest.raises(ValueError):
+        db["../outside"] = "value"
+
+
+def test_delete_removes_nested_keys(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+    db["logs/one.txt"] = "1"
+    db["logs/two.txt"] = "2"
+    db["logs2.txt"] = "3"
+
+    del db["logs"]
+
+    assert list(db) == ["logs2.txt"]
+
+
+def test_compression(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db", compress=True)
+    large_content = "a" * (10**6)
+    db["large_file"] = large_content
+    db["unicode"] = "héllo wörld"
+
+    assert db["large_file"] == large_content
+    assert db["unicode"] == "héllo wörld"
+    assert (tmp_path / "memory.db").stat().st_size < 10**5
+    # values written uncompressed stay readable when compression is turned on later
+    SqliteMemory(tmp_path / "other.db")["key"] = "value"
+    assert SqliteMemory(tmp_path / "other.db", compress=True)["key"] == "value"
+
+
+def test_batch(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+    with db.batch():
+        for i in range(100):
+            db[f"key{i}"] = str(i)
+    assert len(db) == 100
+
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db["key0"] = "changed"
+            raise RuntimeError()
+    assert db["key0"] == "0"
+
+
+def test_concurrent_access(tmp_path):
+    import threading
+
+    db = SqliteMemory(tmp_path / "memory.db")
+
+    def write_to_db(thread_id):
+        for i in range(100):
+            db[f"thread{thread_id}_write{i}"] = str(i)
+
+    threads = [
+        threading.Thread(target=write_to_db, args=(thread_id,))
+        for thread_id in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(db) == 1000
+
+
+def test_to_dict_and_path_list(tmp_path):
+    db = SqliteMemory(tmp_path / "memory.db")
+    db["main.py"] = "print('hi')"
+    db["notes.txt"] = "notes"
+
+    assert db.to_dict() == {"main.py": "print('hi')", "notes.txt": "notes"}
+    assert db.to_path_list_string() == "main.py\nnotes.txt"
+    assert db.to_path_list_string(supported_code_files_only=True) == "main.py"
+
+
+def test_migrate_from_directory(tmp_path):
+    disk_memory = DiskMemory(tmp_path / "memory")
+    disk_memory["all_output.txt"] = "output"
+    disk_memory["logs/improve.txt"] = "improve"
+    (tmp_path / "memory" / "image.png").write_bytes(b"\x89PNG\xff\xfe")
+
+    db = SqliteMemory.migrate_from_directory(
+        tmp_path / "memory", tmp_path / "memory.db"
+    )
+
+    assert db.to_dict() == {
+        "all_output.txt": "output",
+        "logs/improve.txt": "improve",
+    }
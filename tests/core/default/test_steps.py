@@ -1,4 +1,5 @@
 # Generated by CodiumAI
+import asyncio
 import tempfile
 
 from unittest.mock import MagicMock
@@ -6,8 +7,10 @@ from unittest.mock import MagicMock
 import pytest
 
 from langchain.schema import SystemMessage
+from langchain_community.chat_models.fake import FakeListChatModel
 
 from gpt_engineer.core.ai import AI
+from gpt_engineer.core.default.constants import MAX_EDIT_REFINEMENT_STEPS
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import (
     CODE_GEN_LOG_FILE,
@@ -17,15 +20,21 @@ from gpt_engineer.core.default.paths import (
     PREPROMPTS_PATH,
 )
 from gpt_engineer.core.default.steps import (
-    curr_fn,
+    STEPS,
+    agen_code,
+    aimprove,
+    current_step,
     gen_code,
     gen_entrypoint,
     improve,
+    run_concurrently,
     setup_sys_prompt,
     setup_sys_prompt_existing_code,
+    step,
 )
 from gpt_engineer.core.files_dict import FilesDict
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.core.token_usage import TokenUsageLog
 
 factorial_program = """
 To implement a function that calculates the factorial of a number in Python, we will create a simple Python module with a single function `factorial`. The factorial of a non-negative integer `n` is the product of all positive integers less than or equal to `n`. It is denoted by `n!`. The factorial of 0 is defined to be 1.
@@ -85,7 +94,7 @@ class TestGenCode:
     def test_generates_code_using_ai_model(self):
         # Mock AI class
         class MockAI:
-            def start(self, sys_prompt, user_prompt, step_name):
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
                 return [SystemMessage(content=factorial_program)]
 
         ai = MockAI()
@@ -104,7 +113,7 @@ class TestGenCode:
     def test_generated_code_saved_to_disk(self):
         # Mock AI class
         class MockAI:
-            def start(self, sys_prompt, user_prompt, step_name):
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
                 return [SystemMessage(content=factorial_program)]
 
         ai = MockAI()
@@ -118,11 +127,32 @@ class TestGenCode:
         assert CODE_GEN_LOG_FILE in memory
         assert memory[CODE_GEN_LOG_FILE] == factorial_program.strip()
 
+    #  Each file is passed on as soon as it is generated.
+    def test_generated_files_are_streamed(self, monkeypatch):
+        monkeypatch.setattr(
+            AI,
+            "_create_chat_model",
+            lambda self: FakeListChatModel(responses=[factorial_program]),
+        )
+        ai = AI("gpt-4")
+        memory = DiskMemory(tempfile.mkdtemp())
+        streamed = {}
+
+        code = gen_code(
+            ai,
+            "Write a function that calculates the factorial of a number.",
+            memory,
+            PrepromptsHolder(PREPROMPTS_PATH),
+            on_file=streamed.__setitem__,
+        )
+
+        assert streamed == code
+
     #  Raises TypeError if keys are not strings or Path objects.
     def test_raises_type_error_if_keys_not_strings_or_path_objects(self):
         # Mock AI class
         class MockAI:
-            def start(self, sys_prompt, user_prompt, step_name):
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
                 return [SystemMessage(content=factorial_program)]
 
         ai = MockAI()
@@ -137,7 +167,7 @@ class TestGenCode:
     def test_raises_type_error_if_values_not_strings(self):
         # Mock AI class
         class MockAI:
-            def start(self, sys_prompt, user_prompt, step_name):
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
                 return [SystemMessage(content=factorial_program)]
 
         ai = MockAI()
@@ -152,7 +182,7 @@ class TestGenCode:
     def test_raises_key_error_if_file_not_exist_in_database(self):
         # Mock AI class
         class MockAI:
-            def start(self, sys_prompt, user_prompt, step_name):
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
                 return [SystemMessage(content=factorial_program)]
 
         ai = MockAI()
@@ -164,19 +194,189 @@ class TestGenCode:
             code["nonexistent_file.py"]
 
 
+class TestImproveFuzzyMatching:
+    def test_near_miss_is_applied_without_refinement(self, tmp_path):
+        ai_patch = """
+```python
+main.py
+<<<<<<< HEAD
+def greet():
+  print('Hello, World!')
+=======
+def greet():
+  print('Goodbye, World!')
+>>>>>>> updated
+```"""
+        ai_mock = MagicMock(spec=AI)
+        ai_mock.next.return_value = [SystemMessage(content=ai_patch)]
+        code = FilesDict(
+            {"main.py": "def greet():\n    # say hello\n    print('Hello, World!')\n"}
+        )
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        improved_code = improve(
+            ai_mock, "say goodbye", code, DiskMemory(tmp_path), preprompts_holder
+        )
+
+        assert ai_mock.next.call_count == 1
+        assert improved_code["main.py"] == (
+            "def greet():\n    # say hello\n    print('Goodbye, World!')\n"
+        )
+
+
+class TestAsyncSteps:
+    class MockAI:
+        def __init__(self, content):
+            self.content = content
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.calls = 0
+
+        async def astart(self, system, user, step_name, callbacks=None):
+            return await self.anext([], step_name=step_name)
+
+        async def anext(self, messages, prompt=None, *, step_name):
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return messages + [SystemMessage(content=self.content)]
+
+    def test_agen_code(self):
+        ai = TestAsyncSteps.MockAI(factorial_program)
+        memory = DiskMemory(tempfile.mkdtemp())
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        code = asyncio.run(agen_code(ai, "factorial", memory, preprompts_holder))
+
+        assert isinstance(code, FilesDict)
+        assert len(code) == 2
+        assert memory[CODE_GEN_LOG_FILE] == factorial_program.strip()
+
+    def test_aimprove(self, tmp_path):
+        ai_patch = """
+```python
+main.py
+<<<<<<< HEAD
+print('Hello, World!')
+=======
+print('Goodbye, World!')
+>>>>>>> updated
+```"""
+        ai = TestAsyncSteps.MockAI(ai_patch)
+        code = FilesDict({"main.py": "print('Hello, World!')"})
+        memory = DiskMemory(tmp_path)
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        improved_code = asyncio.run(
+            aimprove(ai, "say goodbye", code, memory, preprompts_holder)
+        )
+
+        assert improved_code == FilesDict({"main.py": "print('Goodbye, World!')"})
+        assert memory[IMPROVE_LOG_FILE] == ai_patch.strip()
+
+    def test_aimprove_asks_again_for_edits_that_do_not_apply(self, tmp_path):
+        ai_patch = """
+```python
+main.py
+<<<<<<< HEAD
+print('Bonjour')
+=======
+print('Goodbye, World!')
+>>>>>>> updated
+```"""
+        ai = TestAsyncSteps.MockAI(ai_patch)
+        code = FilesDict({"main.py": "print('Hello, World!')"})
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        asyncio.run(
+            aimprove(ai, "say goodbye", code, DiskMemory(tmp_path), preprompts_holder)
+        )
+
+        assert ai.calls == MAX_EDIT_REFINEMENT_STEPS + 1
+
+    def test_run_concurrently_respects_limit(self):
+        ai = TestAsyncSteps.MockAI(factorial_program)
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+        memories = [DiskMemory(tempfile.mkdtemp()) for _ in range(6)]
+
+        results = asyncio.run(
+            run_concurrently(
+                (agen_code(ai, "factorial", m, preprompts_holder) for m in memories),
+                max_concurrency=2,
+            )
+        )
+
+        assert len(results) == 6
+        assert all(len(code) == 2 for code in results)
+        assert ai.max_in_flight == 2
+
+
 class TestStepUtilities:
-    def test_called_from_function(self):
-        # Arrange
-        def test_function():
-            return curr_fn()
+    def test_current_step_is_the_innermost_running_step(self, monkeypatch):
+        monkeypatch.setattr("gpt_engineer.core.default.steps.STEPS", {})
 
-        expected_name = "test_function"
+        @step
+        def inner():
+            return current_step()
 
-        # Act
-        actual_name = test_function()
+        @step
+        def outer():
+            return current_step(), inner(), current_step()
 
-        # Assert
-        assert actual_name == expected_name
+        assert outer() == ("outer", "inner", "outer")
+        with pytest.raises(RuntimeError):
+            current_step()
+
+    def test_concurrent_steps_have_their_own_name(self, monkeypatch):
+        monkeypatch.setattr("gpt_engineer.core.default.steps.STEPS", {})
+
+        @step
+        async def first():
+            await asyncio.sleep(0.01)
+            return current_step()
+
+        @step
+        async def second():
+            await asyncio.sleep(0)
+            return current_step()
+
+        async def run():
+            return await asyncio.gather(first(), second())
+
+        assert asyncio.run(run()) == ["first", "second"]
+
+    def test_steps_are_registered(self):
+        assert STEPS["gen_code"] is gen_code
+        assert STEPS["aimprove"] is aimprove
+
+    def test_step_is_timed_in_the_token_usage_log_of_its_ai(self):
+        class MockAI:
+            token_usage_log = TokenUsageLog("gpt-4")
+
+            def start(self, sys_prompt, user_prompt, step_name, callbacks=None):
+                messages = [SystemMessage(content=user_prompt)]
+                self.token_usage_log.record_llm_call(0.5, 0.1)
+                self.token_usage_log.update_log(
+                    messages, factorial_program, step_name=step_name
+                )
+                return messages + [SystemMessage(content=factorial_program)]
+
+        ai = MockAI()
+        memory = DiskMemory(tempfile.mkdtemp())
+        gen_code(
+            ai, "Write a factorial function.", memory, PrepromptsHolder(PREPROMPTS_PATH)
+        )
+
+        [timing] = ai.token_usage_log.step_timings()
+        assert timing.step_name == "gen_code"
+        assert timing.llm_calls == 1
+        assert timing.llm_latency == 0.5
+        assert timing.time_to_first_token == 0.1
+        assert timing.completion_tokens > 0
+        assert timing.wall_time >= timing.parse_time > 0
+        assert "gen_code" in ai.token_usage_log.format_step_timings()
 
     def test_constructs_system_prompt_with_predefined_instructions_and_philosophies(
         self,
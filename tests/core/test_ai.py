@@ -1,7 +1,19 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
 from langchain.chat_models.base import BaseChatModel
+from langchain.schema import HumanMessage, SystemMessage
 from langchain_community.chat_models.fake import FakeListChatModel
 
-from gpt_engineer.core.ai import AI
+from gpt_engineer.core.ai import AI, ResponseCache
+from gpt_engineer.core.chat_to_files import (
+    StreamingFilesCallbackHandler,
+    StreamingFilesParser,
+)
+from gpt_engineer.core.transcripts import TranscriptStore
 
 
 def mock_create_chat_model(self) -> BaseChatModel:
@@ -51,3 +63,154 @@ def test_token_logging(monkeypatch):
     # assert
     assert usageCostAfterStart > 0
     assert usageCostAfterNext > usageCostAfterStart
+
+
+def test_astart(monkeypatch):
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+
+    ai = AI("gpt-4")
+
+    # act
+    response_messages = asyncio.run(
+        ai.astart("system prompt", "user prompt", "step name")
+    )
+
+    # assert
+    assert response_messages[-1].content == "response1"
+
+
+def test_anext(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+
+    ai = AI("gpt-4")
+    response_messages = asyncio.run(
+        ai.astart("system prompt", "user prompt", "step name")
+    )
+
+    # act
+    response_messages = asyncio.run(
+        ai.anext(response_messages, "next user prompt", step_name="step name")
+    )
+
+    # assert
+    assert response_messages[-1].content == "response2"
+    assert len(ai.token_usage_log.log()) == 2
+
+
+def test_inference_is_retried_only_on_rate_limit_errors(monkeypatch):
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4")
+    errors = [openai.error.RateLimitError("slow down"), ValueError("bad request")]
+
+    def invoke(self, messages, config=None):
+        raise errors.pop(0)
+
+    monkeypatch.setattr(FakeListChatModel, "invoke", invoke)
+
+    with pytest.raises(ValueError, match="bad request"):
+        ai.start("system prompt", "user prompt", "step name")
+    assert errors == []
+
+
+def test_response_cache_serves_identical_requests(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    cache = ResponseCache(tmp_path / "cache.db")
+    ai = AI("gpt-4", response_cache=cache)
+
+    # act
+    first = ai.start("system prompt", "user prompt", "step name")
+    second = ai.start("system prompt", "user prompt", "step name")
+    other = ai.start("system prompt", "other user prompt", "step name")
+
+    # assert
+    assert first[-1].content == "response1"
+    assert second[-1].content == "response1"
+    assert other[-1].content == "response2"
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 2}
+
+
+def test_cached_responses_are_not_charged(monkeypatch, tmp_path):
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4", response_cache=ResponseCache(tmp_path / "cache.db"))
+    ai.start("system prompt", "user prompt", "step name")
+    cost = ai.token_usage_log.usage_cost()
+
+    ai.start("system prompt", "user prompt", "step name")
+
+    assert ai.token_usage_log.usage_cost() == cost > 0
+    assert len(ai.token_usage_log.log()) == 1
+    assert ai.token_usage_log.cached_prompt_tokens > 0
+    assert ai.token_usage_log.cached_completion_tokens > 0
+
+
+def test_response_cache_persists_across_instances(tmp_path):
+    messages = [SystemMessage(content="system"), HumanMessage(content="user")]
+    key = ResponseCache.key("gpt-4", 0.1, messages)
+    ResponseCache(tmp_path / "cache.db").set(key, "cached")
+
+    cache = ResponseCache(tmp_path / "cache.db")
+
+    assert cache.get(key) == "cached"
+    assert cache.get(ResponseCache.key("gpt-4", 0.2, messages)) is None
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_size_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+
+    cache.set("c", "cccc")
+
+    assert cache.get("a") == "aaaa"
+    assert cache.get("b") is None
+    assert cache.get("c") == "cccc"
+
+
+def test_response_cache_expires_old_entries(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_age_seconds=0)
+    cache.set("a", "aaaa")
+    time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_start_with_streaming_files_callback(monkeypatch):
+    # arrange
+    monkeypatch.setattr(
+        AI,
+        "_create_chat_model",
+        lambda self: FakeListChatModel(responses=["main.py\n```\nprint(1)\n```"]),
+    )
+    ai = AI("gpt-4")
+    parser = StreamingFilesParser()
+
+    # act
+    ai.start(
+        "system prompt",
+        "user prompt",
+        "step name",
+        callbacks=[StreamingFilesCallbackHandler(parser)],
+    )
+
+    # assert
+    assert parser.close() == {"main.py": "print(1)"}
+
+
+def test_next_records_llm_latency_in_current_step(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    messages = [SystemMessage(content="system prompt"), HumanMessage(content="user")]
+    TranscriptStore(path).record("gpt-4", 0.1, messages, "streamed response")
+    transcript = TranscriptStore(path, replay=True, latency=0.05)
+    ai = AI("gpt-4", transcript=transcript, streaming=True)
+
+    with ai.token_usage_log.time_step("step name") as timing:
+        ai.start("system prompt", "user", step_name="step name")
+
+    assert timing.llm_calls == 1
+    assert timing.llm_latency >= timing.time_to_first_token >= 0.05
+    assert timing.prompt_tokens > 0
+    assert ai.token_usage_log.step_timings() == [timing]
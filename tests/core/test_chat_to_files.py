@@ -4,11 +4,14 @@ import pytest
 
 from gpt_engineer.core.chat_to_files import (
     Edit,
+    StreamingFilesParser,
     apply_edits,
     chat_to_files_dict,
+    find_fuzzy_match,
     logger as parse_logger,
     parse_edits,
 )
+from gpt_engineer.core.default.disk_memory import DiskMemory
 
 
 def test_standard_input():
@@ -126,6 +129,48 @@ def test_filename_with_different_extension():
     assert chat_to_files_dict(chat) == expected
 
 
+def test_streaming_parser_matches_full_parse():
+    chat = """
+    Some text describing the code
+file1.py
+```python
+print("Hello, World!")
+```
+
+    `file2.py`
+
+    ```python
+    def add(a, b):
+        return a + b
+    ```
+
+    [FILE: empty.py]
+    ```
+    ```
+This concludes a fully working implementation.```
+    """
+    for chunk_size in [1, 2, 3, 7, len(chat)]:
+        parser = StreamingFilesParser()
+        for i in range(0, len(chat), chunk_size):
+            parser.feed(chat[i : i + chunk_size])
+        assert parser.close() == chat_to_files_dict(chat)
+
+
+def test_streaming_parser_emits_files_when_fence_closes(tmp_path):
+    memory = DiskMemory(tmp_path)
+    parser = StreamingFilesParser(store=memory)
+
+    assert parser.feed('file1.py\n```python\nprint("1")\n') == []
+    assert "file1.py" not in memory
+    assert parser.feed("``") == []
+    assert parser.feed('`\n\nfile2.py\n```\nprint("2")') == [("file1.py", 'print("1")')]
+    assert memory["file1.py"] == 'print("1")'
+    assert "file2.py" not in memory
+
+    assert parser.feed("\n```") == [("file2.py", 'print("2")')]
+    assert parser.close() == {"file1.py": 'print("1")', "file2.py": 'print("2")'}
+
+
 # Helper function to capture log messages
 @pytest.fixture
 def log_capture():
@@ -216,5 +261,128 @@ def test_apply_edit_multiple_matches(log_capture):
     )
 
 
+def test_apply_multiple_edits_to_one_file(log_capture):
+    edits = [
+        Edit("file.py", "def b():\n    pass", "def b():\n    return 2"),
+        Edit("other.py", "x = 1", "x = 2"),
+        Edit("file.py", "def a():\n    pass", "def a():\n    return 1"),
+    ]
+    code = {
+        "file.py": "def a():\n    pass\n\n\ndef b():\n    pass\n",
+        "other.py": "x = 1",
+    }
+    apply_edits(edits, code)
+    assert code == {
+        "file.py": "def a():\n    return 1\n\n\ndef b():\n    return 2\n",
+        "other.py": "x = 2",
+    }
+    assert log_capture.messages == []
+
+
+def test_apply_overlapping_edits(log_capture):
+    edits = [
+        Edit("file.py", "b = 2\nc = 3", "b = 20\nc = 30"),
+        Edit("file.py", "a = 1\nb = 2", "a = 10\nb = 20"),
+    ]
+    code = {"file.py": "a = 1\nb = 2\nc = 3"}
+    apply_edits(edits, code)
+    assert code == {"file.py": "a = 10\nb = 20\nc = 3"}
+    assert "overlapping code blocks" in log_capture.messages[0]
+
+
+def test_apply_chained_edits(log_capture):
+    edits = [
+        Edit("file.py", "print('a')", "print('b')"),
+        Edit("file.py", "print('b')", "print('c')"),
+    ]
+    code = {"file.py": "print('a')"}
+    apply_edits(edits, code)
+    assert code == {"file.py": "print('c')"}
+
+
+def test_apply_edit_after_creating_file(log_capture):
+    edits = [
+        Edit("file.py", "", "print('a')"),
+        Edit("file.py", "print('a')", "print('b')"),
+    ]
+    code = {}
+    apply_edits(edits, code)
+    assert code == {"file.py": "print('b')"}
+
+
+fuzzy_file = """import os
+
+
+class Config:
+    def __init__(self):
+        # read the settings
+        self.path = os.getcwd()
+        self.debug  =  False
+
+    def load(self):
+        return self.path
+"""
+
+
+def test_fuzzy_match_tolerates_whitespace_and_comments():
+    block = "def __init__(self):\n        self.path = os.getcwd()\n        self.debug = False"
+    match = find_fuzzy_match(fuzzy_file, block)
+    assert match is not None
+    assert fuzzy_file[match.start : match.end] == (
+        "def __init__(self):\n        # read the settings\n"
+        "        self.path = os.getcwd()\n        self.debug  =  False"
+    )
+
+
+def test_fuzzy_match_rejects_missing_and_ambiguous_blocks():
+    assert find_fuzzy_match(fuzzy_file, "def save(self):\n    pass") is None
+    assert find_fuzzy_match("x = 1\ny = 2\nx = 1\ny = 2\n", "x  = 1\ny = 2") is None
+
+
+def test_fuzzy_match_rejects_a_differing_line_of_code():
+    content = "\n".join(f"line_{i} = {i}" for i in range(10))
+    block = content.replace("line_5 = 5", "line_5 = 500").replace(" = ", "  =  ")
+    assert find_fuzzy_match(content, block) is None
+
+
+def test_apply_edit_with_fuzzy_match_keeps_comments_of_the_file(log_capture):
+    edits = [
+        Edit(
+            "config.py",
+            "def __init__(self):\n  self.path = os.getcwd()\n  self.debug = False",
+            "def __init__(self):\n  self.path = os.getcwd()\n  self.debug = True",
+        )
+    ]
+    code = {"config.py": fuzzy_file}
+    apply_edits(edits, code)
+    assert code["config.py"] == fuzzy_file.replace(
+        "self.debug  =  False", "self.debug = True"
+    )
+
+
+def test_apply_edit_with_fuzzy_match_reindents(log_capture):
+    edits = [
+        Edit(
+            "config.py",
+            "def load(self):\n  return self.path",
+            "def load(self):\n  return os.path.abspath(self.path)",
+        )
+    ]
+    code = {"config.py": fuzzy_file}
+    apply_edits(edits, code)
+    assert code["config.py"] == fuzzy_file.replace(
+        "return self.path", "return os.path.abspath(self.path)"
+    )
+    assert log_capture.messages == []
+
+
+def test_apply_edit_without_fuzzy_matching(log_capture):
+    edits = [Edit("file.py", "x  =  1", "x = 2")]
+    code = {"file.py": "x = 1"}
+    apply_edits(edits, code, fuzzy=False)
+    assert code == {"file.py": "x = 1"}
+    assert "code block to be replaced was not found" in log_capture.messages[0]
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,44 @@
+import os
+
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+
+
+def test_get_preprompts_reads_files_once(tmp_path, monkeypatch):
+    (tmp_path / "generate").write_text("Generate code.")
+    (tmp_path / "philosophy").write_text("Be concise.")
+    holder = PrepromptsHolder(tmp_path)
+    assert holder.get_preprompts() == {
+        "generate": "Generate code.",
+        "philosophy": "Be concise.",
+    }
+
+    reads = []
+    getitem = DiskMemory.__getitem__
+    monkeypatch.setattr(
+        DiskMemory,
+        "__getitem__",
+        lambda self, key: reads.append(key) or getitem(self, key),
+    )
+    holder.get_preprompts()
+
+    assert reads == []
+
+
+def test_get_preprompts_rereads_changed_files(tmp_path):
+    (tmp_path / "generate").write_text("Generate code.")
+    (tmp_path / "philosophy").write_text("Be concise.")
+    holder = PrepromptsHolder(tmp_path)
+    holder.get_preprompts()
+
+    (tmp_path / "generate").write_text("Generate tested code.")
+    # make the change visible even on file systems with coarse modification times
+    stat = (tmp_path / "generate").stat()
+    os.utime(tmp_path / "generate", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    (tmp_path / "philosophy").unlink()
+    (tmp_path / "roadmap").write_text("You will get instructions.")
+
+    assert holder.get_preprompts() == {
+        "generate": "Generate tested code.",
+        "roadmap": "You will get instructions.",
+    }
@@ -2,9 +2,11 @@ import csv
 
 from io import StringIO
 
-from langchain.schema import HumanMessage, SystemMessage
+import pytest
 
-from gpt_engineer.core.token_usage import TokenUsageLog
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.token_usage import TokenUsageLog, context_window
 
 
 def test_format_log():
@@ -45,3 +47,55 @@ def test_usage_cost():
 
     # assert
     assert usage_cost > 0
+
+
+def test_update_log_only_encodes_new_messages():
+    # arrange
+    token_usage_log = TokenUsageLog("gpt-4")
+    encoder = token_usage_log._tokenizer._tiktoken_tokenizer
+    encoded = []
+
+    class CountingEncoder:
+        def encode(self, txt):
+            encoded.append(txt)
+            return encoder.encode(txt)
+
+    token_usage_log._tokenizer._tiktoken_tokenizer = CountingEncoder()
+    messages = [
+        SystemMessage(content="my system message"),
+        HumanMessage(content="my user prompt"),
+    ]
+
+    # act
+    token_usage_log.update_log(messages, "first answer", "step 1")
+    messages += [AIMessage(content="first answer"), HumanMessage(content="again")]
+    token_usage_log.update_log(messages, "second answer", "step 2")
+
+    # assert
+    assert encoded == [
+        "my system message",
+        "my user prompt",
+        "first answer",
+        "again",
+        "second answer",
+    ]
+    assert token_usage_log.log()[1].in_step_prompt_tokens > (
+        token_usage_log.log()[0].in_step_prompt_tokens
+    )
+
+
+@pytest.mark.parametrize(
+    "model_name, window",
+    [
+        ("gpt-4", 8192),
+        ("gpt-4-32k-0613", 32768),
+        ("gpt-4-0125-preview", 128000),
+        ("gpt-4o", 128000),
+        ("gpt-3.5-turbo-0613", 4096),
+        # no guesses from prefixes, e.g. for Azure deployment names
+        ("gpt-4-my-deployment", None),
+        ("custom-model", None),
+    ],
+)
+def test_context_window(model_name, window):
+    assert context_window(model_name) == window
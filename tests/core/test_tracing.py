@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from langchain.chat_models.base import BaseChatModel
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.chat_to_files import chat_to_files_dict
+from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.file_store import FileStore
+from gpt_engineer.core.tracing import (
+    disable_tracing,
+    enable_tracing,
+    get_tracer,
+    span,
+    traced,
+)
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    yield enable_tracing(tmp_path / "trace.json")
+    disable_tracing()
+
+
+def mock_create_chat_model(self) -> BaseChatModel:
+    return FakeListChatModel(responses=["main.py\n```python\nprint('hi')\n```"])
+
+
+def spans(events):
+    return [event for event in events if event["ph"] == "X"]
+
+
+def test_trace_of_an_agent_run(monkeypatch, tmp_path, tracer):
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4")
+    messages = ai.start("system prompt", "user prompt", step_name="gen_code")
+    files_dict = chat_to_files_dict(messages[-1].content)
+    memory = DiskMemory(tmp_path / "memory")
+    memory["log.txt"] = "log"
+    FileStore(tmp_path / "project").upload(files_dict)
+    env = DiskExecutionEnv(tmp_path / "env")
+    env.run("echo hello")
+
+    trace = json.loads(tracer.write().read_text())
+    events = spans(trace["traceEvents"])
+    by_name = {event["name"]: event for event in events}
+    assert {
+        "AI.next",
+        "inference",
+        "count tokens",
+        "chat_to_files_dict",
+        "DiskMemory.set",
+        "FileStore.upload",
+        "DiskExecutionEnv.run",
+    } <= set(by_name)
+    assert by_name["AI.next"]["args"] == {"step_name": "gen_code"}
+    assert by_name["DiskExecutionEnv.run"]["args"] == {"command": "echo hello"}
+    # the inference span is nested in the span of the call
+    outer, inner = by_name["AI.next"], by_name["inference"]
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert any(event["name"] == "thread_name" for event in trace["traceEvents"])
+
+
+def test_no_spans_are_recorded_when_disabled():
+    assert get_tracer() is None
+
+    @traced("test")
+    def add(a, b):
+        return a + b
+
+    assert add(1, 2) == 3
+    with span("nothing", "test") as args:
+        assert args is None
+
+
+def test_span_records_the_error(tracer):
+    @traced("test", args=("value",))
+    def fail(value):
+        raise ValueError(value)
+
+    with pytest.raises(ValueError):
+        fail("x" * 1000)
+
+    (event,) = spans(tracer.events())
+    assert event["args"]["error"] == "ValueError"
+    assert len(event["args"]["value"]) == 200
+
+
+def test_concurrent_coroutines_are_traced_on_their_own_tracks(tracer):
+    @traced("test")
+    async def wait():
+        await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(wait(), wait())
+
+    asyncio.run(run())
+
+    events = spans(tracer.events())
+    assert len(events) == 2
+    assert events[0]["tid"] != events[1]["tid"]
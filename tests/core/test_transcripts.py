@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from langchain.chat_models.base import BaseChatModel
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.chat_to_files import (
+    StreamingFilesCallbackHandler,
+    StreamingFilesParser,
+)
+from gpt_engineer.core.transcripts import (
+    RECORD_ENV_VAR,
+    REPLAY_ENV_VAR,
+    TranscriptStore,
+)
+
+
+def mock_create_chat_model(self) -> BaseChatModel:
+    return FakeListChatModel(responses=["response1", "response2"])
+
+
+def record(monkeypatch, path):
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4", transcript=TranscriptStore(path))
+    messages = ai.start("system prompt", "user prompt", "step name")
+    ai.next(messages, "next user prompt", step_name="step name")
+    monkeypatch.undo()
+
+
+def test_record_and_replay(monkeypatch, tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    record(monkeypatch, path)
+    assert len(path.read_text().splitlines()) == 2
+
+    ai = AI("gpt-4", transcript=TranscriptStore(path, replay=True), streaming=False)
+    messages = ai.start("system prompt", "user prompt", "step name")
+    messages = ai.next(messages, "next user prompt", step_name="step name")
+
+    assert [m.content for m in messages[2::2]] == ["response1", "response2"]
+    assert len(ai.token_usage_log.log()) == 2
+    # replaying does not record
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_replay_unknown_request(monkeypatch, tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    record(monkeypatch, path)
+
+    ai = AI("gpt-4", transcript=TranscriptStore(path, replay=True), streaming=False)
+    with pytest.raises(KeyError):
+        ai.start("system prompt", "another user prompt", "step name")
+
+
+def test_replay_streams_with_latency(monkeypatch, tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    content = "main.py\n```python\nprint('hello world')\n```\n"
+    TranscriptStore(path).record(
+        "gpt-4",
+        0.1,
+        AI.deserialize_messages(
+            '[{"type": "system", "data": {"content": "s"}},'
+            ' {"type": "human", "data": {"content": "u"}}]'
+        ),
+        content,
+    )
+    transcript = TranscriptStore(path, replay=True, latency=0.2, tokens_per_second=100)
+    ai = AI("gpt-4", transcript=transcript, streaming=True)
+    parser = StreamingFilesParser()
+
+    start = time.monotonic()
+    messages = ai.start("s", "u", "step name", [StreamingFilesCallbackHandler(parser)])
+
+    assert time.monotonic() - start >= 0.2
+    assert messages[-1].content == content
+    assert parser.files_dict == {"main.py": "print('hello world')"}
+
+
+def test_replay_async(monkeypatch, tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    record(monkeypatch, path)
+
+    ai = AI("gpt-4", transcript=TranscriptStore(path, replay=True), streaming=False)
+    messages = asyncio.run(ai.astart("system prompt", "user prompt", "step name"))
+
+    assert messages[-1].content == "response1"
+
+
+def test_transcript_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv(REPLAY_ENV_VAR, raising=False)
+    monkeypatch.delenv(RECORD_ENV_VAR, raising=False)
+    assert TranscriptStore.from_env() is None
+
+    monkeypatch.setenv(REPLAY_ENV_VAR, str(tmp_path / "transcript.jsonl"))
+    transcript = TranscriptStore.from_env()
+
+    assert transcript.replay
+    assert TranscriptStore.from_env() is transcript
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("llama_index")
+pytest.importorskip("tree_sitter_languages")
+
+from gpt_engineer.core.files_dict import FilesDict  # noqa: E402
+from gpt_engineer.tools.experimental import code_vector_repository  # noqa: E402
+
+
+class RecordingIndex:
+    """
+    Stands in for the vector index, recording the ids of the chunks it holds.
+    """
+
+    def __init__(self, documents):
+        self.ids = [document.id_ for document in documents]
+
+    @classmethod
+    def from_documents(cls, documents):
+        return cls(documents)
+
+    def insert(self, document):
+        self.ids.append(document.id_)
+
+    def delete_ref_doc(self, ref_doc_id, delete_from_docstore=False):
+        self.ids.remove(ref_doc_id)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(code_vector_repository, "VectorStoreIndex", RecordingIndex)
+    # one chunk per file, to keep the index independent of tree-sitter
+    monkeypatch.setattr(
+        code_vector_repository.DocumentChunker,
+        "chunk_documents",
+        staticmethod(lambda documents: documents),
+    )
+    return code_vector_repository.CodeVectorRepository()
+
+
+def test_files_with_the_same_content_have_distinct_chunks(repository):
+    files = FilesDict({"a/__init__.py": "", "b/__init__.py": "", "c.py": "x = 1"})
+    repository.load_from_files_dict(files)
+    assert len(set(repository._index.ids)) == 3
+
+    files["a/__init__.py"] = "import c"
+    repository.load_from_files_dict(files)
+
+    b_chunks = repository._manifest["b/__init__.py"]["chunk_ids"]
+    assert set(b_chunks) <= set(repository._index.ids)
+    assert len(repository._index.ids) == 3
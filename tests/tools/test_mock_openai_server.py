@@ -0,0 +1,79 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from gpt_engineer.core.ai import AI
+from gpt_engineer.core.chat_to_files import apply_edits, chat_to_files_dict, parse_edits
+from gpt_engineer.core.default.paths import PREPROMPTS_PATH
+from gpt_engineer.core.default.steps import improve_messages
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.preprompts_holder import PrepromptsHolder
+from gpt_engineer.tools.mock_openai_server import MockOpenAIServer, MockServerConfig
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-mock")
+
+
+def post(server, payload):
+    request = urllib.request.Request(
+        server.url + "/chat/completions",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status, response.read().decode("utf-8")
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_ai_generates_files(streaming):
+    with MockOpenAIServer() as server:
+        ai = AI("gpt-4", base_url=server.url, streaming=streaming)
+        messages = ai.start("system prompt", "make a hello world program", "step")
+
+    assert chat_to_files_dict(messages[-1].content) == {
+        "main.py": 'print("Hello World!")'
+    }
+
+
+def test_streams_server_sent_events():
+    with MockOpenAIServer(MockServerConfig(responses=["one two"])) as server:
+        status, body = post(server, {"model": "m", "messages": [], "stream": True})
+
+    events = [line[len("data: ") :] for line in body.splitlines() if line]
+    assert status == 200
+    assert events[-1] == "[DONE]"
+    deltas = [json.loads(event)["choices"][0]["delta"] for event in events[:-1]]
+    assert "".join(delta.get("content", "") for delta in deltas) == "one two"
+
+
+def test_rate_limit_bursts():
+    config = MockServerConfig(rate_limit_every=2, rate_limit_burst=1)
+    statuses = []
+    with MockOpenAIServer(config) as server:
+        for _ in range(6):
+            try:
+                statuses.append(post(server, {"model": "m", "messages": []})[0])
+            except urllib.error.HTTPError as e:
+                statuses.append(e.code)
+
+    assert statuses == [200, 200, 429, 200, 200, 429]
+
+
+def test_edit_response_applies_to_sent_files():
+    files_dict = FilesDict({"main.py": "def main():\n    print('hi')\n"})
+    preprompts = PrepromptsHolder(PREPROMPTS_PATH).get_preprompts()
+    messages = improve_messages("change nothing", files_dict, preprompts)
+
+    with MockOpenAIServer() as server:
+        ai = AI("gpt-4", base_url=server.url, streaming=False)
+        messages = ai.next(messages, step_name="improve")
+
+    edits = parse_edits(messages[-1].content)
+    assert len(edits) == 1
+    edited = FilesDict(files_dict)
+    apply_edits(edits, edited)
+    assert edited == files_dict